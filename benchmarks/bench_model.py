@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Construction and dumping speed of model objects, no database is needed
+
+    python benchmarks/bench_model.py [number]
+
+`generic` is the per-field path through `get_field_type(...).validate` / `dumps` and the JSON round trip
+of the rows, `generated` is the path through the row functions generated per model
+"""
+import datetime
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from porm import IntegerType, VarcharType, TextType, DatetimeType, FloatType, BooleanType  # noqa: E402
+from porm.model import DBModel  # noqa: E402
+from porm.types.core import TimeType, DictType  # noqa: E402
+from porm.utils import PormJsonEncoder  # noqa: E402
+
+
+class BenchModel(DBModel):
+    __DATABASE__ = 'porm_database_test'
+    __CONFIG__ = {
+        'host': 'localhost',
+        'user': 'root',
+        'password': 'root',
+        'db': 'porm_database_test',
+        'charset': 'utf8',
+        'autocommit': 0,
+    }
+
+
+# fields of tests.test_model.UserInfo and UserBodyInfo
+class UserInfo(BenchModel):
+    userid = IntegerType(pk=True, required=True)
+    username = VarcharType(required=True)
+    email = VarcharType(required=True)
+    descr = TextType(required=False, default=None)
+    createtime = DatetimeType(required=False, default=None)
+    updatetime = DatetimeType(required=False, default=None)
+    is_active = IntegerType(required=False, default=1)
+    start_time = TimeType(required=True, default=datetime.time.fromisoformat('08:00:00'))
+    properties = DictType(required=True)
+    height = FloatType(required=True, default=180)
+
+
+class UserBodyInfo(BenchModel):
+    id = IntegerType(pk=True, required=True)
+    createtime = DatetimeType(required=False, default=None)
+    updatetime = DatetimeType(required=False, default=None)
+    weight = FloatType(required=True)
+    userid = IntegerType(required=True)
+    someone = BooleanType(required=True)
+
+
+def rows_of(model, row: dict) -> dict:
+    # a full select returns the columns in the field order
+    model._check_meta()
+    return {field_name: row[field_name] for field_name in model.__META__.fields}
+
+
+NOW = datetime.datetime(2020, 1, 2, 3, 4, 5)
+USER_ROW = rows_of(UserInfo, {
+    'userid': 1, 'username': 'dennias', 'email': 'dennias.chiu@gmail.com', 'descr': 'a' * 200,
+    'createtime': NOW, 'updatetime': NOW, 'is_active': 1, 'start_time': datetime.timedelta(hours=8),
+    'properties': '{"yooyo": "hahaha", "tags": [1, 2, 3]}', 'height': 188.0,
+})
+BODY_ROW = rows_of(UserBodyInfo, {
+    'id': 1, 'createtime': NOW, 'updatetime': NOW, 'weight': 70.5, 'userid': 1, 'someone': 1,
+})
+NEW_KWARGS = {
+    'email': 'dennias.chiu@gmail.com', 'username': 'dennias', 'height': 188, 'properties': {'yooyo': 'hahaha'},
+}
+
+
+def generic_init(model, **kwargs):
+    obj = model.__new__(model)
+    dict.update(obj, kwargs)
+    obj._data = {}
+    obj._actived_fields = {}
+    obj._related = {}
+    for field_name, field_val in kwargs.items():
+        obj._data[field_name] = model.__META__.get_field_type(field_name).validate(field_val)
+        obj._actived_fields[field_name] = True
+    return obj
+
+
+def generic_from_row(model, row: dict):
+    return generic_init(model, **json.loads(json.dumps(row, cls=PormJsonEncoder)))
+
+
+def generic_dump(obj) -> dict:
+    return {
+        field_name: obj.__META__.get_field_type(field_name).dumps(val) for field_name, val in obj._data.items()
+        if field_name in obj._actived_fields
+    }
+
+
+def run(name: str, fn, number: int):
+    seconds = min(timeit.repeat(fn, number=number, repeat=3))
+    print('{:<40} {:>10.2f} us/op'.format(name, seconds / number * 1e6))
+
+
+def main(number: int = 20000):
+    for model, row in ((UserInfo, USER_ROW), (UserBodyInfo, BODY_ROW)):
+        name = model.__name__
+        print(name)
+        run('  from_row generic', lambda: generic_from_row(model, row), number)
+        run('  from_row generated', lambda: model._from_row(row), number)
+        obj = model._from_row(row)
+        run('  dump generic', lambda: generic_dump(obj), number)
+        run('  dump generated', lambda: obj.get_valid_fields(for_save=True), number)
+        run('  json generic', lambda: json.dumps(obj._data, cls=PormJsonEncoder), number)
+        run('  json generated', lambda: str(obj), number)
+    print('UserInfo.new')
+    run('  new generic', lambda: generic_init(UserInfo, **NEW_KWARGS), number)
+    run('  new generated', lambda: UserInfo.new(**NEW_KWARGS), number)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of short transactions run by threads sharing one api object, a MySQL server of the config of
+`bench_model.BenchModel` is needed
+
+    python benchmarks/bench_transactions.py [seconds] [threads ...]
+
+Each thread has its own connection, the transactions per second should grow with the threads till the server
+or the GIL is saturated
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from bench_model import BenchModel  # noqa: E402
+from porm.databases import MyDBApi  # noqa: E402
+
+
+def transaction(dbi: MyDBApi):
+    with dbi.start_transaction():
+        dbi.query_one('SELECT 1 AS one')
+
+
+def run(dbi: MyDBApi, threads: int, seconds: float) -> int:
+    counts = [0] * threads
+    start = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(idx: int):
+        # connect before the clock starts
+        dbi.query_one('SELECT 1 AS one')
+        start.wait()
+        while not stop.is_set():
+            transaction(dbi)
+            counts[idx] += 1
+        dbi.close()
+
+    workers = [threading.Thread(target=worker, args=(idx,)) for idx in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(counts)
+
+
+def main(seconds: float = 3.0, threads=(1, 2, 4, 8, 16)):
+    dbi = MyDBApi(config=dict(BenchModel.__CONFIG__))
+    print('{:>8} {:>14} {:>14}'.format('threads', 'tx/s', 'tx/s/thread'))
+    for num in threads:
+        rate = run(dbi, num, seconds) / seconds
+        print('{:>8} {:>14.1f} {:>14.1f}'.format(num, rate, rate / num))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0, [int(arg) for arg in sys.argv[2:]] or (1, 2, 4, 8, 16))
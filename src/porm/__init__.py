@@ -10,5 +10,6 @@ development that inherited and learned form Peewee.
 # flake8: noqa
 from porm import validators
 from porm.types import *
+from porm.gather import gather
 
 __version__ = "0.0.24dev"
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Batch validation of columns: every column is checked and converted by its field type at once and the rows
+come out as param tuples for `executemany`, no model object is created
+"""
+from typing import Dict, List, Sequence, Tuple
+
+from porm.errors import ParamError, ValidationError
+from porm.types.core import BaseType, BooleanType, DateType, DatetimeType, FloatType, IntegerType, TextType, \
+    TimeType, VarcharType
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'validate_column', 'validate_columns'
+)
+
+
+def _raise_first(field_type: BaseType, vals: list, bad: callable):
+    # the type raises its own error for the first bad value
+    for val in vals:
+        if bad(val):
+            field_type.validate(val)
+    raise ValidationError(u'{}: invalid column'.format(field_type.name))
+
+
+def _not_null(field_type: BaseType, vals: list):
+    if field_type.required and any(val is None for val in vals):
+        _raise_first(field_type, vals, lambda val: val is None)
+
+
+def _numeric_array(field_type: BaseType, arr) -> list:
+    """
+    Check the range of a NumPy column with vector ops
+    :param field_type:
+    :param arr:
+    :return: the values as Python numbers
+    """
+    if type(field_type) is FloatType:
+        arr = arr.astype('float64', copy=False)
+    too_big = arr > field_type.max
+    too_small = arr < field_type.min
+    if too_big.any() or too_small.any():
+        idx = int(np.flatnonzero(too_big | too_small)[0])
+        _raise_first(field_type, [arr[idx].item()], lambda val: True)
+    return arr.tolist()
+
+
+def _numeric(field_type: BaseType, vals: list) -> list:
+    conv = list(map(field_type.type, vals))
+    if conv and (max(conv) > field_type.max or min(conv) < field_type.min):
+        _raise_first(field_type, conv, lambda val: val > field_type.max or val < field_type.min)
+    return conv
+
+
+def _string(field_type: BaseType, vals: list) -> list:
+    conv = list(map(str, vals))
+    if field_type.length < TextType._LENGTH and conv and max(map(len, conv)) > field_type.length:
+        _raise_first(field_type, conv, lambda val: len(val) > field_type.length)
+    return conv
+
+
+def _with_nulls(field_type: BaseType, vals: list) -> list:
+    # NULLs are checked once and kept, the other values are validated as a column
+    _not_null(field_type, vals)
+    idxs = [idx for idx, val in enumerate(vals) if val is not None]
+    ret = [None] * len(vals)
+    for idx, val in zip(idxs, validate_column(field_type, [vals[idx] for idx in idxs])):
+        ret[idx] = val
+    return ret
+
+
+def validate_column(field_type: BaseType, vals: Sequence) -> list:
+    """
+    Validate a column and convert it to the values to save, like `dumps` of each value, None is saved as NULL
+    if the field is not required
+    :param field_type:
+    :param vals: list, tuple or NumPy array
+    :return:
+    """
+    kind = type(field_type)
+    if np is not None and isinstance(vals, np.ndarray):
+        numeric = ('i', 'u', 'b', 'f') if kind is FloatType else ('i', 'u', 'b')
+        if kind in (IntegerType, FloatType) and vals.dtype.kind in numeric:
+            return _numeric_array(field_type, vals)
+        vals = vals.tolist()
+    elif not isinstance(vals, list):
+        vals = list(vals)
+    if None in vals:
+        return _with_nulls(field_type, vals)
+    if kind in (IntegerType, FloatType):
+        return _numeric(field_type, vals)
+    if kind in (VarcharType, TextType):
+        return _string(field_type, vals)
+    if kind is BooleanType:
+        return list(map(bool, vals))
+    if kind in (DatetimeType, DateType, TimeType):
+        # strings are parsed in batch, each distinct one once
+        return field_type.validate_many(vals)
+    return [field_type.dumps(val) for val in vals]
+
+
+def validate_columns(model, columns: Dict[str, Sequence]) -> Tuple[List[str], List[tuple]]:
+    """
+    Validate the columns of model rows
+    :param model: DBModel class with its metadata initialized
+    :param columns: field name to its values, every column has the same length, NULLs of a column with
+        `masks` like `porm.columnar.ColumnarResult` are masked out
+    :return: (field names, param tuples in the field order)
+    """
+    if not columns:
+        raise ParamError(u'No columns to validate')
+    fields = list(columns.keys())
+    size = None
+    for field_name in fields:
+        if not model.__META__.has_field(field_name):
+            raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(field_name, model.__META__.fields))
+        if size is None:
+            size = len(columns[field_name])
+        elif len(columns[field_name]) != size:
+            raise ParamError(u'Column: {} has {} values, expected {}'.format(
+                field_name, len(columns[field_name]), size))
+    masks = getattr(columns, 'masks', None) or {}
+    converted = []
+    for field_name in fields:
+        vals = columns[field_name]
+        mask = masks.get(field_name)
+        if mask is not None and any(mask):
+            vals = [None if null else val for val, null in zip(list(vals), mask)]
+        converted.append(validate_column(model.__META__.get_field_type(field_name), vals))
+    return fields, list(zip(*converted))
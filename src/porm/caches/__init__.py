@@ -0,0 +1,9 @@
+__all__ = (
+    'EntityCache',
+    'IdentityMap',
+    'SingleFlight',
+)
+
+from porm.caches.entity import EntityCache
+from porm.caches.identity import IdentityMap
+from porm.caches.singleflight import SingleFlight
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict
+
+from porm.forks import register
+
+
+class EntityCache(object):
+    """
+    Bounded LRU cache of model rows keyed by (full table name, primary key tuple)
+
+    Rows are kept as snapshots that are never handed out directly, readers always get a fresh copy
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = max(1, int(maxsize))
+        self._entries = OrderedDict()
+        self._epochs = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def epoch(self, table: str) -> tuple:
+        """
+        Invalidation counter of the table, a reader takes it before querying and hands it back to `set`
+        so rows read before a concurrent write are not cached
+        :param table:
+        :return:
+        """
+        return self._clears, self._epochs.get(table, 0)
+
+    def get(self, key: tuple):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return snapshot
+
+    def set(self, key: tuple, snapshot, epoch: tuple = None) -> bool:
+        """
+
+        :param key: (table, pk tuple)
+        :param snapshot:
+        :param epoch: epoch of the table taken before the row was read
+        :return: the snapshot is cached or not
+        """
+        with self._lock:
+            if epoch is not None and epoch != (self._clears, self._epochs.get(key[0], 0)):
+                return False
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, key: tuple):
+        with self._lock:
+            self._epochs[key[0]] = self._epochs.get(key[0], 0) + 1
+            self._entries.pop(key, None)
+
+    def clear(self, table: str = None):
+        """
+        Drop the rows of the table or all the rows if table is not given
+        :param table:
+        :return:
+        """
+        with self._lock:
+            if table is None:
+                self._clears += 1
+                self._entries.clear()
+            else:
+                self._epochs[table] = self._epochs.get(table, 0) + 1
+                for key in [key for key in self._entries if key[0] == table]:
+                    del self._entries[key]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
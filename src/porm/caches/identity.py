@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from typing import Union, List
+
+
+class IdentityMap(object):
+    """
+    Objects loaded or written inside one transaction keyed by (full table name, primary key tuple)
+
+    It is only used by the thread owning the transaction so nothing is locked here
+    """
+
+    def __init__(self):
+        self._objs = {}
+        self._locked = set()
+        self._queries = {}
+
+    def __len__(self):
+        return len(self._objs)
+
+    def __contains__(self, key) -> bool:
+        return key in self._objs
+
+    def get(self, key: tuple) -> tuple:
+        """
+
+        :param key:
+        :return: (found, obj), obj is None if the row is deleted in the transaction
+        """
+        if key in self._objs:
+            return True, self._objs[key]
+        return False, None
+
+    def add(self, key: tuple, obj, locked: bool = False):
+        """
+
+        :param key:
+        :param obj: None to mark the row deleted
+        :param locked: the row is locked by the transaction like selected for update or written
+        :return:
+        """
+        self._objs[key] = obj
+        if locked:
+            self._locked.add(key)
+
+    def discard(self, key: tuple):
+        """
+        Drop the object of key whose row is not known, its lock is kept
+        :param key:
+        :return:
+        """
+        self._objs.pop(key, None)
+
+    def is_locked(self, key: tuple) -> bool:
+        return key in self._locked
+
+    @staticmethod
+    def query_key(filter: str, param: dict) -> Union[None, tuple]:
+        try:
+            query_key = (filter, tuple(sorted((param or {}).items())))
+            hash(query_key)
+        except TypeError:
+            return None
+        return query_key
+
+    def get_query(self, table: str, query_key: tuple) -> Union[None, list]:
+        """
+        Get the objects of a locking query that already ran in the transaction
+        :param table:
+        :param query_key:
+        :return:
+        """
+        keys = self._queries.get(table, {}).get(query_key)
+        if keys is None:
+            return None
+        objs = []
+        for key in keys:
+            obj = self._objs.get(key)
+            if obj is None:
+                return None
+            objs.append(obj)
+        return objs
+
+    def add_query(self, table: str, query_key: tuple, keys: List[tuple]):
+        self._queries.setdefault(table, {})[query_key] = keys
+
+    def forget_queries(self, table: str):
+        self._queries.pop(table, None)
+
+    def forget(self, table: str):
+        """
+        Drop the objects of table since its rows are written by unknown filters, the row locks are still held
+        :param table:
+        :return:
+        """
+        for key in [key for key in self._objs if key[0] == table]:
+            del self._objs[key]
+        self.forget_queries(table)
+
+    def clear(self):
+        self._objs.clear()
+        self._locked.clear()
+        self._queries.clear()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from porm.forks import register
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error', 'dups')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.dups = 0
+
+
+class SingleFlight(object):
+    """
+    Coalesce identical concurrent calls: the first caller of a key runs the call, the callers arriving
+    while it is in flight wait for it and get copies of its result
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.collapsed = 0
+        register(self)
+
+    def _after_fork(self):
+        # the leaders of the calls in flight are threads of the parent
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn: callable, copy: callable = None):
+        """
+
+        :param key: hashable key of the call like (sql, params)
+        :param fn: the call to run
+        :param copy: copy the result for each caller when it is shared
+        :return:
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.dups += 1
+                self.collapsed += 1
+                leader = False
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as ex:
+                call.error = ex
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            if call.error is not None:
+                raise call.error
+            # nobody can join once the call is removed, the result is only copied when it is shared
+            shared = call.dups > 0
+        else:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            shared = True
+        if shared and copy is not None:
+            return copy(call.result)
+        return call.result
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'executions': self.calls - self.collapsed,
+            'collapsed': self.collapsed,
+            'in_flight': len(self._calls)
+        }
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+Binary format of model batches for caches shared between processes
+
+    b'PORM' | version, header size | JSON header: table, fields and their kinds, rows | columns
+
+Each column is a state byte per row (value, NULL or absent) if any value is not set, then its values:
+little endian int64 / float64 / bytes for numbers, booleans, datetimes (microseconds since epoch),
+dates (days since epoch) and times (microseconds of the day), char offsets, byte size and UTF-8 text
+for the others. A column with a value its field kind can not hold exactly, like a datetime of a DateType
+or a timezone aware datetime, is packed as 'value': text tagged with the type of each value.
+The fields keep the order of the rows. The numeric columns are read without copy into NumPy arrays by `loads_columns`
+"""
+import datetime
+import json
+import struct
+import sys
+from array import array
+from typing import Iterable, List, Tuple
+
+from porm.columnar import ColumnarResult
+from porm.compact import CompactRow
+from porm.errors import ParamError
+from porm.serialize import _date_text, _datetime_text, _time_text
+from porm.types.core import BaseType, BooleanType, DateType, DatetimeType, DictType, FloatType, IntegerType, \
+    TextType, TimestampType, TimeType, VarcharType
+from porm.utils import PormJsonEncoder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'binary_kind', 'dumps_rows', 'loads_rows', 'loads_columns', 'read_header'
+)
+
+MAGIC = b'PORM'
+VERSION = 2
+_PREFIX = struct.Struct('<4sBI')
+_SIZE = struct.Struct('<q')
+
+_VALUE, _NULL, _ABSENT = 0, 1, 2
+_NAT = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_US = datetime.timedelta(microseconds=1)
+_SWAP = sys.byteorder == 'big'
+_encoder = PormJsonEncoder()
+# the same text as `PormJsonEncoder.default`
+_DATE_TEXTS = {'datetime': _datetime_text, 'date': _date_text, 'time': _time_text}
+
+# kind: (array typecode, NumPy dtype, value of NULLs)
+_FIXED = {
+    'int': ('q', '<i8', 0),
+    'float': ('d', '<f8', float('nan')),
+    'bool': ('b', 'bool', 0),
+    'datetime': ('q', '<M8[us]', _NAT),
+    'date': ('q', '<M8[D]', _NAT),
+    'time': ('q', '<i8', 0),
+}
+# kind: whether a value is packed by the kind without loss
+_FITS = {
+    'int': lambda val: val.__class__ is int and _NAT <= val <= _INT_MAX,
+    'float': lambda val: val.__class__ is float,
+    'bool': lambda val: val.__class__ is bool,
+    'datetime': lambda val: val.__class__ is datetime.datetime and val.tzinfo is None,
+    'date': lambda val: val.__class__ is datetime.date,
+    'time': lambda val: val.__class__ is datetime.time and val.tzinfo is None,
+    'text': lambda val: val.__class__ is str,
+}
+# tag of a 'value': decoder
+_UNTAGS = {
+    'T': datetime.datetime.fromisoformat,
+    'D': datetime.date.fromisoformat,
+    't': datetime.time.fromisoformat,
+    'j': json.loads,
+}
+
+
+def binary_kind(field_type: BaseType) -> str:
+    kind = type(field_type)
+    if kind is IntegerType:
+        return 'int'
+    if kind is FloatType:
+        return 'float'
+    if kind is BooleanType:
+        return 'bool'
+    if kind is DatetimeType:
+        return 'datetime'
+    if kind is DateType:
+        return 'date'
+    if kind in (TimeType, TimestampType):
+        return 'time'
+    if kind in (VarcharType, TextType):
+        return 'text'
+    if kind is DictType:
+        return 'json'
+    return 'value'
+
+
+def _column_kind(kind: str, vals: list) -> str:
+    fits = _FITS.get(kind)
+    if fits is None or all(val is None or fits(val) for val in vals):
+        return kind
+    return 'value'
+
+
+def _time_us(val: datetime.time) -> int:
+    return ((val.hour * 60 + val.minute) * 60 + val.second) * 1000000 + val.microsecond
+
+
+def _tagged(val) -> str:
+    kind = val.__class__
+    if kind is datetime.datetime:
+        return 'T' + val.isoformat()
+    if kind is datetime.date:
+        return 'D' + val.isoformat()
+    if kind is datetime.time:
+        return 't' + val.isoformat()
+    return 'j' + _encoder.encode(val)
+
+
+def _encode_fixed(kind: str, field_name: str, vals: list) -> bytes:
+    typecode, _, fill = _FIXED[kind]
+    if kind == 'datetime':
+        vals = [fill if val is None else (val - _EPOCH) // _US for val in vals]
+    elif kind == 'date':
+        vals = [fill if val is None else val.toordinal() - _EPOCH_ORDINAL for val in vals]
+    elif kind == 'time':
+        vals = [fill if val is None else _time_us(val) for val in vals]
+    elif None in vals:
+        vals = [fill if val is None else val for val in vals]
+    try:
+        arr = array(typecode, vals)
+    except (OverflowError, TypeError) as ex:
+        raise ParamError(u'Field: {} can not be packed as {}: {}'.format(field_name, kind, ex))
+    if _SWAP:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _encode_text(field_type: BaseType, kind: str, vals: list) -> bytes:
+    if kind == 'text':
+        texts = ['' if val is None else val for val in vals]
+    elif kind == 'json':
+        texts = ['' if val is None else field_type.dumps(val) for val in vals]
+    else:
+        texts = ['' if val is None else _tagged(val) for val in vals]
+    offsets = array('q', [0])
+    end = 0
+    for text in texts:
+        end += len(text)
+        offsets.append(end)
+    if _SWAP:
+        offsets.byteswap()
+    blob = ''.join(texts).encode('utf-8')
+    return offsets.tobytes() + _SIZE.pack(len(blob)) + blob
+
+
+def _rows_data(objs: Iterable) -> List[dict]:
+    rows = []
+    for obj in objs:
+        if isinstance(obj, CompactRow):
+            rows.append(obj.to_dict())
+        else:
+            rows.append(obj._data)
+    return rows
+
+
+def dumps_rows(model, objs: Iterable) -> bytes:
+    """
+    Pack the validated values of models or compact rows of model
+    :param model: DBModel class with its metadata initialized
+    :param objs:
+    :return:
+    """
+    rows = _rows_data(objs)
+    # the fields in the order of the rows, as a dict keeps the first position of a key
+    fields = {}
+    for data in rows:
+        fields.update(dict.fromkeys(data))
+    for field_name in fields:
+        if not model.__META__.has_field(field_name):
+            raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(field_name, model.__META__.fields))
+    columns = []
+    for field_name in fields:
+        vals = [data.get(field_name) for data in rows]
+        columns.append((field_name, _column_kind(binary_kind(model.__META__.get_field_type(field_name)), vals), vals))
+    header = json.dumps({
+        'table': model.__META__.get_full_table_name(), 'rows': len(rows),
+        'fields': [[field_name, kind] for field_name, kind, _ in columns],
+    }).encode('utf-8')
+    parts = [_PREFIX.pack(MAGIC, VERSION, len(header)), header]
+    for field_name, kind, vals in columns:
+        states = bytes(
+            _VALUE if val is not None else _NULL if field_name in data else _ABSENT for val, data in zip(vals, rows))
+        if any(states):
+            parts.append(b'\x01')
+            parts.append(states)
+        else:
+            parts.append(b'\x00')
+        if kind in _FIXED:
+            parts.append(_encode_fixed(kind, field_name, vals))
+        else:
+            parts.append(_encode_text(model.__META__.get_field_type(field_name), kind, vals))
+    return b''.join(parts)
+
+
+def read_header(buf) -> Tuple[dict, int]:
+    """
+    :param buf: bytes or any buffer
+    :return: (header, offset of the first column)
+    """
+    buf = memoryview(buf)
+    if len(buf) < _PREFIX.size:
+        raise ParamError(u'Not a porm batch')
+    magic, version, size = _PREFIX.unpack_from(buf)
+    if magic != MAGIC:
+        raise ParamError(u'Not a porm batch')
+    if version != VERSION:
+        raise ParamError(u'Unsupported batch version: {}'.format(version))
+    header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + size]).decode('utf-8'))
+    return header, _PREFIX.size + size
+
+
+def _check_schema(model, header: dict):
+    table = model.__META__.get_full_table_name()
+    if header['table'] != table:
+        raise ParamError(u'Batch of table: {} is not of {}'.format(header['table'], table))
+    for field_name, kind in header['fields']:
+        if not model.__META__.has_field(field_name):
+            raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(field_name, model.__META__.fields))
+        if kind not in (binary_kind(model.__META__.get_field_type(field_name)), 'value'):
+            raise ParamError(u'Field: {} is packed as {}, expected {}'.format(
+                field_name, kind, binary_kind(model.__META__.get_field_type(field_name))))
+
+
+def _columns(model, buf):
+    """
+    Split the columns of a batch
+    :return: rows, [(field name, kind, states or None, values buffer, texts or None)]
+    """
+    header, offset = read_header(buf)
+    _check_schema(model, header)
+    buf = memoryview(buf)
+    size = header['rows']
+    columns = []
+    for field_name, kind in header['fields']:
+        states = None
+        if buf[offset]:
+            states = buf[offset + 1:offset + 1 + size]
+            offset += size
+        offset += 1
+        if kind in _FIXED:
+            width = 1 if kind == 'bool' else 8
+            columns.append((field_name, kind, states, buf[offset:offset + width * size], None))
+            offset += width * size
+        else:
+            offsets = array('q')
+            offsets.frombytes(buf[offset:offset + 8 * (size + 1)])
+            if _SWAP:
+                offsets.byteswap()
+            offset += 8 * (size + 1)
+            blob_size, = _SIZE.unpack_from(buf, offset)
+            offset += _SIZE.size
+            texts = str(buf[offset:offset + blob_size], 'utf-8')
+            offset += blob_size
+            columns.append((field_name, kind, states, offsets, texts))
+    return size, columns
+
+
+def _fixed_values(kind: str, data) -> list:
+    typecode = _FIXED[kind][0]
+    arr = array(typecode)
+    arr.frombytes(data)
+    if _SWAP:
+        arr.byteswap()
+    vals = arr.tolist()
+    if kind == 'bool':
+        return [bool(val) for val in vals]
+    if kind == 'datetime':
+        return [None if val == _NAT else _EPOCH + val * _US for val in vals]
+    if kind == 'date':
+        return [None if val == _NAT else datetime.date.fromordinal(val + _EPOCH_ORDINAL) for val in vals]
+    if kind == 'time':
+        ret = []
+        for val in vals:
+            sec, usec = divmod(val, 1000000)
+            minute, sec = divmod(sec, 60)
+            ret.append(datetime.time(minute // 60, minute % 60, sec, usec))
+        return ret
+    return vals
+
+
+def _text_values(field_type: BaseType, kind: str, offsets: array, texts: str) -> list:
+    vals = [texts[start:end] for start, end in zip(offsets, offsets[1:])]
+    if kind == 'text':
+        return vals
+    if kind == 'json':
+        return [field_type.load(val) if val else None for val in vals]
+    # the values were validated before they were packed
+    return [_UNTAGS[val[0]](val[1:]) if val else None for val in vals]
+
+
+def _raw_values(kind: str, vals: list, texts: list = None) -> list:
+    # the values `_from_row` keeps in the dict of a model
+    if kind == 'json':
+        return texts
+    if kind in _DATE_TEXTS:
+        text = _DATE_TEXTS[kind]
+        return [None if val is None else text(val) for val in vals]
+    if kind == 'value':
+        return [json.loads(_encoder.encode(val)) for val in vals]
+    return vals
+
+
+def loads_rows(model, buf) -> list:
+    """
+    Unpack a batch of `dumps_rows` into objects of model, the values are not validated again
+    :param model: DBModel class with its metadata initialized
+    :param buf: bytes or any buffer
+    :return:
+    """
+    size, columns = _columns(model, buf)
+    datas = [{} for _ in range(size)]
+    raws = [{} for _ in range(size)]
+    for field_name, kind, states, data, texts in columns:
+        field_type = model.__META__.get_field_type(field_name)
+        if kind in _FIXED:
+            vals = _fixed_values(kind, data)
+            raw_vals = _raw_values(kind, vals)
+        else:
+            vals = _text_values(field_type, kind, data, texts)
+            raw_vals = _raw_values(kind, vals, [texts[start:end] for start, end in zip(data, data[1:])])
+        if states is None:
+            for obj_data, obj_raw, val, raw in zip(datas, raws, vals, raw_vals):
+                obj_data[field_name] = val
+                obj_raw[field_name] = raw
+            continue
+        for obj_data, obj_raw, val, raw, state in zip(datas, raws, vals, raw_vals, states):
+            if state == _ABSENT:
+                continue
+            if state == _NULL:
+                val = raw = None
+            obj_data[field_name] = val
+            obj_raw[field_name] = raw
+    return [model._from_valid(raw, data) for raw, data in zip(raws, datas)]
+
+
+def loads_columns(model, buf) -> ColumnarResult:
+    """
+    Unpack a batch of `dumps_rows` into columnar buffers like `DBModel.fetch_columns`: the numeric columns
+    are NumPy arrays over buf without copy if NumPy is installed, absent values are masked like NULLs
+    :param model: DBModel class with its metadata initialized
+    :param buf: bytes or any buffer
+    :return:
+    """
+    size, columns = _columns(model, buf)
+    ret_columns = {}
+    masks = {}
+    for field_name, kind, states, data, texts in columns:
+        if states is None:
+            mask = np.zeros(size, dtype=bool) if np is not None else bytearray(size)
+        elif np is not None:
+            mask = np.frombuffer(states, dtype='uint8', count=size) != _VALUE
+        else:
+            mask = bytearray(state != _VALUE for state in states)
+        if kind in _FIXED and kind != 'time':
+            if np is not None:
+                vals = np.frombuffer(data, dtype=_FIXED[kind][1], count=size)
+            else:
+                vals = array(_FIXED[kind][0])
+                vals.frombytes(data)
+                if _SWAP:
+                    vals.byteswap()
+        else:
+            if kind in _FIXED:
+                vals = _fixed_values(kind, data)
+            else:
+                vals = _text_values(model.__META__.get_field_type(field_name), kind, data, texts)
+            if states is not None:
+                vals = [None if state != _VALUE else val for val, state in zip(vals, states)]
+        ret_columns[field_name] = vals
+        masks[field_name] = mask
+    return ColumnarResult(ret_columns, masks, size)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Row functions generated per model: the checks of the field types are inlined for the values already valid,
+the other values go through `validate` or `dumps` of their type
+"""
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+from typing import List
+
+from porm.types.core import BaseType, BooleanType, DateType, DatetimeType, DictType, FloatType, IntegerType, \
+    LazyDict, TextType, TimeType, VarcharType
+from porm.utils import PormJsonEncoder
+
+__all__ = (
+    'RowFunctions', 'compile_rows'
+)
+
+# values left as they are by a JSON round trip
+_JSON_PLAIN = frozenset({str, int, float, bool, type(None)})
+_ENCODED = frozenset({datetime.datetime, datetime.date, datetime.time, datetime.timedelta, decimal.Decimal})
+_encoder = PormJsonEncoder()
+
+
+def _plain(val):
+    """
+    The value after `json.loads(json.dumps(val, cls=PormJsonEncoder))`
+    :param val:
+    :return:
+    """
+    if val.__class__ in _ENCODED:
+        return _encoder.default(val)
+    return json.loads(json.dumps(val, cls=PormJsonEncoder))
+
+
+class RowFunctions(object):
+    """
+    validate_row(kwargs) -> validated values
+    dump_row(data, active) -> values to save of the active fields
+    load_row(row) -> (JSON safe values, validated values) of a database row
+    """
+    __slots__ = ('validate_row', 'dump_row', 'load_row', 'source')
+
+    def __init__(self, validate_row, dump_row, load_row, source: str):
+        self.validate_row = validate_row
+        self.dump_row = dump_row
+        self.load_row = load_row
+        self.source = source
+
+
+def _valid_cases(field_type: BaseType, var: str) -> List[tuple]:
+    """
+    (condition, value) of the values a type keeps as they are, only exact built-in types are inlined
+    :param field_type:
+    :param var:
+    :return:
+    """
+    kind = type(field_type)
+    if kind is BooleanType:
+        return [('True', 'bool({})'.format(var))]
+    if kind in (VarcharType, TextType):
+        if field_type.length >= TextType._LENGTH:
+            return [('{0}.__class__ is str'.format(var), var)]
+        return [('{0}.__class__ is str and len({0}) <= {1!r}'.format(var, field_type.length), var)]
+    if kind in (IntegerType, FloatType):
+        return [('{0}.__class__ is {1} and {2!r} <= {0} <= {3!r}'.format(
+            var, 'int' if kind is IntegerType else 'float', field_type.min, field_type.max), var)]
+    if kind is DatetimeType:
+        return [('{}.__class__ is _datetime'.format(var), var)]
+    if kind is DateType:
+        return [('{}.__class__ is _date'.format(var), var)]
+    if kind is TimeType:
+        return [('{}.__class__ is _time'.format(var), var)]
+    if kind is DictType:
+        return [('{0}.__class__ is dict or {0}.__class__ is _LazyDict'.format(var), var)]
+    return []
+
+
+def _load_cases(field_type: BaseType, var: str) -> List[tuple]:
+    # values read from the database, JSON objects are decoded lazily
+    cases = _valid_cases(field_type, var)
+    if type(field_type) is DictType:
+        cases.append(("{0}.__class__ is str and {0}.startswith('{{')".format(var), '_LazyDict({})'.format(var)))
+    return cases
+
+
+def _dump_cases(field_type: BaseType, var: str) -> List[tuple]:
+    if type(field_type) is DictType:
+        return [
+            ('{0}.__class__ is _LazyDict and {0}.raw is not None'.format(var), '{}.raw'.format(var)),
+            ('{0}.__class__ is dict'.format(var), '_json_dumps({})'.format(var))
+        ]
+    return _valid_cases(field_type, var)
+
+
+def _assign(lines: List[str], indent: str, var: str, cases: List[tuple], fallback: str):
+    if cases and cases[0][0] == 'True':
+        lines.append('{}{} = {}'.format(indent, var, cases[0][1]))
+        return
+    for idx, (cond, value) in enumerate(cases):
+        lines.append('{}{} {}:'.format(indent, 'if' if idx == 0 else 'elif', cond))
+        if value != var:
+            lines.append('{}    {} = {}'.format(indent, var, value))
+        else:
+            lines.append('{}    pass'.format(indent))
+    if cases:
+        lines.append('{}else:'.format(indent))
+        lines.append('{}    {} = {}'.format(indent, var, fallback))
+    else:
+        lines.append('{}{} = {}'.format(indent, var, fallback))
+
+
+def _row_function(lines: List[str], name: str, fields: List[str], types: List[BaseType], cases: callable,
+                  method: str, per_field: str):
+    # rows of a full select come in the field order, their checks are unrolled
+    lines.append('def {}(kwargs):'.format(name))
+    lines.append('    if tuple(kwargs) == _FIELDS:')
+    for idx, (field_name, field_type) in enumerate(zip(fields, types)):
+        var = 'v{}'.format(idx)
+        lines.append('        {} = kwargs[{!r}]'.format(var, field_name))
+        _assign(lines, '        ', var, cases(field_type, var), '_t{}.{}({})'.format(idx, method, var))
+    lines.append('        return {{{}}}'.format(
+        ', '.join('{!r}: v{}'.format(field_name, idx) for idx, field_name in enumerate(fields))))
+    lines.append('    return {{name: {}[name](val) for name, val in kwargs.items()}}'.format(per_field))
+
+
+def compile_rows(fields: List[str], types: List[BaseType], model_name: str = 'model') -> RowFunctions:
+    """
+    Generate the row functions of the fields
+    :param fields: field names in the select order
+    :param types: field types
+    :param model_name: used in the generated file name
+    :return:
+    """
+    namespace = {
+        '_datetime': datetime.datetime, '_date': datetime.date, '_time': datetime.time,
+        '_LazyDict': LazyDict, '_json_dumps': json.dumps, '_OrderedDict': OrderedDict, '_plain': _plain,
+        '_JSON_PLAIN': _JSON_PLAIN, '_FIELDS': tuple(fields),
+    }
+    lines = []
+    validators = []
+    loaders = []
+    dumpers = []
+    for idx, (field_name, field_type) in enumerate(zip(fields, types)):
+        namespace['_t{}'.format(idx)] = field_type
+        validators.append('{!r}: _v{}'.format(field_name, idx))
+        loaders.append('{!r}: _l{}'.format(field_name, idx))
+        dumpers.append('{!r}: _d{}'.format(field_name, idx))
+        lines.append('def _v{}(v):'.format(idx))
+        _assign(lines, '    ', 'v', _valid_cases(field_type, 'v'), '_t{}.validate(v)'.format(idx))
+        lines.append('    return v')
+        lines.append('def _l{}(v):'.format(idx))
+        _assign(lines, '    ', 'v', _load_cases(field_type, 'v'), '_t{}.load(v)'.format(idx))
+        lines.append('    return v')
+        lines.append('def _d{}(v):'.format(idx))
+        _assign(lines, '    ', 'v', _dump_cases(field_type, 'v'), '_t{}.dumps(v)'.format(idx))
+        lines.append('    return v')
+    lines.append('_validators = {{{}}}'.format(', '.join(validators)))
+    lines.append('_loaders = {{{}}}'.format(', '.join(loaders)))
+    lines.append('_dumpers = {{{}}}'.format(', '.join(dumpers)))
+
+    _row_function(lines, 'validate_row', fields, types, _valid_cases, 'validate', '_validators')
+    _row_function(lines, '_load_valid', fields, types, _load_cases, 'load', '_loaders')
+
+    lines.append('def dump_row(data, active):')
+    lines.append('    ret = _OrderedDict()')
+    lines.append('    for name, val in data.items():')
+    lines.append('        if name in active:')
+    lines.append('            ret[name] = _dumpers[name](val)')
+    lines.append('    return ret')
+
+    lines.append('def load_row(row):')
+    lines.append('    raw = {name: val if val.__class__ in _JSON_PLAIN else _plain(val) for name, val in row.items()}')
+    lines.append('    return raw, _load_valid(raw)')
+
+    source = '\n'.join(lines) + '\n'
+    exec(compile(source, '<porm rows of {}>'.format(model_name), 'exec'), namespace)
+    return RowFunctions(namespace['validate_row'], namespace['dump_row'], namespace['load_row'], source)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar buffers filled from cursor chunks, NumPy arrays if NumPy is installed and `array.array` otherwise
+"""
+import datetime
+from array import array
+from typing import Dict, Iterable, List
+
+from porm.types.core import BaseType, BooleanType, DateType, DatetimeType, FloatType, IntegerType
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'ColumnarResult', 'build_columns', 'column_kind'
+)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_DATE = datetime.date(1970, 1, 1)
+_US = datetime.timedelta(microseconds=1)
+
+# kind: (numpy dtype, array typecode, fill value of nulls)
+_KINDS = {
+    'int': ('int64', 'q', 0),
+    'float': ('float64', 'd', float('nan')),
+    'bool': ('bool', 'b', False),
+    # microseconds or days since epoch in `array.array`
+    'datetime': ('datetime64[us]', 'q', None),
+    'date': ('datetime64[D]', 'q', None),
+    'object': (object, None, None),
+}
+
+
+def column_kind(field_type: BaseType) -> str:
+    if isinstance(field_type, FloatType):
+        return 'float'
+    if isinstance(field_type, IntegerType):
+        return 'int'
+    if isinstance(field_type, BooleanType):
+        return 'bool'
+    if isinstance(field_type, DatetimeType):
+        return 'datetime'
+    if isinstance(field_type, DateType):
+        return 'date'
+    return 'object'
+
+
+def _to_datetime(val) -> datetime.datetime:
+    if isinstance(val, str):
+        return datetime.datetime.fromisoformat(val)
+    return val
+
+
+def _to_date(val) -> datetime.date:
+    if isinstance(val, str):
+        return datetime.date.fromisoformat(val[:10])
+    if isinstance(val, datetime.datetime):
+        return val.date()
+    return val
+
+
+class _Column(object):
+    __slots__ = ('kind', 'data', 'mask', 'size')
+
+    def __init__(self, kind: str, capacity: int):
+        self.kind = kind
+        self.size = 0
+        dtype, typecode, _ = _KINDS[kind]
+        if np is not None:
+            self.data = np.empty(capacity, dtype=dtype)
+            self.mask = np.zeros(capacity, dtype=bool)
+        else:
+            self.data = array(typecode) if typecode else []
+            self.mask = bytearray()
+
+    def _grow(self, need: int):
+        capacity = len(self.data)
+        if need <= capacity:
+            return
+        while capacity < need:
+            capacity = max(capacity * 2, 16)
+        data = np.empty(capacity, dtype=self.data.dtype)
+        data[:self.size] = self.data[:self.size]
+        mask = np.zeros(capacity, dtype=bool)
+        mask[:self.size] = self.mask[:self.size]
+        self.data, self.mask = data, mask
+
+    def extend(self, values: List):
+        nulls = [val is None for val in values]
+        if np is not None:
+            self._extend_numpy(values, nulls)
+        else:
+            self._extend_array(values, nulls)
+        self.size += len(values)
+
+    def _extend_numpy(self, values: List, nulls: List[bool]):
+        end = self.size + len(values)
+        self._grow(end)
+        fill = _KINDS[self.kind][2]
+        if self.kind == 'datetime':
+            # None converts to NaT
+            chunk = np.array([_to_datetime(val) for val in values], dtype=self.data.dtype)
+        elif self.kind == 'date':
+            chunk = np.array([_to_date(val) for val in values], dtype=self.data.dtype)
+        elif fill is not None and any(nulls):
+            chunk = [fill if null else val for val, null in zip(values, nulls)]
+        else:
+            chunk = values
+        self.data[self.size:end] = chunk
+        self.mask[self.size:end] = nulls
+
+    def _extend_array(self, values: List, nulls: List[bool]):
+        if self.kind == 'datetime':
+            values = [0 if val is None else (_to_datetime(val) - _EPOCH) // _US for val in values]
+        elif self.kind == 'date':
+            values = [0 if val is None else (_to_date(val) - _EPOCH_DATE).days for val in values]
+        elif self.kind != 'object' and any(nulls):
+            fill = _KINDS[self.kind][2]
+            values = [fill if null else val for val, null in zip(values, nulls)]
+        self.data.extend(values)
+        self.mask.extend(nulls)
+
+    def finish(self) -> tuple:
+        if np is not None:
+            return self.data[:self.size], self.mask[:self.size]
+        return self.data, self.mask
+
+
+class ColumnarResult(dict):
+    """
+    Column name to values: NumPy arrays, or `array.array` (datetimes as microseconds and dates as days since epoch)
+    and lists for the other types when NumPy is missing
+
+    `masks[col][i]` is true if the i-th value of col is NULL, `size` is the number of rows
+    """
+
+    def __init__(self, columns: Dict, masks: Dict, size: int):
+        super(ColumnarResult, self).__init__(columns)
+        self.masks = masks
+        self.size = size
+
+    @property
+    def numpy(self) -> bool:
+        return np is not None
+
+
+def build_columns(cols: List[str], kinds: List[str], chunks: Iterable[List[tuple]],
+                  capacity: int = 1024) -> ColumnarResult:
+    """
+    Fill the columns from chunks of row tuples
+    :param cols:
+    :param kinds: see `column_kind`
+    :param chunks: lists of rows like the ones of `fetchmany`
+    :param capacity: initial rows of the NumPy buffers
+    :return:
+    """
+    buffers = [_Column(kind, capacity) for kind in kinds]
+    size = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        for idx, values in enumerate(zip(*chunk)):
+            buffers[idx].extend(list(values))
+        size += len(chunk)
+    columns = {}
+    masks = {}
+    for col, buffer in zip(cols, buffers):
+        columns[col], masks[col] = buffer.finish()
+    return ColumnarResult(columns, masks, size)
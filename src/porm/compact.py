@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Compact rows of a model: the values live in a list indexed by field position, the active and dirty fields
+are bitmasks, the fields are read and written through descriptors generated per model
+"""
+import json
+from collections.abc import Mapping
+
+from porm.errors import EmptyError, ValidationError
+from porm.types.core import LazyDict
+from porm.utils import PormJsonEncoder
+
+__all__ = (
+    'CompactRow', 'compact_class', 'dumps_values'
+)
+
+
+def dumps_values(data: dict) -> str:
+    """
+    JSON of validated values, the JSON values never decoded are passed through as read
+    :param data:
+    :return:
+    """
+    if not any(isinstance(val, LazyDict) and not val.decoded for val in data.values()):
+        return json.dumps(data, cls=PormJsonEncoder)
+    return '{' + ', '.join('{}: {}'.format(
+        json.dumps(_fn), val.raw if isinstance(val, LazyDict) and not val.decoded else json.dumps(
+            val, cls=PormJsonEncoder)) for _fn, val in data.items()) + '}'
+
+
+class _FieldSlot(object):
+    __slots__ = ('name', 'idx', 'bit', 'type')
+
+    def __init__(self, name: str, idx: int, field_type):
+        self.name = name
+        self.idx = idx
+        self.bit = 1 << idx
+        self.type = field_type
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if not instance._active & self.bit:
+            raise EmptyError(u'Field: {} is Not Valid'.format(self.name))
+        return instance._values[self.idx]
+
+    def __set__(self, instance, value):
+        instance._values[self.idx] = self.type.validate(value)
+        instance._active |= self.bit
+        instance._dirty |= self.bit
+
+
+class CompactRow(Mapping):
+    """
+    Row of a model without the dicts of `DBModel`, build its class by `compact_class`
+
+    It reads like a mapping of the active fields, convert it by `to_model` to write it
+    """
+    __slots__ = ('_values', '_active', '_dirty')
+
+    _model = None
+    _fields: tuple = ()
+    _slots: dict = {}
+
+    def __init__(self, **kwargs):
+        self._values = [None] * len(self._fields)
+        self._active = 0
+        self._dirty = 0
+        for field_name, field_val in kwargs.items():
+            slot = self._slot(field_name)
+            self._values[slot.idx] = slot.type.validate(field_val)
+            self._active |= slot.bit
+
+    @classmethod
+    def _slot(cls, field_name: str) -> _FieldSlot:
+        try:
+            return cls._slots[field_name]
+        except KeyError:
+            raise ValidationError(u'Unkown Field: {} In Valid Fields: {}'.format(field_name, list(cls._fields)))
+
+    @classmethod
+    def from_valid(cls, data: dict):
+        """
+        Build a row from validated values without validating them again
+        :param data:
+        :return:
+        """
+        row = cls.__new__(cls)
+        row._values = [None] * len(cls._fields)
+        row._active = 0
+        row._dirty = 0
+        for field_name, field_val in data.items():
+            slot = cls._slot(field_name)
+            row._values[slot.idx] = field_val
+            row._active |= slot.bit
+        return row
+
+    def __getitem__(self, field_name: str):
+        slot = self._slot(field_name)
+        if not self._active & slot.bit:
+            raise EmptyError(u'Empty Value: {}'.format(field_name))
+        return self._values[slot.idx]
+
+    def __setitem__(self, field_name: str, field_val):
+        self._slot(field_name).__set__(self, field_val)
+
+    def __contains__(self, field_name: object) -> bool:
+        slot = self._slots.get(field_name)
+        return slot is not None and bool(self._active & slot.bit)
+
+    def __iter__(self):
+        active = self._active
+        return (field_name for idx, field_name in enumerate(self._fields) if active >> idx & 1)
+
+    def __len__(self) -> int:
+        return bin(self._active).count('1')
+
+    def get(self, field_name: str, default=None):
+        return self[field_name] if field_name in self else default
+
+    def __str__(self):
+        return dumps_values(self.to_dict())
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(self.__class__.__name__, self.to_dict())
+
+    def __reduce__(self):
+        return _restore, (self._model, self._values, self._active, self._dirty)
+
+    @property
+    def dirty_fields(self) -> list:
+        """
+        Fields set after the row is built
+        :return:
+        """
+        dirty = self._dirty
+        return [field_name for idx, field_name in enumerate(self._fields) if dirty >> idx & 1]
+
+    def to_dict(self) -> dict:
+        values = self._values
+        active = self._active
+        return {field_name: values[idx] for idx, field_name in enumerate(self._fields) if active >> idx & 1}
+
+    def to_model(self):
+        """
+        Convert to an object of the model holding the active fields
+        :return:
+        """
+        return self._model.new(**self.to_dict())
+
+
+def _restore(model, values: list, active: int, dirty: int) -> CompactRow:
+    model._check_meta()
+    cls = compact_class(model)
+    row = cls.__new__(cls)
+    row._values = values
+    row._active = active
+    row._dirty = dirty
+    return row
+
+
+def compact_class(model) -> type:
+    """
+    Get the compact row class of model, it is generated once per model class
+    :param model: DBModel class with its metadata initialized
+    :return:
+    """
+    cls = model.__dict__.get('_compact_class')
+    if cls is not None:
+        return cls
+    fields = tuple(model.__META__.fields)
+    slots = {
+        field_name: _FieldSlot(field_name, idx, model.__META__.get_field_type(field_name))
+        for idx, field_name in enumerate(fields)
+    }
+    attrs = {'__slots__': (), '__module__': model.__module__, '_model': model, '_fields': fields, '_slots': slots}
+    for field_name, slot in slots.items():
+        if not hasattr(CompactRow, field_name):
+            attrs[field_name] = slot
+    cls = type('{}Compact'.format(model.__name__), (CompactRow,), attrs)
+    setattr(model, '_compact_class', cls)
+    return cls
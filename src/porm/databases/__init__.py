@@ -1,5 +1,7 @@
 __all__ = (
-    'MyDBApi'
+    'MyDBApi', 'AsyncMyDBApi', 'ConnectionPool'
 )
 
 from porm.databases.api.mysql import MyDBApi
+from porm.databases.api.asyncmysql import AsyncMyDBApi
+from porm.databases.api.pool import ConnectionPool
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import contextvars
 import logging
 import threading
 import uuid
 import warnings
+from contextlib import contextmanager
 from functools import wraps
 from typing import List, Dict
 
+from porm.caches import IdentityMap
 from porm.databases.api.drivers import mysql_constants
 from porm.errors import InterfaceError, OperationalError, __exception_wrapper__
+from porm.forks import current_pid
 
 try:  # Python 2.7+
     from logging import NullHandler
@@ -24,6 +28,8 @@ logger.addHandler(NullHandler())
 # explain usage
 SENTINEL = object()
 
+_bound_dbi: contextvars.ContextVar = contextvars.ContextVar('porm_bound_dbi', default=None)
+
 
 class _callable_context_manager(object):
     def __call__(self, fn):
@@ -51,6 +57,8 @@ class _ConnectionState(object):
         self.ctx = []
         self.transactions = []
         self.db_type = 'mysql'
+        # process the connection is opened in
+        self.pid = None
 
         self.reset()
 
@@ -67,12 +75,32 @@ class _ConnectionState(object):
         self.ctx = []
         self.transactions = []
         self.db_type = 'mysql'
+        self.pid = current_pid()
+
+    @property
+    def inherited(self) -> bool:
+        """
+        The connection is opened by another process, the parent of a fork
+        :return:
+        """
+        return not self._closed and self.pid != current_pid()
+
+    def drop(self):
+        """
+        Forget the connection without closing it: the session belongs to the parent of a fork, the driver
+        releases the socket of this process only
+        :return:
+        """
+        logger.debug('Dropping the connection inherited from process {}'.format(self.pid))
+        self.reset()
 
     def set_db_type(self, db_type: str):
         self.db_type = db_type
 
     @property
     def closed(self):
+        if self.inherited:
+            self.drop()
         if self._closed:
             return self._closed
         else:
@@ -84,16 +112,6 @@ class _ConnectionLocal(_ConnectionState, threading.local):
     pass
 
 
-class _NoopLock(object):
-    __slots__ = ()
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
-
-
 # TRANSACTION CONTROL.
 
 
@@ -102,10 +120,26 @@ class _transaction(_callable_context_manager):
         self.db = db
         self._lock_type = lock_type
         self._pessimistic = pessimistic
+        self._on_finish: List[callable] = []
+        self.identity_map = IdentityMap()
 
     def _begin(self):
         self.db.begin(_lock_type=self._lock_type, pessimistic=self._pessimistic)
 
+    def on_finish(self, cb: callable):
+        """
+        Register a callback run once the current transaction is committed or rolled back
+        :param cb:
+        :return:
+        """
+        self._on_finish.append(cb)
+
+    def _finish(self):
+        self.identity_map.clear()
+        callbacks, self._on_finish = self._on_finish, []
+        for cb in callbacks:
+            cb()
+
     def commit(self, begin=True, on_commit_failure: List[callable] = None):
         try:
             with __exception_wrapper__:
@@ -115,11 +149,16 @@ class _transaction(_callable_context_manager):
                 for cb in on_commit_failure:
                     cb()
             raise
+        finally:
+            self._finish()
         if begin:
             self._begin()
 
     def rollback(self, begin=True):
-        self.db.rollback()
+        try:
+            self.db.rollback()
+        finally:
+            self._finish()
         if begin:
             self._begin()
 
@@ -213,11 +252,11 @@ class DBApi(_callable_context_manager):
     def __init__(
             self, database_name=None, db=None, thread_safe=True, autorollback=False, autocommit=None, autoconnect=True,
             t: _transaction = None, **config):
-        if t:
-            other_dbi = t.db
+        other_dbi = t.db if t else self._get_bound(db or database_name, config)
+        if other_dbi is not None:
             self.set_init_config(**other_dbi.get_init_config())
             self._state = other_dbi.state
-            self._lock = other_dbi.lock
+            self._init_params = other_dbi._init_params
             self.connect_params = {}
             self.connect_params.update(config)
             self.deferred = not bool(self.conn)
@@ -225,16 +264,42 @@ class DBApi(_callable_context_manager):
             self.set_init_config(
                 database_name=database_name, db=db, thread_safe=thread_safe, autorollback=autorollback,
                 autocommit=autocommit, autoconnect=autoconnect)
-            if thread_safe:
-                self._state = _ConnectionLocal()
-                self._lock = threading.Lock()
-            else:
-                self._state = _ConnectionState()
-                self._lock = _NoopLock()
+            # the state is per thread if thread_safe, so connecting and the sessions need no lock
+            self._state = _ConnectionLocal() if thread_safe else _ConnectionState()
+            self._init_params = dict(config)
             self.connect_params = {}
             self.deferred = False
             self.init(autocommit=self.autocommit, **config)
 
+    @staticmethod
+    def _get_bound(database_name, config: dict) -> DBApi:
+        """
+        Get the connection bound to the current context by `bind` if it is opened with the same config
+        and not in a transaction
+        :param database_name:
+        :param config:
+        :return:
+        """
+        bound = _bound_dbi.get()
+        if bound is None or bound.in_transaction():
+            return None
+        if bound.database_name != database_name or bound._init_params != config:
+            return None
+        return bound
+
+    @contextmanager
+    def bind(self):
+        """
+        Bind this connection to the current context, the api objects of the same config created in the context
+        without a transaction share it instead of opening new connections
+        :return:
+        """
+        token = _bound_dbi.set(self)
+        try:
+            yield self
+        finally:
+            _bound_dbi.reset(token)
+
     def set_init_config(
             self, database_name=None, db=None, thread_safe=True, autorollback=False, autocommit=None, autoconnect=True):
         self.autoconnect = autoconnect
@@ -299,31 +364,26 @@ class DBApi(_callable_context_manager):
         return db_type
 
     def connect(self, reuse_if_open=False):
-        with self._lock:
-            if self.deferred:
-                raise InterfaceError('Error, database must be initialized '
-                                     'before opening a connection.')
-            if not self._state.closed:
-                if reuse_if_open:
-                    return False
-                raise OperationalError('Connection already opened.')
-            self._state.reset()
-            with __exception_wrapper__:
-                new_conn = self._connect()
-                self._state.set_connection(new_conn)
-                db_type = self._get_db_type(new_conn)
-                self._state.set_db_type(db_type)
-                self._initialize_connection(self._state.conn)
+        if self.deferred:
+            raise InterfaceError('Error, database must be initialized '
+                                 'before opening a connection.')
+        if not self._state.closed:
+            if reuse_if_open:
+                return False
+            raise OperationalError('Connection already opened.')
+        self._state.reset()
+        with __exception_wrapper__:
+            new_conn = self._connect()
+            self._state.set_connection(new_conn)
+            db_type = self._get_db_type(new_conn)
+            self._state.set_db_type(db_type)
+            self._initialize_connection(self._state.conn)
         return True
 
     @property
     def state(self):
         return self._state
 
-    @property
-    def lock(self):
-        return self._lock
-
     @property
     def conn(self):
         if self.is_closed():
@@ -342,26 +402,23 @@ class DBApi(_callable_context_manager):
         self.deferred = not bool(self.conn)
 
     def session_start(self, pessimistic: bool = True):
-        with self._lock:
-            return self.transaction(pessimistic=pessimistic).__enter__()
+        return self.transaction(pessimistic=pessimistic).__enter__()
 
     def session_commit(self, on_commit_failure: List[callable] = None):
-        with self._lock:
-            try:
-                txn = self.pop_transaction()
-            except IndexError:
-                return False
-            txn.commit(begin=self.in_transaction(), on_commit_failure=on_commit_failure)
-            return True
+        try:
+            txn = self.pop_transaction()
+        except IndexError:
+            return False
+        txn.commit(begin=self.in_transaction(), on_commit_failure=on_commit_failure)
+        return True
 
     def session_rollback(self):
-        with self._lock:
-            try:
-                txn = self.pop_transaction()
-            except IndexError:
-                return False
-            txn.rollback(begin=self.in_transaction())
-            return True
+        try:
+            txn = self.pop_transaction()
+        except IndexError:
+            return False
+        txn.rollback(begin=self.in_transaction())
+        return True
 
     def in_transaction(self):
         return bool(self._state.transactions)
@@ -383,7 +440,8 @@ class DBApi(_callable_context_manager):
         return _atomic(self)
 
     def transaction(self, pessimistic: bool = True):
-        return _transaction(self, self._lock, pessimistic=pessimistic)
+        # begun with the lock type of `pessimistic`, see `begin`
+        return _transaction(self, lock_type=True, pessimistic=pessimistic)
 
     def savepoint(self):
         return _savepoint(self)
@@ -415,21 +473,20 @@ class DBApi(_callable_context_manager):
         return self._state.conn.rollback()
 
     def close(self):
-        with self._lock:
-            if self.deferred:
-                raise InterfaceError('Error, database must be initialized '
-                                     'before opening a connection.')
-            if self.in_transaction():
-                raise OperationalError('Attempting to close database while '
-                                       'transaction is open.')
-            is_open = not self._state.closed
-            try:
-                if is_open:
-                    with __exception_wrapper__:
-                        self._close(self._state.conn)
-            finally:
-                self._state.reset()
-            return is_open
+        if self.deferred:
+            raise InterfaceError('Error, database must be initialized '
+                                 'before opening a connection.')
+        if self.in_transaction():
+            raise OperationalError('Attempting to close database while '
+                                   'transaction is open.')
+        is_open = not self._state.closed
+        try:
+            if is_open:
+                with __exception_wrapper__:
+                    self._close(self._state.conn)
+        finally:
+            self._state.reset()
+        return is_open
 
     def _close(self, conn):
         conn.close()
@@ -442,15 +499,17 @@ class DBApi(_callable_context_manager):
             self.connect()
         return self._state.conn
 
-    def cursor(self, commit=None):
+    def cursor(self, commit=None, cursor_class=None):
         if self.is_closed():
             if self.autoconnect:
                 self.connect()
             else:
                 raise InterfaceError('Error, database connection not opened.')
+        if cursor_class is not None:
+            return self._state.conn.cursor(cursor_class)
         return self._state.conn.cursor()
 
-    def execute_sql(self, sql, params: tuple = None, commit=SENTINEL):
+    def execute_sql(self, sql, params: tuple = None, commit=SENTINEL, cursor_class=None):
         logger.debug((sql, params))
         if commit is SENTINEL:
             if self.in_transaction():
@@ -459,7 +518,7 @@ class DBApi(_callable_context_manager):
                 commit = not sql[:6].lower().startswith('select')
 
         with __exception_wrapper__:
-            cursor = self.cursor(commit)
+            cursor = self.cursor(commit, cursor_class=cursor_class)
             try:
                 cursor.execute(sql, params or ())
             except Exception as ex:
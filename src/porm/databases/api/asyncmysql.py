@@ -0,0 +1,227 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List
+
+from porm.databases.api import _bound_dbi, _transaction
+from porm.databases.api.mysql import MyDBApi
+from porm.databases.api.pool import ConnectionPool
+from porm.forks import after_fork, register
+
+
+class AsyncTransaction(object):
+    """
+    Transaction on one pooled connection, use it by `async with`
+    """
+
+    def __init__(self, api: 'AsyncMyDBApi', pessimistic: bool = True, on_commit_failure: List[callable] = None):
+        self._api = api
+        self._pessimistic = pessimistic
+        self._on_commit_failure = on_commit_failure
+        self._dbi: MyDBApi = None
+        self._ctx = None
+        # a cancelled task can leave its statement running, statements of the connection never overlap
+        self._serial = threading.Lock()
+        self.transaction: _transaction = None
+
+    async def __aenter__(self) -> 'AsyncTransaction':
+        self._dbi = await self._api.acquire()
+        try:
+            self._ctx = self._dbi.start_transaction(
+                pessimistic=self._pessimistic, on_commit_failure=self._on_commit_failure)
+            self.transaction = await self.run(self._ctx.__enter__)
+        except BaseException:
+            self._api.release(self._dbi)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return await self.run(self._ctx.__exit__, exc_type, exc_val, exc_tb)
+        finally:
+            self._api.release(self._dbi)
+
+    @property
+    def db(self) -> MyDBApi:
+        return self._dbi
+
+    def _call(self, fn: callable, *args, **kwargs):
+        with self._serial:
+            return fn(*args, **kwargs)
+
+    async def run(self, fn: callable, *args, **kwargs):
+        """
+        Run a blocking call on the connection of the transaction in the I/O threads
+        :param fn:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        return await self._api.run_unbound(self._call, fn, *args, **kwargs)
+
+    async def query_many(self, sql, param=None):
+        return await self.run(self._dbi.query_many, sql, param)
+
+    async def query_one(self, sql, param=None):
+        return await self.run(self._dbi.query_one, sql, param)
+
+    async def query(self, sql, param=None):
+        return await self.run(self._dbi.query, sql, param)
+
+    async def query_tuples(self, sql, param=None):
+        return await self.run(self._dbi.query_tuples, sql, param)
+
+    async def insert_one(self, sql, param=None):
+        return await self.run(self._dbi.insert_one, sql, param)
+
+    async def insert_many(self, sql, params=None):
+        return await self.run(self._dbi.insert_many, sql, params)
+
+    async def delete(self, sql, param=None):
+        return await self.run(self._dbi.delete, sql, param)
+
+
+class AsyncMyDBApi(object):
+    """
+    Asyncio api over a pool of blocking connections, the statements run in a dedicated I/O thread pool
+    and are awaited as futures
+
+    Waiting for a free connection happens in separate threads, so the I/O threads only run statements
+    of connections already taken and a transaction holding a connection always gets a thread
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, database_name=None, pool_size: int = 8, timeout: float = None, **config):
+        """
+
+        :param database_name:
+        :param pool_size: max number of connections and of I/O threads
+        :param timeout: seconds to wait for a free connection, None to wait forever
+        :param config: connect config like `MyDBApi`
+        """
+        config.update(config.pop('config', {}))
+        if database_name:
+            config['db'] = database_name
+        self._config = config
+        self.pool = ConnectionPool(self._connect, maxsize=pool_size, timeout=timeout)
+        self._start_executors()
+        register(self)
+
+    def _start_executors(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.maxsize, thread_name_prefix='porm-io')
+        self._waiters = ThreadPoolExecutor(thread_name_prefix='porm-pool')
+
+    def _after_fork(self):
+        # the threads of the executors are not in the child, the pool empties itself
+        self._start_executors()
+
+    @classmethod
+    def _reset_shared_lock(cls):
+        cls._shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config: dict, pool_size: int = 8) -> 'AsyncMyDBApi':
+        """
+        Get the api of config shared in the process
+        :param config:
+        :param pool_size: used when the api is created
+        :return:
+        """
+        key = repr(sorted(config.items(), key=lambda item: item[0]))
+        api = cls._shared.get(key)
+        if api is None:
+            with cls._shared_lock:
+                api = cls._shared.get(key)
+                if api is None:
+                    api = cls._shared[key] = cls(pool_size=pool_size, config=dict(config))
+        return api
+
+    def _connect(self) -> MyDBApi:
+        dbi = MyDBApi(thread_safe=False, config=dict(self._config))
+        # a pooled connection must not keep the snapshot of its last read
+        MyDBApi._set_autocommit(dbi.conn, True)
+        return dbi
+
+    async def acquire(self) -> MyDBApi:
+        fut = asyncio.get_running_loop().run_in_executor(self._waiters, self.pool.acquire)
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception() or self.pool.release(f.result()))
+            raise
+
+    def release(self, dbi: MyDBApi):
+        self.pool.release(dbi)
+
+    async def run_unbound(self, fn: callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def _call_bound(self, dbi: MyDBApi, fn: callable, *args, **kwargs):
+        try:
+            with dbi.bind():
+                return fn(*args, **kwargs)
+        finally:
+            self.pool.release(dbi)
+
+    async def run(self, fn: callable, *args, **kwargs):
+        """
+        Run a blocking call in the I/O threads with a pooled connection bound to it, the `MyDBApi` objects
+        of the same config created by the call without a transaction use that connection
+        :param fn:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        dbi = await self.acquire()
+        try:
+            fut = asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self._call_bound, dbi, fn, *args, **kwargs))
+        except BaseException:
+            self.pool.release(dbi)
+            raise
+        return await fut
+
+    @staticmethod
+    def _call_dbi(method: str, *args):
+        return getattr(_bound_dbi.get(), method)(*args)
+
+    async def _run_dbi(self, method: str, *args):
+        return await self.run(self._call_dbi, method, *args)
+
+    async def query_many(self, sql, param=None):
+        return await self._run_dbi('query_many', sql, param)
+
+    async def query_one(self, sql, param=None):
+        return await self._run_dbi('query_one', sql, param)
+
+    async def query(self, sql, param=None):
+        return await self._run_dbi('query', sql, param)
+
+    async def query_tuples(self, sql, param=None):
+        return await self._run_dbi('query_tuples', sql, param)
+
+    async def insert_one(self, sql, param=None):
+        return await self._run_dbi('insert_one', sql, param)
+
+    async def insert_many(self, sql, params=None):
+        return await self._run_dbi('insert_many', sql, params)
+
+    async def delete(self, sql, param=None):
+        return await self._run_dbi('delete', sql, param)
+
+    def start_transaction(self, pessimistic: bool = True, on_commit_failure: List[callable] = None) -> AsyncTransaction:
+        """
+        Start a new transaction on a pooled connection
+        :return:
+        """
+        return AsyncTransaction(self, pessimistic=pessimistic, on_commit_failure=on_commit_failure)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._waiters.shutdown(wait=True)
+        self.pool.close()
+
+
+after_fork(AsyncMyDBApi._reset_shared_lock)
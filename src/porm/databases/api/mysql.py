@@ -135,16 +135,74 @@ class MyDBApi(DBApi):
     def query(self, sql, param=None):
         return self.query_many(sql, param)
 
-    def insert_one(self, sql, param=None):
+    def query_tuples(self, sql, param=None) -> tuple:
+        """
+        Query rows as tuples of the selected columns instead of dicts
+        :param sql:
+        :param param:
+        :return:
+        """
         try:
-            self.execute_sql(sql, params=param)
+            cursor = self.execute_sql(sql, params=param, cursor_class=driver.cursors.Cursor)
+            results = cursor.fetchall()
         except Exception as ex:
             self._log(sql, param, level='error')
             raise ex
+        return results
 
-    def insert_many(self, sql, params=None):
+    def iter_query(self, sql, param=None, as_tuples=False, chunk_size: int = 1000):
+        """
+        Stream rows by an unbuffered cursor, the connection can not run other statements till the rows are
+        consumed or the iterator is closed
+        :param sql:
+        :param param:
+        :param as_tuples: yield tuples instead of dicts
+        :param chunk_size: rows fetched at a time
+        :return:
+        """
+        for rows in self.iter_chunks(sql, param, as_tuples=as_tuples, chunk_size=chunk_size):
+            yield from rows
+
+    def iter_chunks(self, sql, param=None, as_tuples=False, chunk_size: int = 1000):
+        """
+        Stream rows by an unbuffered cursor in lists of at most chunk_size rows, see `iter_query`
+        :param sql:
+        :param param:
+        :param as_tuples:
+        :param chunk_size:
+        :return:
+        """
+        cursor_class = driver.cursors.SSCursor if as_tuples else driver.cursors.SSDictCursor
+        try:
+            cursor = self.execute_sql(sql, params=param, cursor_class=cursor_class)
+        except Exception as ex:
+            self._log(sql, param, level='error')
+            raise ex
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def insert_one(self, sql, param=None) -> int:
+        """
+        :return: number of affected rows
+        """
+        try:
+            return self.execute_sql(sql, params=param).rowcount
+        except Exception as ex:
+            self._log(sql, param, level='error')
+            raise ex
+
+    def insert_many(self, sql, params=None) -> int:
+        """
+        :return: number of affected rows
+        """
         try:
-            self.execute_sqls(sql, params=params)
+            return self.execute_sqls(sql, params=params).rowcount
         except Exception as ex:
             for param in params:
                 self._log(sql, param, level='error')
@@ -0,0 +1,166 @@
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from porm.databases.api import DBApi
+from porm.errors import OperationalError
+from porm.forks import current_pid, register
+
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+
+logger = logging.getLogger('porm')
+logger.addHandler(NullHandler())
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of api objects each owning one open connection, an api object is used by one caller at a time
+
+    The pool is emptied in the child process after a fork, the connections of the parent are dropped without
+    being closed and `warm_up` opens the ones of the child
+    """
+
+    def __init__(self, factory: callable, maxsize: int = 8, timeout: float = None):
+        """
+
+        :param factory: create a connected api object
+        :param maxsize: max number of connections
+        :param timeout: seconds to wait for a free connection, None to wait forever
+        """
+        self._factory = factory
+        self.maxsize = max(1, int(maxsize))
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._pid = current_pid()
+        register(self)
+
+    def _after_fork(self):
+        # the api objects in use belong to threads of the parent, the idle ones to its sessions
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._pid = current_pid()
+
+    def __len__(self):
+        return self._size
+
+    def acquire(self) -> DBApi:
+        with self._cond:
+            if self._closed:
+                raise OperationalError('Connection pool is closed')
+            while not self._idle and self._size >= self.maxsize:
+                if not self._cond.wait(self.timeout):
+                    raise OperationalError('No free connection in the pool of size {}'.format(self.maxsize))
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+        try:
+            return self._factory()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, dbi: DBApi):
+        if dbi.state.pid not in (None, self._pid):
+            # taken before a fork, it is not counted in the pool of this process
+            dbi.state.drop()
+            return
+        if self._closed or dbi.in_transaction():
+            # a transaction is left by an interrupted caller
+            self.discard(dbi)
+            return
+        with self._cond:
+            self._idle.append(dbi)
+            self._cond.notify()
+
+    def discard(self, dbi: DBApi):
+        """
+        Close a connection that can not be reused and free its slot
+        :param dbi:
+        :return:
+        """
+        try:
+            while dbi.session_rollback():
+                pass
+            dbi.close()
+        except Exception as ex:
+            logger.warning('Closing pooled connection failed: {}'.format(ex))
+        finally:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    def warm_up(self, size: int = None) -> int:
+        """
+        Open connections till the pool has size of them, e.g. in each worker after a prefork server forks it,
+        so the first requests do not wait for connecting
+        :param size: maxsize by default
+        :return: number of connections opened
+        """
+        size = self.maxsize if size is None else min(int(size), self.maxsize)
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if self._closed or self._size >= size:
+                        break
+                    self._size += 1
+                try:
+                    opened.append(self._factory())
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+        finally:
+            with self._cond:
+                self._idle.extend(opened)
+                self._cond.notify(len(opened))
+        return len(opened)
+
+    @contextmanager
+    def connection(self) -> DBApi:
+        dbi = self.acquire()
+        try:
+            yield dbi
+        finally:
+            self.release(dbi)
+
+    @contextmanager
+    def bind(self) -> DBApi:
+        """
+        Take a connection and bind it to the current context, see `DBApi.bind`
+        :return:
+        """
+        with self.connection() as dbi, dbi.bind():
+            yield dbi
+
+    def close(self):
+        """
+        Close the idle connections, the ones in use are closed when they are released
+        :return:
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for dbi in idle:
+            self.discard(dbi)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'size': self._size,
+            'idle': len(self._idle),
+            'maxsize': self.maxsize
+        }
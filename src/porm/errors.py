@@ -1,5 +1,6 @@
 __all__ = (
     "EmptyError", "DatabaseError", "InterfaceError", "OperationalError", "ValidationError", "ParamError",
+    "GatherError",
     "__exception_wrapper__"
 )
 
@@ -53,6 +54,26 @@ class ParamError(BaseError):
     STATUS = u'Porm Invalid Parameter Error'
 
 
+class GatherError(BaseError):
+    """
+    Raised by `gather` when some of the queries failed
+    """
+    SUBCODE = 10504
+    STATUS = u'Porm Gather Error'
+
+    def __init__(self, errors: list, results: list, *args, **kwargs):
+        """
+
+        :param errors: [(index of the query, exception), ...]
+        :param results: results in query order, None for the failed ones
+        """
+        self.errors = errors
+        self.results = results
+        message = '{} of {} queries failed: {}'.format(
+            len(errors), len(results), '; '.join('#{} {!r}'.format(idx, ex) for idx, ex in errors))
+        super(GatherError, self).__init__(message, *args, **kwargs)
+
+
 def reraise(tp, value, tb=None):
     if value.__traceback__ is not tb:
         raise value.with_traceback(tb)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Fork safety of prefork servers: a child process starts with the locks of the parent as they were at the fork,
+maybe held by threads that do not exist in the child, and with the sockets of the parent's connections
+
+The owners of such state are reset in the child by the hooks registered here, they run once from
+`os.register_at_fork`. Connections are not closed in the child, the sessions belong to the parent
+"""
+import logging
+import os
+import weakref
+
+__all__ = (
+    'after_fork', 'current_pid', 'register'
+)
+
+logger = logging.getLogger('porm')
+
+_pid = os.getpid()
+_owners = weakref.WeakSet()
+_callbacks = []
+
+
+def current_pid() -> int:
+    """
+    Pid of the current process, updated by the fork hook instead of a system call each time
+    :return:
+    """
+    return _pid
+
+
+def register(owner):
+    """
+    Call `owner._after_fork()` in the child process after each fork while owner is alive
+    :param owner: weakly referenced
+    :return:
+    """
+    _owners.add(owner)
+
+
+def after_fork(fn: callable) -> callable:
+    """
+    Call fn in the child process after each fork, usable as a decorator
+    :param fn:
+    :return:
+    """
+    _callbacks.append(fn)
+    return fn
+
+
+def _run_in_child():
+    global _pid
+    _pid = os.getpid()
+    for fn in list(_callbacks) + [owner._after_fork for owner in list(_owners)]:
+        try:
+            fn()
+        except Exception as ex:
+            logger.warning('Resetting {!r} after fork failed: {}'.format(fn, ex))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_run_in_child)
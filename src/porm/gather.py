@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List
+
+from porm.errors import GatherError, ParamError
+from porm.forks import after_fork
+
+__all__ = (
+    'gather', 'Query', 'QueryBuilder'
+)
+
+GATHER_WORKERS = 16
+
+_executor: ThreadPoolExecutor = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+class Query(object):
+    """
+    Deferred read of a model built by `DBModel.q`, it runs on a pooled connection of the model when gathered
+    """
+    __slots__ = ('model', 'method', 'args', 'kwargs')
+
+    def __init__(self, model, method: str, args: tuple, kwargs: dict):
+        self.model = model
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return getattr(self.model, self.method)(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return '<Query {}.{}({})>'.format(self.model.__name__, self.method, ', '.join(
+            [repr(arg) for arg in self.args] + ['{}={!r}'.format(k, v) for k, v in self.kwargs.items()]))
+
+    def run_pooled(self):
+        pool = self.model._get_pool(self.kwargs.get('db'))
+        with pool.bind():
+            return self()
+
+
+class _ModelQueries(object):
+    __slots__ = ('_model',)
+
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, method: str):
+        if method not in QueryBuilder.READS:
+            raise AttributeError('{} is not a read of {}'.format(method, self._model.__name__))
+
+        def build(*args, **kwargs) -> Query:
+            if kwargs.get('t') is not None:
+                raise ParamError('Gathered queries run on their own connections, not in a transaction')
+            return Query(self._model, method, args, kwargs)
+
+        return build
+
+
+class QueryBuilder(object):
+    """
+    `Model.q.get_many(...)` builds the `Query` of `Model.get_many(...)` instead of running it
+    """
+    READS = frozenset({'get_one', 'get_many', 'count', 'search', 'get_many_and_join', 'search_and_join'})
+
+    def __get__(self, instance, owner) -> _ModelQueries:
+        return _ModelQueries(owner)
+
+
+@after_fork
+def _reset_executor():
+    # the worker threads are not in the child
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=GATHER_WORKERS, thread_name_prefix='porm-gather')
+    return _executor
+
+
+def _run(query):
+    _worker.active = True
+    try:
+        if isinstance(query, Query):
+            return query.run_pooled()
+        return query()
+    finally:
+        _worker.active = False
+
+
+def _run_inline(query) -> Future:
+    fut = Future()
+    try:
+        fut.set_result(query())
+    except Exception as ex:
+        fut.set_exception(ex)
+    return fut
+
+
+def gather(*queries, return_exceptions: bool = False, timeout: float = None) -> List:
+    """
+    Run independent reads concurrently on pooled connections in a bounded thread pool
+
+        ui, cnt = gather(UserInfo.q.get_one(userid=1), UserBodyInfo.q.count(weight=(180, '>')))
+
+    :param queries: `Query` of `Model.q` or any callable
+    :param return_exceptions: put the exceptions in the results instead of raising
+    :param timeout: seconds to wait for all the queries
+    :return: results in the order of queries
+    """
+    if not queries:
+        return []
+    for query in queries:
+        if not callable(query):
+            raise ParamError('Gathered query must be callable: {!r}'.format(query))
+    if len(queries) == 1 or getattr(_worker, 'active', False):
+        # nested gathers run in place on the connection of their worker, they never wait for the workers
+        # or the connections they are holding
+        futs = [_run_inline(query) for query in queries]
+    else:
+        executor = _get_executor()
+        futs = [executor.submit(_run, query) for query in queries]
+        wait(futs, timeout=timeout)
+    results = []
+    errors = []
+    for idx, fut in enumerate(futs):
+        if not fut.done():
+            fut.cancel()
+            ex = TimeoutError('Query not finished in {} seconds: {!r}'.format(timeout, queries[idx]))
+        else:
+            ex = fut.exception()
+        if ex is None:
+            results.append(fut.result())
+        else:
+            errors.append((idx, ex))
+            results.append(ex if return_exceptions else None)
+    if errors and not return_exceptions:
+        raise GatherError(errors, results)
+    return results
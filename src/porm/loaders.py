@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Union
+
+__all__ = (
+    'DataLoader', 'DeferredGroup', 'active_loader'
+)
+
+_active_loaders: contextvars.ContextVar = contextvars.ContextVar('porm_active_loaders', default=None)
+
+
+def active_loader(model, key: str) -> Union[None, DataLoader]:
+    """
+    Get the loader of model and key opened by `DataLoader.batch` in the current context
+    :param model:
+    :param key:
+    :return:
+    """
+    loaders = _active_loaders.get()
+    if not loaders:
+        return None
+    return loaders.get((model, key))
+
+
+class _LoadFuture(Future):
+
+    def __init__(self, loader: DataLoader):
+        super(_LoadFuture, self).__init__()
+        self._loader = loader
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._loader.flush()
+        return super(_LoadFuture, self).result(timeout)
+
+
+class DataLoader(object):
+    """
+    Collect point lookups of one model by one key and run them as one `IN` query through `get_many`
+
+    Results, misses included, are kept for the life of the loader or of its outermost `batch` scope,
+    so create one per request
+    """
+
+    def __init__(self, model, key: str, many: bool = False, window: float = 0.0, max_batch_size: int = 500,
+                 t=None, **terms):
+        """
+
+        :param model: DBModel class
+        :param key: field name to look up by
+        :param many: a key matches many rows, load returns lists
+        :param window: seconds to wait for other threads or tasks to join a batch before running it
+        :param max_batch_size: run the batch as soon as it has that many keys
+        :param t: transaction to load in
+        :param terms: extra filters of every batch
+        """
+        self.model = model
+        self.key = key
+        self.many = many
+        self.window = window
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.t = t
+        self.terms = terms
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[object, _LoadFuture] = {}
+        self._cache: Dict[object, _LoadFuture] = {}
+        self._scopes = 0
+        self._scheduled = False
+
+    def _normalize(self, key):
+        self.model._check_meta()
+        return self.model.__META__.get_field_type(self.key).validate(key)
+
+    def load(self, key) -> Future:
+        """
+        Queue a lookup, the returned future runs the batch on `result()` if it is not run yet
+        :param key:
+        :return:
+        """
+        key = self._normalize(key)
+        with self._lock:
+            fut = self._cache.get(key)
+            if fut is None:
+                fut = self._cache[key] = self._pending[key] = _LoadFuture(self)
+            full = len(self._pending) >= self.max_batch_size
+        if full:
+            self.dispatch()
+        return fut
+
+    def load_many(self, keys: Iterable) -> List:
+        futs = [self.load(key) for key in keys]
+        return [fut.result() for fut in futs]
+
+    def get(self, key):
+        return self.load(key).result()
+
+    def prime(self, key, value):
+        """
+        Put a known result of key
+        :param key:
+        :param value:
+        :return:
+        """
+        key = self._normalize(key)
+        with self._lock:
+            if key not in self._cache:
+                fut = self._cache[key] = _LoadFuture(self)
+                fut.set_result(value)
+
+    async def aload(self, key):
+        """
+        Load in a asyncio task, tasks loading in the same loop iteration share a batch
+        :param key:
+        :return:
+        """
+        fut = self.load(key)
+        if not fut.done():
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                schedule = not self._scheduled
+                self._scheduled = True
+            if schedule:
+                loop.call_later(self.window, loop.run_in_executor, None, self.dispatch)
+        return await asyncio.wrap_future(fut)
+
+    async def aload_many(self, keys: Iterable) -> List:
+        return list(await asyncio.gather(*[self.aload(key) for key in keys]))
+
+    def flush(self):
+        if self.window and not self._scopes:
+            # let the lookups of other threads join this batch
+            time.sleep(self.window)
+        self.dispatch()
+
+    def dispatch(self):
+        """
+        Run the pending lookups as one query
+        :return:
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        if not pending:
+            return
+        terms = dict(self.terms)
+        terms[self.key] = (list(pending.keys()), 'IN')
+        try:
+            objs = self.model.get_many(t=self.t, **terms)
+        except BaseException as ex:
+            with self._lock:
+                for key in pending.keys():
+                    self._cache.pop(key, None)
+            for fut in pending.values():
+                fut.set_exception(ex)
+            return
+        self.batches += 1
+        grouped = {}
+        for obj in objs:
+            grouped.setdefault(obj[self.key], []).append(obj)
+        for key, fut in pending.items():
+            found = grouped.get(key, [])
+            if self.many:
+                fut.set_result(found)
+            else:
+                fut.set_result(found[0] if found else None)
+
+    def clear(self):
+        with self._lock:
+            self._cache = {key: fut for key, fut in self._cache.items() if key in self._pending}
+
+    @contextmanager
+    def batch(self, keys: Iterable = None):
+        """
+        Batch scope: `get_one(<key>=val)` of the model in this context is served by the loader, the given keys
+        are queued so the first lookup loads all of them at once, the pending ones run at the end
+        :param keys:
+        :return:
+        """
+        if keys is not None:
+            for key in keys:
+                self.load(key)
+        loaders = dict(_active_loaders.get() or {})
+        loaders[(self.model, self.key)] = self
+        token = _active_loaders.set(loaders)
+        with self._lock:
+            self._scopes += 1
+        try:
+            yield self
+            self.dispatch()
+        finally:
+            _active_loaders.reset(token)
+            with self._lock:
+                self._scopes -= 1
+                outermost = self._scopes == 0
+            if outermost:
+                self.clear()
+
+
+class DeferredGroup(object):
+    """
+    Objects read by one query with deferred fields, the first access of a deferred field on any of them
+    loads that field for all of them by one `IN` query on the primary keys
+    """
+
+    def __init__(self, model, objs: list, db=None, table=None, t=None):
+        """
+
+        :param model: DBModel class
+        :param objs: objects of the query, they are weakly referenced
+        :param db:
+        :param table:
+        :param t: transaction of the query, the loads run outside it once it is finished
+        """
+        self.model = model
+        self.db = db
+        self.table = table
+        self.t = t
+        self.loads = 0
+        self._refs = [weakref.ref(obj) for obj in objs]
+        self._lock = threading.Lock()
+        if t is not None:
+            t.on_finish(self._detach)
+
+    def _detach(self):
+        self.t = None
+
+    def add(self, obj):
+        """
+        Load the deferred fields of obj with the others, like a copy of one of them
+        :param obj:
+        :return:
+        """
+        with self._lock:
+            self._refs.append(weakref.ref(obj))
+
+    def load(self, field_name: str):
+        with self._lock:
+            objs = []
+            for ref in self._refs:
+                obj = ref()
+                if obj is not None and obj._deferred and field_name in obj._deferred:
+                    objs.append(obj)
+            if objs:
+                self.model._load_deferred(objs, field_name, db=self.db, table=self.table, t=self.t)
+                self.loads += 1
@@ -4,14 +4,27 @@ import logging
 from collections import OrderedDict
 from contextlib import contextmanager
 from copy import deepcopy
-from typing import List, Union, Dict
-
+from functools import partial
+from typing import Dict, Iterator, List, Union
+
+from porm.batch import validate_columns
+from porm.caches import EntityCache, IdentityMap, SingleFlight
+from porm.codec import dumps_rows, loads_columns, loads_rows
+from porm.codegen import RowFunctions, compile_rows
+from porm.columnar import ColumnarResult, build_columns, column_kind
+from porm.compact import CompactRow, compact_class
 from porm.databases.api import _transaction
+from porm.databases.api.asyncmysql import AsyncMyDBApi, AsyncTransaction
 from porm.databases.api.mysql import MyDBApi
+from porm.databases.api.pool import ConnectionPool
 from porm.errors import ValidationError, EmptyError, ParamError
+from porm.gather import QueryBuilder
+from porm.loaders import DataLoader, DeferredGroup, active_loader
 from porm.orms import Field, Join, SQL
 from porm.parsers.mysql import parse, parse_join, ParsedResult
-from porm.types.core import VarcharType, BaseType, IntegerType, DictType
+from porm.queryset import QuerySet
+from porm.serialize import dumps_result, row_encoder
+from porm.types.core import VarcharType, BaseType, IntegerType, FloatType, LazyDict
 from porm.utils import param_notempty, type_check, PormJsonEncoder, notnone_check
 
 __all__ = ("DBModel",)
@@ -71,6 +84,7 @@ class DBModelMetaData(object):
         self._database = None
         self._connection_config = connection_config
         self._table = None
+        self._rows: RowFunctions = None
         self._init_table()
 
     def _init_table(self):
@@ -90,6 +104,17 @@ class DBModelMetaData(object):
             self._init_table()
         return self._table
 
+    @property
+    def rows(self) -> RowFunctions:
+        """
+        Row functions generated for the fields, see `porm.codegen`
+        :return:
+        """
+        if self._rows is None:
+            self._rows = compile_rows(
+                self.fields, [_f.type for _f in self._fields.values()], model_name=self.table.full_name)
+        return self._rows
+
     @property
     def config(self):
         return self._connection_config.copy()
@@ -106,12 +131,23 @@ class DBModelMetaData(object):
     def has_field(self, field_name) -> bool:
         return field_name in self._fields
 
+    @property
+    def deferred_fields(self) -> frozenset:
+        """
+        Fields declared with `deferred=True`, they can only be loaded later by primary key
+        :return:
+        """
+        if not self.table.primary_keys:
+            return frozenset()
+        return frozenset(_fn for _fn, _f in self._fields.items() if _f.type.deferred and not _f.type.ispk())
+
     @type_check(field_type=BaseType)
     def add_field(self, field_name: str, field_type: BaseType = VarcharType()):
         tablename = self.get_full_table_name() + '.'
         field_name_with_table = field_name if field_name.startswith(tablename) else tablename + field_name
         field_type.set_name(field_name_with_table)
         self._fields[field_name] = Field(field_name_with_table, field_type)
+        self._rows = None
         if field_type.ispk():
             self.table.add_primary_key(field_name)
         else:
@@ -198,7 +234,7 @@ class DBModelMeta(type):
     instances are ignored by the metaclass.
     """
 
-    CUSTOM_ATTR = {'__DATABASE__', '__TABLE__', '__CONFIG__', '__DB__'}
+    CUSTOM_ATTR = {'__DATABASE__', '__TABLE__', '__CONFIG__', '__DB__', '__CACHE__', '__SINGLEFLIGHT__'}
 
     def __new__(mcs, name: str, bases: tuple, attrs: dict):
         """
@@ -301,10 +337,18 @@ class BaseDBModel(dict):
     __DB__: str = 'PORM_DATABASE'
     __TABLE__: str = 'BaseDBModel'
     __CONFIG__: dict = None
+    __CACHE__: EntityCache = None
+    __SINGLEFLIGHT__: SingleFlight = None
+    # fields left out by the query and the group loading them
+    _deferred: set = None
+    _deferred_group: DeferredGroup = None
+    # `_data` shared with a copy till the first write, fields of dict values shared till they are read
+    _cow: bool = False
+    _shared: set = None
 
     def __new__(cls, *args, **kwargs):
-        _metadata = cls._init_cls_meta_data()
-        cls._set_cls_columns(_metadata)
+        if '__META__' not in cls.__dict__:
+            cls._init_cls_meta_data()
         return dict.__new__(cls, *args, **kwargs)
 
     @classmethod
@@ -313,6 +357,11 @@ class BaseDBModel(dict):
         table_name = getattr(cls, '__TABLE__', cls.__class__.__name__)
         connection_config = getattr(cls, '__CONFIG__', None)
         metadata = DBModelMetaData(database_name=database_name, table_name=table_name, **connection_config)
+        cls._set_cls_columns(metadata)
+        # generate the row functions with the class
+        metadata.rows
+        # the metadata of a class is built once and only published complete, a subclass does not share
+        # the one of its base
         setattr(cls, '__META__', metadata)
         return metadata
 
@@ -355,22 +404,21 @@ class BaseDBModel(dict):
         super(BaseDBModel, self).__init__(**kwargs)
         self._data = dict()
         self._actived_fields = dict()
+        self._related = dict()
         self._init_data(**kwargs)
 
     def _init_data(self, **kwargs):
-        for field_name, field_val in kwargs.items():
-            field = self.__META__.get_field_type(field_name)
-            valid_val = field.validate(field_val)
-            self._data[field_name] = valid_val
-            self._actived_fields[field_name] = True
+        self._data = self.__META__.rows.validate_row(kwargs)
+        self._actived_fields = dict.fromkeys(self._data, True)
 
     def __len__(self) -> int:
         return len(self._data)
 
     def __getitem__(self, field_name: str):
-        if self.__META__.has_field(field_name) and field_name in self._actived_fields:
+        if self.__META__.has_field(field_name) and (
+                field_name in self._actived_fields or self._load_deferred_field(field_name)):
             if field_name in self._data:
-                return self._data[field_name]
+                return self._own_value(field_name)
             else:
                 raise EmptyError(u'Empty Value: {}'.format(field_name))
         else:
@@ -378,12 +426,19 @@ class BaseDBModel(dict):
 
     def __setitem__(self, field_name: str, field_val):
         if self.__META__.has_field(field_name):
-            self._data[field_name] = self.__META__.get_field_type(field_name).validate(field_val)
+            field_val = self.__META__.get_field_type(field_name).validate(field_val)
+            self._own_data()
+            self._data[field_name] = field_val
             self._actived_fields[field_name] = True
+            if self._shared:
+                self._shared.discard(field_name)
+            if self._deferred:
+                self._deferred.discard(field_name)
         else:
             raise ValidationError(u'Unkown Field: {} In Valid Fields: {}'.format(field_name, self.__META__.fields))
 
     def __delitem__(self, key: str) -> None:
+        self._own_data()
         del self._data[key]
         del self._actived_fields[key]
 
@@ -394,13 +449,149 @@ class BaseDBModel(dict):
         return self.__META__.has_field(field_name) and field_name in self._actived_fields
 
     def copy(self):
-        _d = {}
-        for actived_field in self._actived_fields.keys():
-            _d[actived_field] = self._data[actived_field]
-        return self.__class__(**deepcopy(_d))
+        """
+        Copy on write: the copy shares the values with the object till one of them writes a field,
+        dict values are copied when they are read
+        :return:
+        """
+        obj = self.__class__.__new__(self.__class__)
+        dict.update(obj, dict.items(self))
+        obj._data = self._data
+        obj._actived_fields = self._actived_fields
+        obj._related = dict()
+        obj._cow = self._cow = True
+        obj._shared = self._share_values()
+        if self._deferred:
+            obj._deferred = set(self._deferred)
+            obj._deferred_group = self._deferred_group
+            self._deferred_group.add(obj)
+        return obj
+
+    def _own_data(self):
+        """
+        Copy `_data` shared with a copy before writing it
+        :return:
+        """
+        if self._cow:
+            self._data = dict(self._data)
+            self._actived_fields = dict(self._actived_fields)
+            self._cow = False
+
+    def _own_value(self, field_name: str):
+        """
+        Value of the field to hand out, a dict value shared with a copy is copied first, a `LazyDict` is decoded
+        :param field_name:
+        :return:
+        """
+        if self._shared and field_name in self._shared:
+            self._shared.discard(field_name)
+            self._own_data()
+            self._data[field_name] = deepcopy(self._data[field_name])
+        val = self._data[field_name]
+        if val.__class__ is LazyDict and val.raw is not None:
+            val._decode()
+        return val
+
+    def _share_values(self) -> set:
+        """
+        Mark the dict values as shared
+        :return: the shared fields for the other holder of the values
+        """
+        shared = {_fn for _fn, val in self._data.items() if isinstance(val, dict)}
+        if shared:
+            self._shared = shared | self._shared if self._shared else set(shared)
+        return shared
+
+    def _snapshot(self) -> tuple:
+        """
+        Validated state of the object that is safe to keep aside, the values are shared with the object
+        till it writes or reads them, see `copy`
+        :return: (raw init values, validated values)
+        """
+        self._cow = True
+        self._share_values()
+        return dict(dict.items(self)), self._data
+
+    @classmethod
+    def _from_snapshot(cls, snapshot: tuple):
+        """
+        Build an object from `_snapshot` without validating the values again, it shares the values
+        of the snapshot like a copy
+        :param snapshot:
+        :return:
+        """
+        raw, data = snapshot
+        obj = cls.__new__(cls)
+        dict.update(obj, raw)
+        obj._data = data
+        obj._actived_fields = dict.fromkeys(data.keys(), True)
+        obj._related = dict()
+        obj._cow = True
+        obj._shared = {_fn for _fn, val in data.items() if isinstance(val, dict)}
+        return obj
+
+    @classmethod
+    def _from_valid(cls, raw: dict, data: dict) -> BaseDBModel:
+        """
+        Build an object from validated values without validating them again, unless the class overrides
+        `new` or `__init__`: its objects are built by `new` from the JSON safe values then
+        :param raw: JSON safe values kept in the dict of the object
+        :param data: validated values
+        :return:
+        """
+        if cls._builds_itself():
+            return cls.new(**raw)
+        obj = cls.__new__(cls)
+        dict.update(obj, raw)
+        obj._data = data
+        obj._actived_fields = dict.fromkeys(data, True)
+        obj._related = dict()
+        return obj
+
+    @classmethod
+    def _builds_itself(cls) -> bool:
+        new = getattr(cls, 'new', None)
+        return cls.__init__ is not BaseDBModel.__init__ or (
+            new is not None and new.__func__ is not DBModel.new.__func__)
+
+    def __reduce__(self):
+        # by default pickle sets the dict items through `__setitem__` before the attributes exist
+        return self.__class__._from_valid, (dict(dict.items(self)), self._data)
+
+    def _set_related(self, name: str, objs: list):
+        self._related[name] = objs
+
+    def get_related(self, model) -> list:
+        """
+        Get the related objects loaded by `prefetch`
+        :param model: DBModel class or its table name
+        :return:
+        """
+        name = model if isinstance(model, str) else model.__TABLE__
+        if name not in self._related:
+            raise EmptyError(u'Related: {} is Not Prefetched'.format(name))
+        return self._related[name]
+
+    @property
+    def related(self) -> dict:
+        return self._related.copy()
+
+    def to_compact(self) -> CompactRow:
+        """
+        Convert to the compact row of the model holding the active fields, see `DBModel.compact_class`
+        :return:
+        """
+        return compact_class(self.__class__).from_valid(
+            {_fn: self._own_value(_fn) for _fn in list(self._actived_fields) if _fn in self._data})
+
+    def _pk_cache_key(self) -> Union[None, tuple]:
+        pks = self.__META__.table.primary_keys
+        if not pks or any(pk not in self._actived_fields for pk in pks):
+            return None
+        return self.__META__.get_full_table_name(), tuple(self._data[pk] for pk in pks)
 
     def __str__(self):
-        return json.dumps(self._data, cls=PormJsonEncoder)
+        return row_encoder(self.__class__).text(self._data)
 
     def __repr__(self):
         ret = {}
@@ -423,8 +614,8 @@ class BaseDBModel(dict):
         #     return self.dbi
         # el
         if item in self.__META__.fields:
-            if self.is_valid_field(item):
-                return self._data[item]
+            if self.is_valid_field(item) or self._load_deferred_field(item):
+                return self._own_value(item)
             else:
                 raise EmptyError(u'Field: {} is Not Valid'.format(item))
         else:
@@ -434,6 +625,25 @@ class BaseDBModel(dict):
             #     u'Field: {} Not in Defined Field: {} of {}'.format(
             #         item, self.__META__.fields, self.__META__.get_full_table_name()))
 
+    def _load_deferred_field(self, field_name: str) -> bool:
+        """
+        Load a deferred field of the object and of the others of its query
+        :param field_name:
+        :return: the field is valid now
+        """
+        if not self._deferred or field_name not in self._deferred:
+            return False
+        self._deferred_group.load(field_name)
+        return field_name in self._actived_fields
+
+    @property
+    def deferred_fields(self) -> List[str]:
+        """
+        Fields not loaded yet
+        :return:
+        """
+        return sorted(self._deferred) if self._deferred else []
+
     def is_valid_field(self, field_name: str) -> bool:
         """
         Check field is valid or not:
@@ -445,6 +655,14 @@ class BaseDBModel(dict):
         """
         return self.__META__.has_field(field_name) and field_name in self._actived_fields
 
+    def _has_all_fields(self) -> bool:
+        """
+        Every field is loaded or set, a confirmed write of all of them leaves the row equal to self, else the
+        columns not written keep their values or the defaults of the database
+        :return:
+        """
+        return all(field_name in self._actived_fields for field_name in self.__META__.fields)
+
     def get_valid_fields(self, for_save=True) -> OrderedDict:
         """
         Get the valid fields of:
@@ -454,17 +672,12 @@ class BaseDBModel(dict):
         including pk and columns
         :return:
         """
+        if for_save:
+            return self.__META__.rows.dump_row(self._data, self._actived_fields)
         ret = OrderedDict()
-        for _fn, val in self._data.items():
+        for _fn in list(self._data):
             if self.__META__.has_field(_fn) and _fn in self._actived_fields:
-                if for_save:
-                    _ft = self.__META__.get_field_type(field_name=_fn)
-                    if isinstance(_ft, DictType):
-                        ret[_fn] = _ft.dumps(val)
-                    else:
-                        ret[_fn] = _ft.dumps(val)
-                else:
-                    ret[_fn] = val
+                ret[_fn] = self._own_value(_fn)
             else:
                 continue
         return ret
@@ -480,9 +693,9 @@ class BaseDBModel(dict):
         :return:
         """
         ret = OrderedDict()
-        for _fn, val in self._data.items():
+        for _fn in list(self._data):
             if self.__META__.has_field(_fn) and _fn in self._actived_fields:
-                ret[_fn] = val
+                ret[_fn] = self._own_value(_fn)
             else:
                 continue
         return ret
@@ -509,8 +722,10 @@ class BaseDBModel(dict):
                 _ft = self.__META__.get_field_type(col)
                 if for_save:
                     ret[col] = _ft.dumps(self._data.get(col, _ft.default))
+                elif col in self._data:
+                    ret[col] = self._own_value(col)
                 else:
-                    ret[col] = self._data.get(col, _ft.default)
+                    ret[col] = _ft.default
         return ret
 
     @property
@@ -563,6 +778,13 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
     """
     __metaclass__ = DBModelMeta
 
+    # deferred reads for `porm.gather`
+    q = QueryBuilder()
+    # max primary keys of one query loading a deferred field
+    DEFERRED_BATCH_SIZE = 500
+    # max rows of one `executemany` by `insert_columns`
+    INSERT_CHUNK_SIZE = 5000
+
     @classmethod
     def _get_db_conf(cls, db=None):
         if db:
@@ -574,9 +796,103 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
 
     @classmethod
     def _check_meta(cls):
-        if cls.__META__ is None:
-            _metadata = cls._init_cls_meta_data()
-            cls._set_cls_columns(_metadata)
+        if '__META__' not in cls.__dict__:
+            cls._init_cls_meta_data()
+
+    @classmethod
+    def _get_entity_cache(cls, db=None, table=None) -> Union[None, EntityCache]:
+        # only rows of the default table are cached
+        if db or table:
+            return None
+        return cls.__CACHE__
+
+    @classmethod
+    def _terms_cache_key(cls, terms: dict) -> Union[None, tuple]:
+        """
+        Get the cache key if terms is an exact primary key lookup
+        :param terms:
+        :return: (full table name, pk tuple) or None
+        """
+        pks = cls.__META__.table.primary_keys
+        if not pks or set(terms.keys()) != set(pks):
+            return None
+        pk_vals = []
+        for pk in pks:
+            val = terms[pk]
+            if val is None or isinstance(val, (list, tuple)):
+                return None
+            try:
+                pk_vals.append(cls.__META__.get_field_type(pk).validate(val))
+            except Exception:
+                return None
+        return cls.__META__.get_full_table_name(), tuple(pk_vals)
+
+    @classmethod
+    def _invalidate_cache(cls, key: tuple = None, t: _transaction = None):
+        """
+        Drop the cached row of key, or all cached rows of the table when key is None
+        :param key:
+        :param t: the rows are dropped again when t finishes for readers may cache them before commit
+        :return:
+        """
+        cache = cls._get_entity_cache()
+        if cache is None:
+            return
+        if key is None:
+            invalidate = partial(cache.clear, cls.__META__.get_full_table_name())
+        else:
+            invalidate = partial(cache.invalidate, key)
+        invalidate()
+        if t is not None:
+            t.on_finish(invalidate)
+
+    @staticmethod
+    def _get_identity_map(t: _transaction = None) -> Union[None, IdentityMap]:
+        return getattr(t, 'identity_map', None) if t is not None else None
+
+    @classmethod
+    def _on_write(cls, key: tuple = None, t: _transaction = None, obj: DBModel = None, evict: bool = False):
+        """
+        Keep the entity cache and the identity map of t consistent after a write
+        :param key: cache key of the written row, None if the written rows are unknown
+        :param t:
+        :param obj: the written object, None if the row is deleted
+        :param evict: the row differs from obj, it is read again
+        :return:
+        """
+        cls._invalidate_cache(key, t=t)
+        imap = cls._get_identity_map(t)
+        if imap is not None:
+            if key is None:
+                imap.forget(cls.__META__.get_full_table_name())
+            elif evict:
+                imap.discard(key)
+                imap.forget_queries(key[0])
+            else:
+                # written rows are locked till the end of the transaction
+                imap.add(key, obj, locked=True)
+                imap.forget_queries(key[0])
+
+    @classmethod
+    def _on_insert(cls, objs: List[DBModel], t: _transaction = None, inserted: bool = True):
+        """
+        :param objs:
+        :param t:
+        :param inserted: all objs are inserted, else the rows of their keys are unknown like the ones skipped by
+            `INSERT IGNORE`; the rows of objs without all fields have columns filled by the database
+        :return:
+        """
+        imap = cls._get_identity_map(t)
+        if imap is not None:
+            for obj in objs:
+                key = obj._pk_cache_key()
+                if key is None:
+                    continue
+                if inserted and obj._has_all_fields():
+                    imap.add(key, obj, locked=True)
+                else:
+                    imap.discard(key)
+            imap.forget_queries(cls.__META__.get_full_table_name())
 
     @classmethod
     def new(cls, **kwargs) -> DBModel:
@@ -596,6 +912,86 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         with mydb.start_transaction(pessimistic=pessimistic, on_commit_failure=on_commit_failure) as _t:
             yield _t
 
+    @classmethod
+    def _get_async_dbi(cls, db: Union[str, dict] = None) -> AsyncMyDBApi:
+        cls._check_meta()
+        if isinstance(db, dict):
+            return AsyncMyDBApi.shared(db)
+        return AsyncMyDBApi.shared(cls._get_db_conf(db=db))
+
+    @classmethod
+    def _get_pool(cls, db: Union[str, dict] = None) -> ConnectionPool:
+        return cls._get_async_dbi(db).pool
+
+    @classmethod
+    def warm_up(cls, size: int = None, db: Union[str, dict] = None) -> int:
+        """
+        Open the pooled connections of the model used by `gather` and the async methods, call it in each worker
+        after a prefork server forks it, e.g. in the `post_fork` hook of gunicorn
+        :param size: number of connections, the pool size by default
+        :param db:
+        :return: number of connections opened
+        """
+        return cls._get_pool(db).warm_up(size)
+
+    @classmethod
+    async def _arun(cls, fn: callable, *args, db=None, t: AsyncTransaction = None, **kwargs):
+        """
+        Run a blocking method in the I/O threads of the async api: in the transaction t if it is given,
+        on a pooled connection otherwise
+        :param fn:
+        :param args:
+        :param db: forwarded to fn if it is given
+        :param t:
+        :param kwargs:
+        :return:
+        """
+        if db is not None:
+            kwargs['db'] = db
+        if t is not None:
+            return await t.run(fn, *args, t=t.transaction, **kwargs)
+        return await cls._get_async_dbi(db).run(fn, *args, **kwargs)
+
+    @classmethod
+    def astart_transaction(cls, db: Union[str, dict] = None, pessimistic: bool = True,
+                           on_commit_failure: List[callable] = None) -> AsyncTransaction:
+        """
+        Start a transaction on a pooled connection, use it by `async with` and pass it as t of the async methods
+        :param db:
+        :param pessimistic:
+        :param on_commit_failure:
+        :return:
+        """
+        return cls._get_async_dbi(db).start_transaction(pessimistic=pessimistic, on_commit_failure=on_commit_failure)
+
+    @classmethod
+    async def acount(cls, db=None, t: AsyncTransaction = None, **kwargs) -> int:
+        return await cls._arun(cls.count, db=db, t=t, **kwargs)
+
+    @classmethod
+    async def asearch(cls, db=None, t: AsyncTransaction = None, **kwargs) -> SearchResult:
+        return await cls._arun(cls.search, db=db, t=t, **kwargs)
+
+    @classmethod
+    async def aget_many(cls, db=None, t: AsyncTransaction = None, **kwargs) -> List[DBModel]:
+        return await cls._arun(cls.get_many, db=db, t=t, **kwargs)
+
+    @classmethod
+    async def aget_one(cls, t: AsyncTransaction = None, **kwargs) -> Union[None, DBModel]:
+        return await cls._arun(cls.get_one, t=t, **kwargs)
+
+    @classmethod
+    async def adelete_many(cls, t: AsyncTransaction = None, **terms):
+        return await cls._arun(cls.delete_many, t=t, **terms)
+
+    @classmethod
+    async def ainsert_many(cls, objs: List[BaseDBModel], t: AsyncTransaction = None, ignore=False):
+        return await cls._arun(cls.insert_many, objs, t=t, ignore=ignore)
+
+    @classmethod
+    async def ainsert_columns(cls, columns: Dict[str, list], t: AsyncTransaction = None, ignore=False) -> int:
+        return await cls._arun(cls.insert_columns, columns, t=t, ignore=ignore)
+
     @classmethod
     def count(
             cls, return_columns='COUNT(1) as cnt', db=None, table=None, join_table=None, t: _transaction = None,
@@ -608,20 +1004,291 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
                 join_parsed = parse_join(**join_table[join_t])
                 cnt_table += ' JOIN {} ON ({}) '.format(join_t, join_parsed['filter'])
                 cnt_parsed['param'].update(join_parsed['param'])
-        _get_sql_tpl = cls.__META__.get_select_sql_tpl(db=db, table=cnt_table)
+        return cls._count_by_parsed_terms(
+            return_columns=return_columns, db=db, table=cnt_table, t=t, parsed=cnt_parsed)
+
+    @classmethod
+    def _count_by_parsed_terms(
+            cls, return_columns='COUNT(1) as cnt', db=None, table=None, t=None, parsed: ParsedResult = None) -> int:
+        _get_sql_tpl = cls.__META__.get_select_sql_tpl(db=db, table=table)
         cnt_sql = _get_sql_tpl.format(
             return_columns=return_columns,
-            filter=cnt_parsed.filter
+            filter=parsed.filter
         )
-        config = cls._get_db_conf(db=db)
-        mydb = MyDBApi(config=config, t=t)
-        total_cnt = mydb.query(cnt_sql, cnt_parsed.param)[0]['cnt']
+        total_cnt = cls._query_rows(cnt_sql, parsed.param, db=db, t=t)[0]['cnt']
         return int(total_cnt)
 
+    @classmethod
+    def aggregate(
+            cls, group_by: List[str] = None, sum: List[str] = None, avg: List[str] = None, min: List[str] = None,
+            max: List[str] = None, count: bool = False, having=None, order_by=None, db=None, table=None,
+            t: _transaction = None, **terms) -> List[dict]:
+        """
+        Aggregate in the database, each result row holds the group_by fields and the aggregates
+        named like sum_<field>, avg_<field>, min_<field>, max_<field> and cnt
+        :param group_by: fields to group by
+        :param sum: fields to sum
+        :param avg: fields to average
+        :param min: fields to get the min
+        :param max: fields to get the max
+        :param count: count the rows of each group as cnt
+        :param having: `porm.orms.Condition` on the group_by fields and the aggregate names
+        :param order_by: like 'sum_height DESC'
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many`
+        :return: rows with values typed by the fields
+        """
+        cls._check_meta()
+        group_by = list(group_by or [])
+        aggregates = [(func, col) for func, cols in (('SUM', sum), ('AVG', avg), ('MIN', min), ('MAX', max))
+                      for col in cols or []]
+        for col in group_by + [col for _, col in aggregates]:
+            if not cls.__META__.has_field(col):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(col, cls.__META__.fields))
+        if not aggregates and not count:
+            raise ParamError(u'Nothing to aggregate')
+        tablename = cls.__META__.get_full_table_name(db=db, table=table)
+        columns = ['{}.{}'.format(tablename, col) for col in group_by]
+        columns.extend(
+            '{func}({tb}.{col}) AS {alias}_{col}'.format(func=func, tb=tablename, col=col, alias=func.lower())
+            for func, col in aggregates)
+        if count:
+            columns.append('COUNT(1) AS cnt')
+        parsed = parse(**terms)
+        param = dict(parsed.param)
+        sql_filter = parsed.filter
+        if group_by:
+            sql_filter += ' GROUP BY ' + ', '.join('{}.{}'.format(tablename, col) for col in group_by)
+        if having is not None:
+            compiled = having.compile(prefix='hvng_')
+            sql_filter += ' HAVING ' + compiled.sql
+            param.update(compiled.param)
+        if order_by:
+            sql_filter += ' ORDER BY ' + order_by
+        sql = cls.__META__.get_select_sql_tpl(db=db, table=table).format(
+            return_columns=', '.join(columns), filter=sql_filter)
+        rows = cls._query_rows(sql, param, db=db, t=t)
+        return [cls._type_aggregate_row(row, group_by, aggregates) for row in rows]
+
+    @classmethod
+    def _type_aggregate_row(cls, row: dict, group_by: List[str], aggregates: List[tuple]) -> dict:
+        typed = {}
+        for col in group_by:
+            val = row[col]
+            typed[col] = val if val is None else cls.__META__.get_field_type(col).validate(val)
+        for func, col in aggregates:
+            alias = '{}_{}'.format(func.lower(), col)
+            val = row[alias]
+            if val is None:
+                pass
+            elif func == 'AVG' or isinstance(cls.__META__.get_field_type(col), FloatType):
+                val = float(val)
+            elif func == 'SUM':
+                val = int(val) if isinstance(cls.__META__.get_field_type(col), IntegerType) else val
+            else:
+                val = cls.__META__.get_field_type(col).validate(val)
+            typed[alias] = val
+        if 'cnt' in row:
+            typed['cnt'] = int(row['cnt'])
+        return typed
+
+    @staticmethod
+    def _check_unpaged(terms: dict):
+        # the select is limited to its first row
+        if terms.get('page') is not None or terms.get('size') is not None:
+            raise ParamError(u'page and size are not supported, the first row is read')
+
+    @classmethod
+    def _exists_by_parsed_terms(cls, db=None, table=None, t=None, parsed: ParsedResult = None) -> bool:
+        return cls._scalar_by_parsed_terms('1', db=db, table=table, t=t, parsed=parsed) is not None
+
+    @classmethod
+    def _scalar_by_parsed_terms(
+            cls, expr: str, db=None, table=None, t=None, parsed: ParsedResult = None, limit: bool = True):
+        if cls.__META__.has_field(expr):
+            expr = '{}.{}'.format(cls.__META__.get_full_table_name(db=db, table=table), expr)
+        sql = cls.__META__.get_select_sql_tpl(db=db, table=table).format(
+            return_columns='{} AS scalar_val'.format(expr),
+            filter=parsed.filter + ' LIMIT 1' if limit else parsed.filter
+        )
+        rows = cls._query_rows(sql, parsed.param, db=db, t=t)
+        return rows[0]['scalar_val'] if rows else None
+
+    @classmethod
+    def exists(cls, db=None, table=None, t: _transaction = None, **terms) -> bool:
+        """
+        Check if any row matches by `SELECT 1 ... LIMIT 1`
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many` without page and size
+        :return:
+        """
+        cls._check_meta()
+        cls._check_unpaged(terms)
+        return cls._exists_by_parsed_terms(db=db, table=table, t=t, parsed=parse(**terms))
+
+    @classmethod
+    def scalar(cls, expr: str, order_by=None, db=None, table=None, t: _transaction = None, **terms):
+        """
+        Query a single raw value like `UserInfo.scalar('MAX(userid)')` or `UserInfo.scalar('email', userid=1)`
+        :param expr: a field name or a SQL expression
+        :param order_by:
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many` without page and size, slice a `query()` to skip rows
+        :return: the value of the first row, None if no row matches
+        """
+        cls._check_meta()
+        cls._check_unpaged(terms)
+        return cls._scalar_by_parsed_terms(expr, db=db, table=table, t=t, parsed=parse(order_by=order_by, **terms))
+
+    @classmethod
+    def _projection_sql(cls, cols: tuple, db=None, table=None, parsed: ParsedResult = None) -> str:
+        if not cols:
+            cols = tuple(cls.__META__.fields)
+        for col in cols:
+            if not cls.__META__.has_field(col):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(col, cls.__META__.fields))
+        tablename = cls.__META__.get_full_table_name(db=db, table=table)
+        return cls.__META__.get_select_sql_tpl(db=db, table=table).format(
+            return_columns=', '.join('{}.{}'.format(tablename, col) for col in cols),
+            filter=parsed.filter
+        )
+
+    @classmethod
+    def _values_by_parsed_terms(
+            cls, cols: tuple, db=None, table=None, t=None, parsed: ParsedResult = None) -> List[dict]:
+        return list(cls._query_rows(cls._projection_sql(cols, db=db, table=table, parsed=parsed), parsed.param,
+                                    db=db, t=t))
+
+    @classmethod
+    def _values_list_by_parsed_terms(
+            cls, cols: tuple, flat=False, db=None, table=None, t=None, parsed: ParsedResult = None) -> list:
+        if flat and len(cols) != 1:
+            raise ParamError(u'values_list with flat needs exactly one column')
+        sql = cls._projection_sql(cols, db=db, table=table, parsed=parsed)
+        rows = MyDBApi(config=cls._get_db_conf(db=db), t=t).query_tuples(sql, parsed.param)
+        if flat:
+            return [row[0] for row in rows]
+        return list(rows)
+
+    @classmethod
+    def _iter_by_parsed_terms(
+            cls, cols: tuple, as_tuples=False, flat=False, db=None, table=None, t=None, parsed: ParsedResult = None,
+            chunk_size: int = 1000):
+        if flat and len(cols) != 1:
+            raise ParamError(u'values_list with flat needs exactly one column')
+        sql = cls._projection_sql(cols, db=db, table=table, parsed=parsed)
+        rows = MyDBApi(config=cls._get_db_conf(db=db), t=t).iter_query(
+            sql, parsed.param, as_tuples=as_tuples or flat, chunk_size=chunk_size)
+        if flat:
+            return (row[0] for row in rows)
+        return rows
+
+    @classmethod
+    def fetch_columns(
+            cls, cols: List[str] = None, chunk_size: int = 1000, order_by=None, db=None, table=None,
+            t: _transaction = None, **terms) -> ColumnarResult:
+        """
+        Stream the columns into columnar buffers without building a dict or a model per row:
+        NumPy arrays (datetime64 for datetime fields) if NumPy is installed, `array.array` otherwise,
+        with a NULL mask per column
+        :param cols: all fields if not given
+        :param chunk_size: rows fetched at a time
+        :param order_by:
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many`
+        :return:
+        """
+        cls._check_meta()
+        cols = tuple(cols or cls.__META__.fields)
+        parsed = parse(order_by=order_by, **terms)
+        sql = cls._projection_sql(cols, db=db, table=table, parsed=parsed)
+        chunks = MyDBApi(config=cls._get_db_conf(db=db), t=t).iter_chunks(
+            sql, parsed.param, as_tuples=True, chunk_size=chunk_size)
+        kinds = [column_kind(cls.__META__.get_field_type(col)) for col in cols]
+        return build_columns(cols, kinds, chunks, capacity=chunk_size)
+
+    @classmethod
+    def values(cls, *cols, order_by=None, db=None, table=None, t: _transaction = None, **terms) -> List[dict]:
+        """
+        Query the columns as plain dicts without building model objects, the values are not validated
+        :param cols: all fields if not given
+        :param order_by:
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many`
+        :return:
+        """
+        cls._check_meta()
+        return cls._values_by_parsed_terms(
+            cols, db=db, table=table, t=t, parsed=parse(order_by=order_by, **terms))
+
+    @classmethod
+    def values_list(
+            cls, *cols, flat=False, order_by=None, db=None, table=None, t: _transaction = None, **terms) -> list:
+        """
+        Query the columns as tuples by a tuple cursor
+        :param cols: all fields if not given
+        :param flat: return the values of the only column instead of 1-tuples
+        :param order_by:
+        :param db:
+        :param table:
+        :param t:
+        :param terms: same as `get_many`
+        :return:
+        """
+        cls._check_meta()
+        return cls._values_list_by_parsed_terms(
+            cols, flat=flat, db=db, table=table, t=t, parsed=parse(order_by=order_by, **terms))
+
+    @classmethod
+    def iter_values(
+            cls, *cols, chunk_size: int = 1000, order_by=None, db=None, table=None, t: _transaction = None, **terms):
+        """
+        Stream `values` by an unbuffered cursor, consume or close the iterator before using the connection again
+        :return: iterator of dicts
+        """
+        cls._check_meta()
+        return cls._iter_by_parsed_terms(
+            cols, db=db, table=table, t=t, parsed=parse(order_by=order_by, **terms), chunk_size=chunk_size)
+
+    @classmethod
+    def iter_values_list(
+            cls, *cols, flat=False, chunk_size: int = 1000, order_by=None, db=None, table=None,
+            t: _transaction = None, **terms):
+        """
+        Stream `values_list` by an unbuffered cursor, consume or close the iterator before using the connection again
+        :return: iterator of tuples or values if flat
+        """
+        cls._check_meta()
+        return cls._iter_by_parsed_terms(
+            cols, as_tuples=True, flat=flat, db=db, table=table, t=t, parsed=parse(order_by=order_by, **terms),
+            chunk_size=chunk_size)
+
+    @classmethod
+    def query(cls, db=None, table=None, t: _transaction = None) -> QuerySet:
+        """
+        Lazy query of the model built by chaining like `UserInfo.query().filter(is_active=1).order_by('-userid')[:10]`
+        :param db:
+        :param table:
+        :param t:
+        :return:
+        """
+        cls._check_meta()
+        return QuerySet(cls, db=db, table=table, t=t)
+
     @classmethod
     def search(
-            cls, return_columns=None, order_by=None, db=None, table=None, t: _transaction = None,
-            **terms) -> SearchResult:
+            cls, return_columns=None, order_by=None, db=None, table=None, t: _transaction = None, prefetch=None,
+            defer: List[str] = None, **terms) -> SearchResult:
         """
         分页查询接口
         :param return_columns:
@@ -629,6 +1296,8 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         :param db:
         :param table:
         :param t: transaction
+        :param prefetch: see `get_many`
+        :param defer: see `get_many`
         :param terms: {'key': ('value', 'LIKE')}
         :return:
         :rtype SearchResult
@@ -638,13 +1307,14 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         size = terms.pop('size', 10)
         total_cnt = cls.count(db=db, table=table, t=t, **terms)
         rets = cls.get_many(
-            return_columns=return_columns, order_by=order_by, db=db, table=table, page=page, size=size, t=t, **terms)
+            return_columns=return_columns, order_by=order_by, db=db, table=table, page=page, size=size, t=t,
+            prefetch=prefetch, defer=defer, **terms)
         return SearchResult(total=total_cnt, index=page - 1, size=size, result=rets)
 
     @classmethod
     def search_and_join(
             cls, return_columns=None, order_by=None, db=None, table=None, t: _transaction = None, join_table=None,
-            **terms) -> SearchResult:
+            join_models: List[DBModel.__class__] = None, **terms) -> SearchResult:
         """
         分页查询接口
         :param return_columns:
@@ -653,6 +1323,7 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         :param table:
         :param t: transaction
         :param join_table: {'join_tablename': {'base_tablename.field1': ('value', 'LIKE'), 'base_tablename.field1': ('\\join_tablename.field2\\', '=')}}
+        :param join_models: see `get_many_and_join`
         :param terms: {'key': ('value', 'LIKE')}
         :return:
         """
@@ -665,38 +1336,250 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
             total_cnt = cls.count(db=db, table=table, join_table=join_table, t=t, **terms)
             rets = cls.get_many_and_join(
                 return_columns=return_columns, order_by=order_by, db=db, get_tablename=table, page=page, size=size, t=t,
-                join_table=join_table, **terms)
+                join_table=join_table, join_models=join_models, **terms)
             return SearchResult(total=total_cnt, index=page - 1, size=size, result=rets)
 
     @classmethod
-    def _query_by_parsed_terms(
-            cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None):
-        cls._check_meta()
+    def _select_sql(cls, return_columns=None, db=None, table=None, for_update=False,
+                    parsed: ParsedResult = None) -> str:
         if not return_columns:
             return_columns = cls.__META__.fields_with_tablename
         if not for_update:
-            sql = cls.__META__.get_select_sql_tpl(db=db, table=table).format(
-                return_columns=', '.join(return_columns),
-                filter=parsed['filter']
-            )
-        else:
-            sql = cls.__META__.get_for_update_sql_tpl(db=db, table=table).format(
+            return cls.__META__.get_select_sql_tpl(db=db, table=table).format(
                 return_columns=', '.join(return_columns),
                 filter=parsed['filter']
             )
+        return cls.__META__.get_for_update_sql_tpl(db=db, table=table).format(
+            return_columns=', '.join(return_columns),
+            filter=parsed['filter']
+        )
+
+    @classmethod
+    def _query_by_parsed_terms(
+            cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None):
+        cls._check_meta()
+        sql = cls._select_sql(return_columns=return_columns, db=db, table=table, for_update=for_update, parsed=parsed)
         param = parsed['param']
-        mydb = MyDBApi(config=cls._get_db_conf(db=db), t=t)
-        return mydb.query_many(sql, param)
+        return cls._query_rows(sql, param, db=db, t=t, coalesce=not for_update)
+
+    @classmethod
+    def _query_rows(cls, sql: str, param: dict = None, db=None, t: _transaction = None, coalesce=True) -> list:
+        """
+        Run a select, identical selects running at the same moment outside transactions share one query
+        if the model has a `__SINGLEFLIGHT__` group
+        :param sql:
+        :param param:
+        :param db:
+        :param t:
+        :param coalesce:
+        :return: rows
+        """
+        config = cls._get_db_conf(db=db)
+        flight = cls.__SINGLEFLIGHT__ if coalesce and t is None else None
+        if flight is not None:
+            try:
+                key = (sql, tuple(sorted((param or {}).items())))
+                hash(key)
+            except TypeError:
+                flight = None
+        if flight is None:
+            return MyDBApi(config=config, t=t).query_many(sql, param)
+        return flight.do(
+            key, lambda: list(MyDBApi(config=config).query_many(sql, param)),
+            copy=lambda rows: [dict(row) for row in rows])
+
+    @classmethod
+    def _get_deferred(cls, return_columns=None, defer: List[str] = None) -> frozenset:
+        """
+        Fields to leave out of a select
+        :param return_columns: nothing is deferred if the columns are given
+        :param defer: None for the fields declared with `deferred=True`
+        :return:
+        """
+        if return_columns:
+            return frozenset()
+        if defer is None:
+            return cls.__META__.deferred_fields
+        pks = cls.__META__.table.primary_keys
+        if defer and not pks:
+            raise ParamError(u'Deferring fields needs primary keys: {}'.format(cls.__META__.get_full_table_name()))
+        for field_name in defer:
+            if not cls.__META__.has_field(field_name):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(field_name, cls.__META__.fields))
+            if field_name in pks:
+                raise ParamError(u'Primary key: {} can not be deferred'.format(field_name))
+        return frozenset(defer)
+
+    @classmethod
+    def _undeferred_columns(cls, deferred: frozenset, db=None, table=None) -> List[str]:
+        tablename = cls.__META__.get_full_table_name(db=db, table=table)
+        return ['{}.{}'.format(tablename, _fn) for _fn in cls.__META__.fields if _fn not in deferred]
+
+    @classmethod
+    def _load_deferred(cls, objs: List[DBModel], field_name: str, db=None, table=None, t: _transaction = None):
+        """
+        Load one deferred field of objs by primary keys, `IN` batches of `DEFERRED_BATCH_SIZE` keys
+        :param objs:
+        :param field_name:
+        :param db:
+        :param table:
+        :param t:
+        :return:
+        """
+        pks = cls.__META__.table.primary_keys
+        pk_types = [cls.__META__.get_field_type(pk) for pk in pks]
+        field_type = cls.__META__.get_field_type(field_name)
+        tablename = cls.__META__.get_full_table_name(db=db, table=table)
+        keyed = OrderedDict()
+        for obj in objs:
+            keyed.setdefault(tuple(obj._data[pk] for pk in pks), []).append(obj)
+        keys = list(keyed.keys())
+        columns = ', '.join('{}.{}'.format(tablename, _fn) for _fn in pks + (field_name,))
+        pk_columns = ', '.join('{}.{}'.format(tablename, pk) for pk in pks)
+        tpl = cls.__META__.get_select_sql_tpl(db=db, table=table)
+        for start in range(0, len(keys), cls.DEFERRED_BATCH_SIZE):
+            batch = keys[start:start + cls.DEFERRED_BATCH_SIZE]
+            param = {}
+            holders = []
+            for idx, key in enumerate(batch):
+                names = []
+                for pos, val in enumerate(key):
+                    param['dfr_{}_{}'.format(idx, pos)] = val
+                    names.append('%(dfr_{}_{})s'.format(idx, pos))
+                holders.append(names[0] if len(names) == 1 else '({})'.format(', '.join(names)))
+            if len(pks) == 1:
+                flt = '{} IN ({})'.format(pk_columns, ', '.join(holders))
+            else:
+                flt = '({}) IN ({})'.format(pk_columns, ', '.join(holders))
+            rows = cls._query_rows(tpl.format(return_columns=columns, filter=flt), param, db=db, t=t, coalesce=False)
+            found = {}
+            for row in rows:
+                row = json.loads(json.dumps(row, cls=PormJsonEncoder))
+                found[tuple(_pt.validate(row[pk]) for pk, _pt in zip(pks, pk_types))] = row[field_name]
+            for key in batch:
+                for obj in keyed[key]:
+                    obj._deferred.discard(field_name)
+                    if key in found:
+                        # a deleted row leaves the field invalid
+                        obj._own_data()
+                        dict.__setitem__(obj, field_name, found[key])
+                        obj._data[field_name] = field_type.load(found[key])
+                        obj._actived_fields[field_name] = True
+
+    @classmethod
+    def compact_class(cls) -> type:
+        """
+        Get the compact row class of the model, its rows keep the values in a list and the active fields
+        in a bitmask instead of the dicts of a model object
+        :return:
+        """
+        cls._check_meta()
+        return compact_class(cls)
+
+    @classmethod
+    def dumps_batch(cls, objs: List[Union[BaseDBModel, CompactRow]]) -> bytes:
+        """
+        Pack objects or compact rows of the model for a cache shared between processes, see `porm.codec`
+        :param objs:
+        :return:
+        """
+        cls._check_meta()
+        return dumps_rows(cls, objs)
+
+    @classmethod
+    def loads_batch(cls, buf, columnar=False) -> Union[List[DBModel], ColumnarResult]:
+        """
+        Unpack a batch of `dumps_batch`
+        :param buf: bytes or any buffer
+        :param columnar: unpack into columnar buffers like `fetch_columns` instead of objects
+        :return:
+        """
+        cls._check_meta()
+        if columnar:
+            return loads_columns(cls, buf)
+        return loads_rows(cls, buf)
 
     @classmethod
     def _get_by_parsed_terms(
-            cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None):
+            cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None,
+            defer: List[str] = None, compact=False):
+        deferred = cls._get_deferred(return_columns, defer)
+        if deferred:
+            # partial rows are kept out of the entity cache and the identity map
+            return_columns = cls._undeferred_columns(deferred, db=db, table=table)
+        if compact:
+            row_cls = compact_class(cls)
+            # compact rows bypass the caches, deferred fields are left inactive
+            load_row = cls.__META__.rows.load_row
+            return [
+                row_cls.from_valid(load_row(row)[1]) for row in cls._query_by_parsed_terms(
+                    return_columns=return_columns, db=db, table=table, t=t, for_update=for_update, parsed=parsed)]
+        full_rows = not return_columns and not db and not table
+        # rows read in a transaction may be uncommitted so only full rows read outside are cached
+        cache = cls._get_entity_cache() if full_rows and t is None and not for_update else None
+        imap = cls._get_identity_map(t) if full_rows else None
+        tablename = cls.__META__.get_full_table_name()
+        query_key = None
+        if imap is not None and for_update:
+            # a repeated locking read sees the same rows till the transaction writes the table
+            query_key = imap.query_key(parsed['filter'], parsed['param'])
+            objs = imap.get_query(tablename, query_key) if query_key is not None else None
+            if objs is not None:
+                return objs
+        epoch = cache.epoch(tablename) if cache is not None else None
         rets = [
-            cls.new(**json.loads(json.dumps(obj, cls=PormJsonEncoder))) for obj in cls._query_by_parsed_terms(
+            cls._from_row(obj) for obj in cls._query_by_parsed_terms(
                 return_columns=return_columns, db=db, table=table, t=t, for_update=for_update, parsed=parsed
             )]
+        if cache is not None:
+            for ret in rets:
+                key = ret._pk_cache_key()
+                if key is not None:
+                    cache.set(key, ret._snapshot(), epoch=epoch)
+        elif imap is not None:
+            keys = [ret._pk_cache_key() for ret in rets]
+            for key, ret in zip(keys, rets):
+                if key is not None:
+                    imap.add(key, ret, locked=for_update)
+            if query_key is not None and None not in keys:
+                imap.add_query(tablename, query_key, keys)
+        if deferred and rets:
+            group = DeferredGroup(cls, rets, db=db, table=table, t=t)
+            for ret in rets:
+                ret._deferred = set(deferred)
+                ret._deferred_group = group
         return rets
 
+    @classmethod
+    def _stream_by_parsed_terms(
+            cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None,
+            defer: List[str] = None, chunk_size: int = 1000) -> Iterator[DBModel]:
+        """
+        Stream objects by an unbuffered cursor, the rows of a chunk are hydrated together, consume or close the
+        iterator before using the connection again, also for loading the deferred fields.
+        The objects bypass the entity cache and the identity map
+        :return:
+        """
+        cls._check_meta()
+        deferred = cls._get_deferred(return_columns, defer)
+        if deferred:
+            return_columns = cls._undeferred_columns(deferred, db=db, table=table)
+        sql = cls._select_sql(return_columns=return_columns, db=db, table=table, for_update=for_update, parsed=parsed)
+        mydb = MyDBApi(config=cls._get_db_conf(db=db), t=t)
+        for rows in mydb.iter_chunks(sql, parsed['param'], chunk_size=chunk_size):
+            rets = [cls._from_row(row) for row in rows]
+            if deferred:
+                group = DeferredGroup(cls, rets, db=db, table=table, t=t)
+                for ret in rets:
+                    ret._deferred = set(deferred)
+                    ret._deferred_group = group
+            yield from rets
+
+    @classmethod
+    def _from_row(cls, row: dict) -> DBModel:
+        raw, data = cls.__META__.rows.load_row(row)
+        return cls._from_valid(raw, data)
+
     @classmethod
     def _join_get_by_parsed_terms(
             cls, return_columns=None, db=None, table=None, t=None, for_update=False, parsed: ParsedResult = None):
@@ -706,7 +1589,7 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
     @classmethod
     def get_many(
             cls, return_columns=None, order_by=None, db=None, table=None, t: _transaction = None, for_update=False,
-            **terms) -> list:
+            prefetch: List[tuple] = None, defer: List[str] = None, compact=False, **terms) -> list:
         """
         全量查询接口
         :param return_columns:
@@ -715,19 +1598,57 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         :param table:
         :param t:
         :param for_update:
-        :param terms:
+        :param prefetch: related models to load like [(UserBodyInfo, 'userid')] or
+            [(UserBodyInfo, 'child_key', 'parent_key')], read them by `get_related(UserBodyInfo)`
+        :param defer: fields to load on first access instead, None for the fields declared with `deferred=True`,
+            accessing one on any of the objects loads it for all of them by one query
+        :param compact: return `CompactRow` objects of `compact_class`, they can not be prefetched into
+        :param terms: `where=Condition(...)` is ANDed with the other terms and can hold OR relations
         :return:
         """
         cls._check_meta()
         parsed = parse(order_by=order_by, **terms)
+        if compact and prefetch:
+            raise ParamError(u'Compact rows can not hold prefetched objects')
         rets = cls._get_by_parsed_terms(
-            return_columns=return_columns, db=db, table=table, t=t, for_update=for_update, parsed=parsed)
+            return_columns=return_columns, db=db, table=table, t=t, for_update=for_update, parsed=parsed, defer=defer,
+            compact=compact)
+        if prefetch:
+            cls._prefetch(rets, prefetch, t=t)
         return rets
 
+    @classmethod
+    def _prefetch(cls, objs: List[DBModel], prefetch: List[tuple], t: _transaction = None):
+        """
+        Load the related objects of each relation by one `IN` query and attach them to objs
+        :param objs:
+        :param prefetch: [(model, child_key), (model, child_key, parent_key)]
+        :param t:
+        :return:
+        """
+        for relation in prefetch:
+            model, child_key = relation[0], relation[1]
+            parent_key = relation[2] if len(relation) > 2 else child_key
+            model._check_meta()
+            if not cls.__META__.has_field(parent_key):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(parent_key, cls.__META__.fields))
+            if not model.__META__.has_field(child_key):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(child_key, model.__META__.fields))
+            keys = list(OrderedDict.fromkeys(
+                obj[parent_key] for obj in objs if obj.is_valid_field(parent_key) and obj[parent_key] is not None))
+            grouped = {}
+            if keys:
+                for child in model.get_many(t=t, **{child_key: (keys, 'IN')}):
+                    grouped.setdefault(child[child_key], []).append(child)
+            for obj in objs:
+                key = obj[parent_key] if obj.is_valid_field(parent_key) else None
+                obj._set_related(model.__TABLE__, grouped.get(key, []))
+
     @classmethod
     def get_many_and_join(
             cls, return_columns=None, order_by=None, db=None, get_tablename=None, t: _transaction = None,
-            for_update=False, join_table=None, parse_with_tablename=False, **terms) -> List[DBModel]:
+            for_update=False, join_table=None, parse_with_tablename=False, join_models: List[DBModel.__class__] = None,
+            **terms) -> Union[List[dict], List[tuple]]:
         """
         全量连接查询接口
         :param return_columns:
@@ -739,9 +1660,16 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         :param terms:
         :param join_table:
         :param parse_with_tablename:
+        :param join_models: DBModel classes of the joined tables, each row is returned as a tuple of
+            (cls object, join model object, ...) instead of a raw dict, columns of every model are selected
         :return:
         """
         cls._check_meta()
+        if join_models:
+            if return_columns:
+                raise ParamError(u'return_columns is not supported with join_models')
+            models = [cls] + list(join_models)
+            return_columns = cls._aliased_columns(models, db=db, table=get_tablename)
         get_tablename = cls.__META__.get_full_table_name(db=db, table=get_tablename)
         term_tablename = get_tablename if parse_with_tablename else None
         parsed = parse(tablename=term_tablename, order_by=order_by, **terms)
@@ -751,16 +1679,116 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
             parsed['param'].update(join_parsed['param'])
         rets = cls._join_get_by_parsed_terms(
             return_columns=return_columns, db=db, table=get_tablename, t=t, for_update=for_update, parsed=parsed)
+        if join_models:
+            return cls._hydrate_joined(models, rets)
         return rets
 
+    @staticmethod
+    def _column_alias(idx: int, field_name: str) -> str:
+        return u't{}__{}'.format(idx, field_name)
+
+    @classmethod
+    def _aliased_columns(cls, models: List[DBModel.__class__], db=None, table=None) -> List[str]:
+        """
+        :param models:
+        :param db: database of the first model like `get_many_and_join`
+        :param table: table of the first model like `get_many_and_join`
+        :return:
+        """
+        columns = []
+        for idx, model in enumerate(models):
+            model._check_meta()
+            tablename = model.__META__.get_full_table_name(db=db, table=table) if idx == 0 else \
+                model.__META__.get_full_table_name()
+            for field_name in model.__META__.fields:
+                columns.append(u'{}.{} AS {}'.format(tablename, field_name, cls._column_alias(idx, field_name)))
+        return columns
+
     @classmethod
-    def get_one(cls, return_columns=None, t: _transaction = None, for_update=False, **kwargs) -> Union[None, DBModel]:
-        _l = cls.get_many(return_columns=return_columns, t=t, for_update=for_update, page=0, size=1, **kwargs)
+    def _hydrate_joined(cls, models: List[DBModel.__class__], rows: List[dict]) -> List[tuple]:
+        """
+        Split aliased rows into typed objects, repeated rows of a model share one object
+        :param models:
+        :param rows:
+        :return:
+        """
+        layouts = []
+        for idx, model in enumerate(models):
+            aliases = [(field_name, cls._column_alias(idx, field_name)) for field_name in model.__META__.fields]
+            layouts.append((model, aliases, model.__META__.table.primary_keys))
+        identity = {}
+        rets = []
+        for row in rows:
+            objs = []
+            for idx, (model, aliases, pks) in enumerate(layouts):
+                vals = {field_name: row[alias] for field_name, alias in aliases}
+                key = (idx,) + tuple(vals[pk] for pk in pks) if pks else None
+                if key is not None and key in identity:
+                    objs.append(identity[key])
+                    continue
+                if all(val is None for val in vals.values()):
+                    obj = None
+                else:
+                    obj = model._from_row(vals)
+                if key is not None:
+                    identity[key] = obj
+                objs.append(obj)
+            rets.append(tuple(objs))
+        return rets
+
+    @classmethod
+    def get_one(cls, return_columns=None, t: _transaction = None, for_update=False, defer: List[str] = None,
+                **kwargs) -> Union[None, DBModel]:
+        cls._check_meta()
+        imap = cls._get_identity_map(t)
+        cache = cls._get_entity_cache() if not for_update else None
+        key = None
+        if not return_columns and (imap is not None or cache is not None):
+            key = cls._terms_cache_key(kwargs)
+        if key is not None and imap is not None:
+            found, obj = imap.get(key)
+            if found and (obj is None or not for_update or imap.is_locked(key)):
+                return obj
+        if key is not None and cache is not None:
+            snapshot = cache.get(key)
+            if snapshot is not None:
+                obj = cls._from_snapshot(snapshot)
+                if imap is not None:
+                    imap.add(key, obj)
+                return obj
+        if not return_columns and not for_update and len(kwargs) == 1:
+            (field_name, val), = kwargs.items()
+            loader = active_loader(cls, field_name)
+            if loader is not None and loader.t is t and val is not None and not isinstance(val, (list, tuple)):
+                ret = loader.get(val)
+                if loader.many:
+                    return ret[0] if ret else None
+                return ret
+        _l = cls.get_many(
+            return_columns=return_columns, t=t, for_update=for_update, page=0, size=1, defer=defer, **kwargs)
         if _l:
             return _l[0]
         else:
             return None
 
+    @classmethod
+    def loader(cls, key: str, many: bool = False, window: float = 0.0, max_batch_size: int = 500,
+               t: _transaction = None, **terms) -> DataLoader:
+        """
+        Get a loader batching the lookups by key into `IN` queries
+        :param key: field name to look up by
+        :param many: the key matches many rows
+        :param window: seconds to wait for other threads to join a batch
+        :param max_batch_size:
+        :param t:
+        :param terms: extra filters
+        :return:
+        """
+        cls._check_meta()
+        if not cls.__META__.has_field(key):
+            raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(key, cls.__META__.fields))
+        return DataLoader(cls, key, many=many, window=window, max_batch_size=max_batch_size, t=t, **terms)
+
     @classmethod
     def delete_many(cls, t: _transaction = None, **terms):
         """
@@ -777,7 +1805,9 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         delete_tpl = cls.__META__.get_delete_sql_tpl()
         sql = delete_tpl.format(filter=parsed['filter'])
         mydb = MyDBApi(config=cls._get_db_conf(), t=t)
-        return mydb.delete(sql, param)
+        ret = mydb.delete(sql, param)
+        cls._on_write(t=t)
+        return ret
 
     @classmethod
     def insert_many(cls, objs: List[BaseDBModel], t: _transaction = None, ignore=False):
@@ -809,7 +1839,32 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
             _sql_tpl = cls._insert_ignore_sql if ignore else cls._insert_sql
             _params = [obj.get_valid_fields(for_save=True) for obj in objs]
         mydb = MyDBApi(config=cls._get_db_conf(), t=t)
-        return mydb.insert_many(_sql_tpl, _params)
+        ret = mydb.insert_many(_sql_tpl, _params)
+        cls._on_insert(objs, t=t, inserted=not ignore or ret == len(objs))
+        return ret
+
+    @classmethod
+    def insert_columns(cls, columns: Dict[str, list], t: _transaction = None, ignore=False) -> int:
+        """
+        批量插入列数据, 不创建对象; 每列整体校验, 每次executemany最多`INSERT_CHUNK_SIZE`行
+        :param columns: 字段名到该列的值(list, tuple或NumPy数组), 各列长度相同
+        :param t:
+        :param ignore: 执行insert ignore语义
+        :return: 插入的行数
+        """
+        cls._check_meta()
+        fields, params = validate_columns(cls, columns)
+        if not params:
+            return 0
+        _sql = cls.__META__.get_insert_sql_tpl(ignore=ignore).format(
+            col=', '.join(fields),
+            col_param=', '.join(['%s'] * len(fields)),
+        )
+        mydb = MyDBApi(config=cls._get_db_conf(), t=t)
+        for start in range(0, len(params), cls.INSERT_CHUNK_SIZE):
+            mydb.insert_many(_sql, params[start:start + cls.INSERT_CHUNK_SIZE])
+        cls._on_insert([], t=t)
+        return len(params)
 
     @classmethod
     def get_tablename(cls, db: str = None) -> str:
@@ -883,18 +1938,27 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
 
     def upsert(self, t: _transaction = None, *update_fields):
         _valid_fields = self.get_valid_fields(for_save=True)
+        partial_update = bool(update_fields)
         if not update_fields:
             update_fields = list(_valid_fields.keys())
         sql = self.__META__.get_upsert_sql_tpl().format(
+            col=', '.join(_valid_fields.keys()),
+            col_param=', '.join('%({})s'.format(field) for field in _valid_fields.keys()),
             update_fields=', '.join('{field}=%({field})s'.format(field=field) for field in update_fields))
         param = _valid_fields
         mydb = MyDBApi(config=self._get_db_conf(), t=t)
-        return mydb.insert_one(sql, param)
+        ret = mydb.insert_one(sql, param)
+        # 1 affected row if inserted, an updated row may differ from self in the columns it keeps
+        self._on_write(self._pk_cache_key(), t=t, obj=self,
+                       evict=partial_update or ret != 1 or not self._has_all_fields())
+        return ret
 
     def insert(self, t: _transaction = None):
         mydb = MyDBApi(config=self._get_db_conf(), t=t)
         sql_obj = self._insert_sql
-        return mydb.insert_one(sql_obj.sql, param=sql_obj.param)
+        ret = mydb.insert_one(sql_obj.sql, param=sql_obj.param)
+        self._on_insert([self], t=t, inserted=ret == 1)
+        return ret
 
     def reset(self, **reset_fields):
         """
@@ -916,6 +1980,9 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
 
         if not filters:
             filters = self.pk_fields
+            cache_key = self._pk_cache_key()
+        else:
+            cache_key = None
         sql_obj = self._update_sql
         sql = sql_obj.sql
         param = sql_obj.param
@@ -923,7 +1990,10 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         param.update(parsed['param'])
         sql = sql.format(filter=parsed['filter'])
         mydb = MyDBApi(config=self._get_db_conf(), t=t)
-        return mydb.insert_one(sql, param)
+        ret = mydb.insert_one(sql, param)
+        # no row matched or an unchanged one, or the row keeps the columns self has not loaded
+        self._on_write(cache_key, t=t, obj=self, evict=ret != 1 or not self._has_all_fields())
+        return ret
 
     def delete(self, t: _transaction = None):
         """
@@ -940,7 +2010,18 @@ class DBModel(BaseDBModel, metaclass=DBModelMeta):
         sql = self.__META__.get_delete_sql_tpl().format(
             filter=' AND '.join(f))
         mydb = MyDBApi(config=self._get_db_conf(), t=t)
-        return mydb.delete(sql, param)
+        ret = mydb.delete(sql, param)
+        self._on_write(self._pk_cache_key(), t=t)
+        return ret
+
+    async def ainsert(self, t: AsyncTransaction = None):
+        return await self._arun(self.insert, t=t)
+
+    async def aupdate(self, t: AsyncTransaction = None, **filters):
+        return await self._arun(self.update, t=t, **filters)
+
+    async def adelete(self, t: AsyncTransaction = None):
+        return await self._arun(self.delete, t=t)
 
 
 class SearchResult(dict):
@@ -971,6 +2052,15 @@ class SearchResult(dict):
             }
         }
 
+    def dumps(self, pagination: bool = False, backend: str = None) -> bytes:
+        """
+        JSON of the result, see `porm.serialize.dumps_result`
+        :param pagination: 转换成前端分页模式数据
+        :param backend: orjson, ujson or json
+        :return:
+        """
+        return dumps_result(self, pagination=pagination, backend=backend)
+
     @property
     def total(self):
         return self['total']
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import re
 from enum import Enum, unique
-from typing import Union, Dict
+from functools import lru_cache
+from itertools import count
+from typing import Union, Dict, List
 
 from porm import BaseType, VarcharType
+from porm.errors import ParamError
 from porm.utils import param_notnone
 
 
@@ -34,6 +38,64 @@ class Leaf(Enum):
     RIGHT = '_right'
 
 
+_COLUMN_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*){0,2}$')
+COND_PARAM_PREFIX = 'cond_'
+
+
+@lru_cache(maxsize=1024)
+def _compile_shape(shape: tuple, prefix: str = COND_PARAM_PREFIX, tablename: str = None) -> str:
+    """
+    Build the SQL of a condition shape, the placeholders are numbered in the order of `values`
+    :param shape:
+    :param prefix: prefix of the placeholder names
+    :param tablename: qualifies the column names without a table
+    :return:
+    """
+    counter = count()
+
+    def build(node_shape: tuple) -> str:
+        if node_shape[0] == 'literal':
+            return node_shape[1]
+        if node_shape[0] == 'tree':
+            return u'({} {} {})'.format(build(node_shape[2]), node_shape[1], build(node_shape[3]))
+        _, field_name, operand, arity = node_shape
+        if not _COLUMN_RE.match(field_name):
+            raise ParamError(u'Invalid column name in condition: {!r}'.format(field_name))
+        if tablename and '.' not in field_name:
+            field_name = u'{}.{}'.format(tablename, field_name)
+        if arity is None:
+            # None value
+            if operand == Operand.EQ.value:
+                return u'{} IS NULL'.format(field_name)
+            if operand == Operand.NEQ.value:
+                return u'{} IS NOT NULL'.format(field_name)
+            raise ParamError(u'Can not compare {} with NULL by {}'.format(field_name, operand))
+        if operand in (Operand.IN.value, Operand.NIN.value):
+            if arity == 0:
+                # nothing is in an empty list
+                return u'1<>1' if operand == Operand.IN.value else u'1=1'
+            holders = ', '.join('%({}{})s'.format(prefix, next(counter)) for _ in range(arity))
+            return u'{} {} ({})'.format(field_name, operand, holders)
+        return u'{} {} %({}{})s'.format(field_name, operand, prefix, next(counter))
+
+    return build(shape)
+
+
+def compile_condition(
+        condition: Union[ConditionNode, ConditionTree, Condition], prefix: str = COND_PARAM_PREFIX,
+        tablename: str = None) -> SQL:
+    """
+    Compile a condition to a parameterized SQL fragment, conditions of the same shape share the compiled SQL
+    :param condition:
+    :param prefix: prefix of the param names
+    :param tablename: qualifies the column names without a table like the terms of `parse`
+    :return:
+    """
+    values = []
+    sql = _compile_shape(condition.shape(values), prefix, tablename)
+    return SQL(sql, {'{}{}'.format(prefix, idx): val for idx, val in enumerate(values)})
+
+
 class ConditionNode(object):
     @classmethod
     def new(cls, field_name: str, operand: Operand = Operand.EQ, field_val=None) -> ConditionNode:
@@ -50,6 +112,38 @@ class ConditionNode(object):
     def __repr__(self):
         return self.__str__()
 
+    def shape(self, values: List) -> tuple:
+        """
+        Hashable shape of the condition without its values, the values are appended to values in placeholder order
+        :param values:
+        :return:
+        """
+        val = self._field_val
+        if val is None:
+            return 'node', self._field_name, self._operand.value, None
+        if self._operand in (Operand.IN, Operand.NIN):
+            val = list(val)
+            values.extend(val)
+            return 'node', self._field_name, self._operand.value, len(val)
+        values.append(val)
+        return 'node', self._field_name, self._operand.value, 1
+
+    def compile(self, prefix: str = COND_PARAM_PREFIX, tablename: str = None) -> SQL:
+        return compile_condition(self, prefix, tablename)
+
+
+class _LiteralNode(ConditionNode):
+    """
+    Constant condition like the leading `1 = 1` of `Condition`
+    """
+
+    def __init__(self, field_name: str, operand: Operand = Operand.EQ, field_val=None, sql: str = '1=1'):
+        super(_LiteralNode, self).__init__(field_name, operand, field_val)
+        self._sql = sql
+
+    def shape(self, values: List) -> tuple:
+        return 'literal', self._sql
+
 
 class ConditionTree(object):
     @classmethod
@@ -72,6 +166,12 @@ class ConditionTree(object):
     def __repr__(self):
         return self.__str__()
 
+    def shape(self, values: List) -> tuple:
+        return 'tree', self._relation.value, self._left.shape(values), self._right.shape(values)
+
+    def compile(self, prefix: str = COND_PARAM_PREFIX, tablename: str = None) -> SQL:
+        return compile_condition(self, prefix, tablename)
+
     def or_condition(self, condition: Union[ConditionNode, ConditionTree], leaf: Leaf = Leaf.RIGHT) -> ConditionTree:
         leaf_obj = getattr(self, leaf.value)
         _t = ConditionTree.new(leaf_obj, Relation.OR, condition)
@@ -96,8 +196,16 @@ class Condition(object):
     def __repr__(self):
         return self.__str__()
 
+    def shape(self, values: List) -> tuple:
+        if self._condition is None:
+            return 'literal', '1=1'
+        return self._condition.shape(values)
+
+    def compile(self, prefix: str = COND_PARAM_PREFIX, tablename: str = None) -> SQL:
+        return compile_condition(self, prefix, tablename)
+
     def _init(self, right: Union[ConditionTree, ConditionNode]):
-        self._condition = ConditionTree.new(ConditionNode.new('1', Operand.EQ, '1'), Relation.AND, right)
+        self._condition = ConditionTree.new(_LiteralNode.new('1', Operand.EQ, '1'), Relation.AND, right)
 
     def _add(self, node: Union[ConditionTree, ConditionNode], relation: Relation = Relation.AND):
         if self._condition is None:
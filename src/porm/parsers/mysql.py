@@ -127,13 +127,15 @@ def parse_join(**terms) -> ParsedResult:
     return ParsedResult(param=sql_params, filter=filters)
 
 
-def parse(tablename=None, order_by=None, page=None, size=None, **terms) -> ParsedResult:
+def parse(tablename=None, order_by=None, page=None, size=None, where=None, **terms) -> ParsedResult:
     """
     SQL条件解析接口
     :param tablename:
     :param order_by:
     :param page:
     :param size:
+    :param where: `porm.orms.Condition` or a condition tree ANDed with terms, it can hold OR relations,
+        a reserved word of SQL so it is never a column of the terms; its columns are qualified by tablename too
     :param terms:
     :return: {
     'param': sql_params,
@@ -235,6 +237,10 @@ def parse(tablename=None, order_by=None, page=None, size=None, **terms) -> Parse
             term_sqls.append(term_sql)
         else:
             pass
+    if where is not None:
+        compiled = where.compile(tablename=tablename)
+        term_sqls.append(u'({})'.format(compiled.sql))
+        sql_params.update(compiled.param)
     filters = ' AND '.join(term_sqls)
     if order_by:
         filters = u'{} ORDER BY {}'.format(filters, order_by)
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import Iterator, List, Union
+
+from porm.errors import ParamError
+from porm.orms.mysql import Condition
+from porm.parsers.mysql import parse, ParsedResult
+
+__all__ = (
+    'QuerySet',
+)
+
+
+class QuerySet(object):
+    """
+    Lazy query of a model built by chaining, every chained call returns a new QuerySet
+
+    The terms are compiled by `parse` once per QuerySet and the rows are read once, iterating the QuerySet
+    again reuses the cached objects, use `iterator()` to read without caching
+    """
+
+    def __init__(self, model, db=None, table=None, t=None):
+        self.model = model
+        self._db = db
+        self._table = table
+        self._t = t
+        self._terms = {}
+        self._condition = None
+        self._order_by: List[str] = []
+        self._only: List[str] = None
+        self._defer: List[str] = None
+        self._limit: int = None
+        self._offset = 0
+        self._for_update = False
+        self._parsed: ParsedResult = None
+        self._count_parsed: ParsedResult = None
+        self._result_cache: list = None
+        self._count_cache: int = None
+
+    def _clone(self) -> QuerySet:
+        qs = QuerySet(self.model, db=self._db, table=self._table, t=self._t)
+        qs._terms = dict(self._terms)
+        qs._condition = self._condition
+        qs._order_by = list(self._order_by)
+        qs._only = self._only
+        qs._defer = self._defer
+        qs._limit = self._limit
+        qs._offset = self._offset
+        qs._for_update = self._for_update
+        return qs
+
+    def _check_fields(self, fields):
+        for field in fields:
+            if not self.model.__META__.has_field(field):
+                raise ParamError(u'Unknown Field: {} In Valid Fields: {}'.format(field, self.model.__META__.fields))
+
+    def filter(self, *conditions, **terms) -> QuerySet:
+        """
+        AND more conditions and terms, a term is the same as the terms of `get_many`
+        :param conditions: `porm.orms.Condition` or condition trees for OR relations
+        :param terms:
+        :return:
+        """
+        qs = self._clone()
+        for condition in conditions:
+            if qs._condition is None:
+                qs._condition = condition
+            else:
+                qs._condition = Condition.and_condition(qs._condition, condition)
+        for field, term in terms.items():
+            if field in qs._terms and qs._terms[field] != term:
+                raise ParamError(u'Field {} is filtered twice by {!r} and {!r}'.format(field, qs._terms[field], term))
+            qs._terms[field] = term
+        return qs
+
+    def order_by(self, *fields) -> QuerySet:
+        """
+        Replace the ordering, '-field' orders descending
+        :param fields:
+        :return:
+        """
+        orders = []
+        for field in fields:
+            field = field.strip()
+            if field.startswith('-'):
+                orders.append(u'{} DESC'.format(field[1:]))
+            else:
+                orders.append(field)
+        qs = self._clone()
+        qs._order_by = orders
+        return qs
+
+    def only(self, *fields) -> QuerySet:
+        """
+        Read only these fields, the objects hold only them
+        :param fields:
+        :return:
+        """
+        self._check_fields(fields)
+        qs = self._clone()
+        qs._only = list(fields)
+        return qs
+
+    def defer(self, *fields) -> QuerySet:
+        """
+        Leave these fields out of the select, they are loaded on first access, see `DBModel.get_many`,
+        `defer()` without fields reads all the fields, the ones declared with `deferred=True` included
+        :param fields:
+        :return:
+        """
+        self._check_fields(fields)
+        qs = self._clone()
+        qs._defer = list(fields)
+        return qs
+
+    def limit(self, size: int) -> QuerySet:
+        return self[:size]
+
+    def for_update(self) -> QuerySet:
+        if self._t is None:
+            raise ParamError(u'Selecting for update needs a transaction')
+        qs = self._clone()
+        qs._for_update = True
+        return qs
+
+    def __getitem__(self, item) -> Union[QuerySet, object]:
+        if isinstance(item, slice):
+            if item.step is not None:
+                raise ParamError(u'Slicing step is not supported')
+            start = item.start or 0
+            stop = item.stop
+            if start < 0 or (stop is not None and stop < 0):
+                raise ParamError(u'Negative slicing is not supported')
+            qs = self._clone()
+            qs._offset = self._offset + start
+            if stop is not None:
+                size = max(0, stop - start)
+                if self._limit is not None:
+                    size = min(size, max(0, self._limit - start))
+                qs._limit = size
+            elif self._limit is not None:
+                qs._limit = max(0, self._limit - start)
+            return qs
+        if not isinstance(item, int):
+            raise ParamError(u'QuerySet indices must be integers or slices')
+        if self._result_cache is not None:
+            return self._result_cache[item]
+        if item < 0:
+            raise ParamError(u'Negative indexing is not supported')
+        rets = self[item:item + 1]._fetch()
+        if not rets:
+            raise IndexError('QuerySet index out of range')
+        return rets[0]
+
+    def compile(self) -> ParsedResult:
+        """
+        Compile the terms, ordering and slicing to the filter and params of the select
+        :return:
+        """
+        if self._parsed is None:
+            parsed = parse(order_by=', '.join(self._order_by) or None, where=self._condition, **self._terms)
+            if self._limit is not None:
+                parsed = ParsedResult(
+                    param=dict(parsed.param, qs_limit=self._limit, qs_offset=self._offset),
+                    filter=parsed.filter + u' LIMIT %(qs_limit)s OFFSET %(qs_offset)s')
+            elif self._offset:
+                # MySQL has no OFFSET without LIMIT
+                parsed = ParsedResult(
+                    param=dict(parsed.param, qs_offset=self._offset),
+                    filter=parsed.filter + u' LIMIT %(qs_offset)s, 18446744073709551615')
+            self._parsed = parsed
+        return self._parsed
+
+    def _compile_count(self) -> ParsedResult:
+        if self._count_parsed is None:
+            self._count_parsed = parse(where=self._condition, **self._terms)
+        return self._count_parsed
+
+    def _return_columns(self) -> Union[None, List[str]]:
+        if not self._only:
+            deferred = self.model._get_deferred(defer=self._defer)
+            if deferred:
+                return self.model._undeferred_columns(deferred, db=self._db, table=self._table)
+            return None
+        tablename = self.model.__META__.get_full_table_name(db=self._db, table=self._table)
+        return ['{}.{}'.format(tablename, field) for field in self._only]
+
+    @property
+    def sql(self) -> str:
+        return_columns = self._return_columns() or self.model.__META__.fields_with_tablename
+        if self._for_update:
+            tpl = self.model.__META__.get_for_update_sql_tpl(db=self._db, table=self._table)
+        else:
+            tpl = self.model.__META__.get_select_sql_tpl(db=self._db, table=self._table)
+        return tpl.format(return_columns=', '.join(return_columns), filter=self.compile().filter)
+
+    def _query(self) -> list:
+        if self._limit == 0:
+            return []
+        return self.model._get_by_parsed_terms(
+            return_columns=self._return_columns() if self._only else None, db=self._db, table=self._table, t=self._t,
+            for_update=self._for_update, parsed=self.compile(), defer=self._defer)
+
+    def _fetch(self) -> list:
+        if self._result_cache is None:
+            self._result_cache = self._query()
+        return self._result_cache
+
+    def __iter__(self) -> Iterator:
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __bool__(self):
+        return bool(self._fetch())
+
+    def __repr__(self):
+        return '<QuerySet {}>'.format(self.sql)
+
+    def all(self) -> list:
+        return list(self._fetch())
+
+    def first(self):
+        if self._result_cache is not None:
+            return self._result_cache[0] if self._result_cache else None
+        rets = self[:1]._fetch()
+        return rets[0] if rets else None
+
+    def iterator(self, chunk_size: int = 1000) -> Iterator:
+        """
+        Stream the objects without caching them on the QuerySet, see `DBModel.iter_values` for the connection
+        :param chunk_size: rows fetched and hydrated at a time
+        :return:
+        """
+        if self._result_cache is not None:
+            yield from self._result_cache
+        elif self._limit != 0:
+            yield from self.model._stream_by_parsed_terms(
+                return_columns=self._return_columns() if self._only else None, db=self._db, table=self._table,
+                t=self._t, for_update=self._for_update, parsed=self.compile(), defer=self._defer,
+                chunk_size=chunk_size)
+
+    def values(self, *cols) -> List[dict]:
+        """
+        Read the columns as plain dicts, see `DBModel.values`
+        :param cols:
+        :return:
+        """
+        if self._limit == 0:
+            return []
+        return self.model._values_by_parsed_terms(
+            cols, db=self._db, table=self._table, t=self._t, parsed=self.compile())
+
+    def values_list(self, *cols, flat=False) -> list:
+        if self._limit == 0:
+            return []
+        return self.model._values_list_by_parsed_terms(
+            cols, flat=flat, db=self._db, table=self._table, t=self._t, parsed=self.compile())
+
+    def iter_values(self, *cols, chunk_size: int = 1000) -> Iterator:
+        return self.model._iter_by_parsed_terms(
+            cols, db=self._db, table=self._table, t=self._t, parsed=self.compile(), chunk_size=chunk_size)
+
+    def iter_values_list(self, *cols, flat=False, chunk_size: int = 1000) -> Iterator:
+        return self.model._iter_by_parsed_terms(
+            cols, as_tuples=True, flat=flat, db=self._db, table=self._table, t=self._t, parsed=self.compile(),
+            chunk_size=chunk_size)
+
+    def count(self) -> int:
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        if self._count_cache is None:
+            total = self.model._count_by_parsed_terms(
+                db=self._db, table=self.model.__META__.get_full_table_name(db=self._db, table=self._table),
+                t=self._t, parsed=self._compile_count())
+            total = max(0, total - self._offset)
+            if self._limit is not None:
+                total = min(total, self._limit)
+            self._count_cache = total
+        return self._count_cache
+
+    def scalar(self, expr: str):
+        """
+        Query a single raw value, see `DBModel.scalar`
+        :param expr:
+        :return:
+        """
+        sliced = self._limit is not None or bool(self._offset)
+        if self._limit == 0:
+            return None
+        return self.model._scalar_by_parsed_terms(
+            expr, db=self._db, table=self._table, t=self._t, parsed=self.compile(), limit=not sliced)
+
+    def exists(self) -> bool:
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        if self._limit is not None or self._offset:
+            return self.count() > 0
+        return self.model._exists_by_parsed_terms(
+            db=self._db, table=self._table, t=self._t, parsed=self._compile_count())
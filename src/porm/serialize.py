@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+JSON of model batches for responses: the fields are encoded by functions built once per model, the rows
+go through orjson or ujson if one is installed and are joined as text by the standard library otherwise
+
+The text of the standard library path is the same as `str(obj)` of each model
+"""
+import datetime
+import decimal
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Iterable, List, Tuple, Union
+
+from porm.compact import CompactRow
+from porm.errors import ParamError
+from porm.types.core import BaseType, BooleanType, DateType, DatetimeType, DictType, FloatType, IntegerType, \
+    LazyDict, TextType, TimeType, VarcharType
+from porm.utils import PormJsonEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__all__ = (
+    'BACKEND', 'RowEncoder', 'compile_encoder', 'dumps_many', 'dumps_result', 'row_encoder'
+)
+
+BACKEND = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+_BACKENDS = ('orjson', 'ujson', 'json')
+
+_encoder = PormJsonEncoder()
+_INF = float('inf')
+
+
+def _float_text(val: float) -> str:
+    if val != val or val == _INF or val == -_INF:
+        return json.dumps(val)
+    return float.__repr__(val)
+
+
+def _datetime_text(val: datetime.datetime) -> str:
+    if val.year < 1000 or val.tzinfo is not None:
+        return val.strftime('%Y-%m-%d %H:%M:%S')
+    return val.isoformat(' ', 'seconds')
+
+
+def _date_text(val: datetime.date) -> str:
+    if val.year < 1000:
+        return val.strftime('%Y-%m-%d')
+    return val.isoformat()
+
+
+def _time_text(val: datetime.time) -> str:
+    if val.tzinfo is not None:
+        return val.strftime('%H:%M:%S')
+    return val.isoformat('seconds')
+
+
+def _lazy_text(val: LazyDict) -> str:
+    raw = val.raw
+    if raw is not None:
+        return raw
+    return _encoder.encode(val)
+
+
+# exact class: JSON text like `json.dumps(val, cls=PormJsonEncoder)`
+_TEXTS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: _float_text,
+    bool: lambda val: 'true' if val else 'false',
+    type(None): lambda val: 'null',
+    datetime.datetime: lambda val: '"' + _datetime_text(val) + '"',
+    datetime.date: lambda val: '"' + _date_text(val) + '"',
+    datetime.time: lambda val: '"' + _time_text(val) + '"',
+    datetime.timedelta: lambda val: encode_basestring_ascii(_encoder.default(val)),
+    decimal.Decimal: lambda val: _float_text(float(val)),
+    LazyDict: _lazy_text,
+}
+
+# exact class: value native to orjson and ujson in the text of `PormJsonEncoder`
+_NATIVES = {
+    datetime.datetime: _datetime_text,
+    datetime.date: _date_text,
+    datetime.time: _time_text,
+    datetime.timedelta: _encoder.default,
+    decimal.Decimal: float,
+}
+
+
+def _text(val) -> str:
+    text = _TEXTS.get(val.__class__)
+    if text is not None:
+        return text(val)
+    return _encoder.encode(val)
+
+
+def _native(val):
+    native = _NATIVES.get(val.__class__)
+    if native is not None:
+        return native(val)
+    if val.__class__ is LazyDict:
+        # not decoded in place, the value may be shared with a copy
+        raw = val.raw
+        return json.loads(raw) if raw is not None else dict(val)
+    return val
+
+
+def _text_case(field_type: BaseType, var: str) -> Tuple[str, str]:
+    """
+    (condition, text) of the values of the type encoded inline
+    :param field_type:
+    :param var:
+    :return: (None, None) if the values are encoded by `_text`
+    """
+    kind = type(field_type)
+    if kind is IntegerType:
+        return '{}.__class__ is int'.format(var), '_int_text({})'.format(var)
+    if kind is FloatType:
+        return '{0}.__class__ is float and _NINF < {0} < _INF'.format(var), '_float_repr({})'.format(var)
+    if kind in (VarcharType, TextType):
+        return '{}.__class__ is str'.format(var), '_esc({})'.format(var)
+    if kind is BooleanType:
+        return '{}.__class__ is bool'.format(var), "('true' if {} else 'false')".format(var)
+    if kind in (DatetimeType, DateType, TimeType):
+        cond, native = _native_case(field_type, var)
+        return cond, '\'"\' + {} + \'"\''.format(native)
+    if kind is DictType:
+        return '{}.__class__ is _LazyDict'.format(var), '_lazy_text({})'.format(var)
+    return None, None
+
+
+def _native_case(field_type: BaseType, var: str) -> Union[None, Tuple[str, str]]:
+    """
+    (condition, value) of the values of the type converted inline
+    :param field_type:
+    :param var:
+    :return: None if the values are native, (None, None) if the values are converted by `_native`
+    """
+    kind = type(field_type)
+    if kind in (IntegerType, FloatType, VarcharType, TextType, BooleanType):
+        return None
+    if kind is DatetimeType:
+        return ('{0}.__class__ is _datetime and {0}.tzinfo is None and {0}.year >= 1000'.format(var),
+                "{}.isoformat(' ', 'seconds')".format(var))
+    if kind is DateType:
+        return '{0}.__class__ is _date and {0}.year >= 1000'.format(var), '{}.isoformat()'.format(var)
+    if kind is TimeType:
+        return '{0}.__class__ is _time and {0}.tzinfo is None'.format(var), "{}.isoformat('seconds')".format(var)
+    return None, None
+
+
+class RowEncoder(object):
+    """
+    text(data) -> JSON text of validated values, the same as `str(obj)`
+    native(data) -> validated values converted to values native to orjson and ujson
+    """
+    __slots__ = ('text', 'native', 'source')
+
+    def __init__(self, text, native, source: str):
+        self.text = text
+        self.native = native
+        self.source = source
+
+
+def compile_encoder(fields: List[str], types: List[BaseType], model_name: str = 'model') -> RowEncoder:
+    """
+    Generate the row encoder of the fields, rows in the field order are encoded by unrolled code
+    :param fields:
+    :param types:
+    :param model_name: used in the generated file name
+    :return:
+    """
+    namespace = {
+        '_datetime': datetime.datetime, '_date': datetime.date, '_time': datetime.time, '_LazyDict': LazyDict,
+        '_int_text': int.__repr__, '_float_repr': float.__repr__, '_esc': encode_basestring_ascii,
+        '_lazy_text': _lazy_text, '_text': _text, '_native': _native, '_INF': _INF, '_NINF': -_INF,
+        '_FIELDS': tuple(fields),
+        '_keys': {field_name: encode_basestring_ascii(field_name) + ': ' for field_name in fields},
+    }
+    texts = []
+    natives = []
+    loads = []
+    for idx, (field_name, field_type) in enumerate(zip(fields, types)):
+        var = 'v{}'.format(idx)
+        loads.append('        {} = data[{!r}]'.format(var, field_name))
+        key = ('{' if idx == 0 else ', ') + encode_basestring_ascii(field_name) + ': '
+        cond, text = _text_case(field_type, var)
+        if cond is None:
+            texts.append('{!r}, _text({})'.format(key, var))
+        else:
+            texts.append('{!r}, {} if {} else _text({})'.format(key, text, cond, var))
+        native = _native_case(field_type, var)
+        if native is None:
+            natives.append('{!r}: {}'.format(field_name, var))
+        elif native[0] is None:
+            natives.append('{!r}: _native({})'.format(field_name, var))
+        else:
+            natives.append('{!r}: {} if {} else _native({})'.format(field_name, native[1], native[0], var))
+    lines = ['def text(data):', '    if tuple(data) == _FIELDS:']
+    lines.extend(loads)
+    lines.append("        return ''.join(({}, '}}'))".format(', '.join(texts) if texts else "'{'"))
+    lines.append("    return '{' + ', '.join([_keys[name] + _text(val) for name, val in data.items()]) + '}'")
+    lines.extend(['def native(data):', '    if tuple(data) == _FIELDS:'])
+    lines.extend(loads)
+    lines.append('        return {{{}}}'.format(', '.join(natives)))
+    lines.append('    return {name: _native(val) for name, val in data.items()}')
+    source = '\n'.join(lines) + '\n'
+    exec(compile(source, '<porm encoder of {}>'.format(model_name), 'exec'), namespace)
+    return RowEncoder(namespace['text'], namespace['native'], source)
+
+
+def row_encoder(model) -> RowEncoder:
+    """
+    Get the row encoder of model, it is generated once per model class
+    :param model: DBModel class with its metadata initialized
+    :return:
+    """
+    encoder = model.__dict__.get('_row_encoder')
+    if encoder is not None:
+        return encoder
+    fields = list(model.__META__.fields)
+    encoder = compile_encoder(
+        fields, [model.__META__.get_field_type(field_name) for field_name in fields],
+        model_name=model.__META__.get_full_table_name())
+    setattr(model, '_row_encoder', encoder)
+    return encoder
+
+
+def _model_and_data(obj) -> tuple:
+    if isinstance(obj, CompactRow):
+        return obj._model, obj.to_dict()
+    if hasattr(obj, '_data') and getattr(obj.__class__, '__META__', None) is not None:
+        return obj.__class__, obj._data
+    return None, None
+
+
+def _rows_text(objs: Iterable) -> str:
+    parts = []
+    for obj in objs:
+        model, data = _model_and_data(obj)
+        if model is None:
+            parts.append(_encoder.encode(obj))
+        else:
+            parts.append(row_encoder(model).text(data))
+    return '[' + ', '.join(parts) + ']'
+
+
+def _rows_native(objs: Iterable) -> list:
+    rows = []
+    for obj in objs:
+        model, data = _model_and_data(obj)
+        rows.append(obj if model is None else row_encoder(model).native(data))
+    return rows
+
+
+def _get_backend(backend: str) -> str:
+    backend = backend or BACKEND
+    if backend not in _BACKENDS:
+        raise ParamError(u'Unknown Backend: {} In Valid Backends: {}'.format(backend, _BACKENDS))
+    if (backend == 'orjson' and orjson is None) or (backend == 'ujson' and ujson is None):
+        raise ParamError(u'Backend: {} is not installed'.format(backend))
+    return backend
+
+
+def _dumps_native(obj, backend: str) -> bytes:
+    if backend == 'orjson':
+        return orjson.dumps(obj, default=_encoder.default)
+    return ujson.dumps(obj, escape_forward_slashes=False, default=_encoder.default).encode('utf-8')
+
+
+def dumps_many(objs: Iterable, backend: str = None) -> bytes:
+    """
+    JSON array of models, compact rows and other JSON values
+    :param objs:
+    :param backend: orjson, ujson or json, the installed one of them in this order by default
+    :return:
+    """
+    backend = _get_backend(backend)
+    if backend == 'json':
+        return _rows_text(objs).encode('utf-8')
+    return _dumps_native(_rows_native(objs), backend)
+
+
+def dumps_result(result: dict, pagination: bool = False, backend: str = None) -> bytes:
+    """
+    JSON of a `SearchResult` or of its pagination
+    :param result:
+    :param pagination: serialize `result.pagination()`
+    :param backend: see `dumps_many`
+    :return:
+    """
+    backend = _get_backend(backend)
+    envelope = result.pagination() if pagination else dict(result)
+    key = 'data' if pagination else 'result'
+    objs = envelope[key]
+    if backend == 'json':
+        rows = _rows_text(objs) if objs is not None else 'null'
+        return ('{' + ', '.join([
+            encode_basestring_ascii(_k) + ': ' + (rows if _k == key else _encoder.encode(val))
+            for _k, val in envelope.items()]) + '}').encode('utf-8')
+    envelope[key] = _rows_native(objs) if objs is not None else None
+    return _dumps_native(envelope, backend)
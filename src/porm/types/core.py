@@ -2,8 +2,10 @@
 import datetime
 import json
 import sys
+import threading
 from abc import ABCMeta, abstractmethod
 from functools import partial
+from typing import Iterable, List
 
 from dateutil import parser
 
@@ -11,6 +13,8 @@ import six
 
 from porm.utils import field_exception
 from porm.errors import ValidationError
+from porm.forks import after_fork
+from porm.types.dates import parse_datetime, parse_datetimes, parse_time, parse_times
 
 __all__ = (
     "BaseType",
@@ -23,6 +27,7 @@ __all__ = (
     "FloatType",
     "TimeType",
     "DictType",
+    "LazyDict",
     "BooleanType"
 )
 
@@ -34,13 +39,16 @@ class BaseType(metaclass=ABCMeta):
         '_required': '_REQUIRED',
         '_type': '_TYPE',
         '_default': '_DEFAULT',
-        '_pk': '_PK'
+        '_pk': '_PK',
+        '_deferred': '_DEFERRED'
     }
 
     _REQUIRED = False
     _TYPE = None
     _DEFAULT = None
     _PK = False
+    # left out of the default select and loaded on first access
+    _DEFERRED = False
 
     def __init__(self, *args, **kwargs):
         for key, attr_name in self.__baseattrs__.items():
@@ -92,6 +100,10 @@ class BaseType(metaclass=ABCMeta):
     def set_pk(self, ispk=True):
         self._pk = ispk
 
+    @property
+    def deferred(self):
+        return self._deferred
+
     @abstractmethod
     def validate(self, val: object) -> object:
         if self.required and val is None:
@@ -101,6 +113,22 @@ class BaseType(metaclass=ABCMeta):
     def dumps(self, val: object) -> object:
         return self.validate(val)
 
+    def validate_many(self, vals: Iterable) -> List:
+        """
+        Validate a batch of values
+        :param vals:
+        :return:
+        """
+        return [self.validate(val) for val in vals]
+
+    def load(self, val: object) -> object:
+        """
+        Validate a value read from the database
+        :param val:
+        :return:
+        """
+        return self.validate(val)
+
 
 class VarcharType(BaseType):
     # if py2 _TYPE = unicode
@@ -169,16 +197,16 @@ class DatetimeType(BaseType):
     def validate(self, val):
         super().validate(val)
         if isinstance(val, six.string_types):
-            try:
-                val = datetime.datetime.strptime(val, self.format)
-            except Exception:
-                val = parser.parse(val)
+            val = parse_datetime(val, self.format)
         elif isinstance(val, self.type):
             pass
         else:
             raise ValidationError(u'{}: {} is not string type or {} type'.format(self.name or 'value', val, self.type))
         return val
 
+    def validate_many(self, vals: Iterable) -> List:
+        return [self.validate(val) for val in parse_datetimes(vals, self.format)]
+
 
 class DateType(BaseType):
     _TYPE = datetime.date
@@ -193,16 +221,16 @@ class DateType(BaseType):
     def validate(self, val):
         super().validate(val)
         if isinstance(val, six.string_types):
-            try:
-                val = datetime.datetime.strptime(val, self.format)
-            except Exception:
-                val = parser.parse(val)
+            val = parse_datetime(val, self.format)
         elif isinstance(val, self.type):
             pass
         else:
             raise ValidationError(u'{}: {} is not string type or {} type'.format(self.name or 'value', val, self.type))
         return val
 
+    def validate_many(self, vals: Iterable) -> List:
+        return [self.validate(val) for val in parse_datetimes(vals, self.format)]
+
 
 class TimestampType(BaseType):
     _TYPE = datetime.time
@@ -239,16 +267,97 @@ class TimeType(BaseType):
     def validate(self, val):
         super().validate(val)
         if isinstance(val, six.string_types):
-            try:
-                val = parser.isoparser().parse_isotime(val)
-            except Exception:
-                val = parser.parse(val)
+            val = parse_time(val)
         elif isinstance(val, self.type):
             pass
         else:
             raise ValidationError(u'{}: {} is not string type or {} type'.format(self.name or 'value', val, self.type))
         return val
 
+    def validate_many(self, vals: Iterable) -> List:
+        return [self.validate(val) for val in parse_times(vals)]
+
+
+_decode_lock = threading.Lock()
+
+
+@after_fork
+def _reset_decode_lock():
+    global _decode_lock
+    _decode_lock = threading.Lock()
+
+
+class LazyDict(dict):
+    """
+    Dict of a JSON object text decoded on first access, till then `raw` keeps the text
+    so it is written or serialized again without encoding.
+    The dict itself is empty till then: C code reading the dict directly, like orjson or the json encoder,
+    sees no items, so the models decode it before they hand it out
+    """
+    __slots__ = ('_raw',)
+
+    def __init__(self, raw: str = None):
+        super(LazyDict, self).__init__()
+        self._raw = raw
+
+    @property
+    def decoded(self) -> bool:
+        return self._raw is None
+
+    @property
+    def raw(self) -> str:
+        """
+        The JSON text if the value is not decoded yet, else None
+        :return:
+        """
+        return self._raw
+
+    def _decode(self):
+        raw = self._raw
+        if raw is None:
+            return
+        val = json.loads(raw)
+        if not isinstance(val, dict):
+            raise ValidationError(u'{} is not a JSON object'.format(raw))
+        with _decode_lock:
+            if self._raw is not None:
+                dict.update(self, val)
+                self._raw = None
+
+    def __eq__(self, other):
+        self._decode()
+        if isinstance(other, LazyDict):
+            other._decode()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __reduce__(self):
+        if self._raw is not None:
+            return self.__class__, (self._raw,)
+        return self.__class__, (), None, None, iter(dict.items(self))
+
+
+def _decoding(name: str):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._decode()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ('__getitem__', '__setitem__', '__delitem__', '__contains__', '__iter__', '__len__', '__repr__',
+              '__reversed__', '__or__', '__ror__', '__ior__', 'get', 'keys', 'values', 'items', 'pop', 'popitem',
+              'setdefault', 'update', 'clear', 'copy'):
+    if hasattr(dict, _name):
+        setattr(LazyDict, _name, _decoding(_name))
+
 
 class DictType(BaseType):
     _TYPE = partial(json.loads)
@@ -268,8 +377,16 @@ class DictType(BaseType):
             raise ValidationError(u'{}: {} is not string type or {} type'.format(self.name or 'value', val, self.type))
         return val
 
+    def load(self, val):
+        if isinstance(val, str) and val.lstrip().startswith('{'):
+            # JSON objects written by porm are decoded on first access, see `LazyDict`
+            return LazyDict(val)
+        return self.validate(val)
+
     def dumps(self, val):
         val = self.validate(val)
+        if isinstance(val, LazyDict) and not val.decoded:
+            return val.raw
         return json.dumps(val)
 
 
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Parsing of date and time strings: `fromisoformat` first for the ISO formats, then a regular expression
+compiled once per format, then `strptime` behind an LRU cache and `dateutil` at last
+"""
+import datetime
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, List, Union
+
+from dateutil import parser
+
+__all__ = (
+    'parse_datetime', 'parse_time', 'parse_datetimes', 'parse_times', 'compile_format'
+)
+
+ISO_FORMATS = frozenset({'%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'})
+FALLBACK_CACHE_SIZE = 4096
+
+_DIRECTIVES = {
+    'Y': ('year', r'\d{4}'),
+    'm': ('month', r'\d{1,2}'),
+    'd': ('day', r'\d{1,2}'),
+    'H': ('hour', r'\d{1,2}'),
+    'M': ('minute', r'\d{1,2}'),
+    'S': ('second', r'\d{1,2}'),
+    'f': ('microsecond', r'\d{1,6}'),
+}
+_isoparser = parser.isoparser()
+
+
+@lru_cache(maxsize=64)
+def compile_format(fmt: str) -> Union[None, Callable]:
+    """
+    Compile a strptime format of numeric directives (%Y %m %d %H %M %S %f) to a parser
+    :param fmt:
+    :return: parser returning a datetime or None if the string does not match, None if fmt is not supported
+    """
+    pattern = []
+    fields = []
+    idx = 0
+    while idx < len(fmt):
+        char = fmt[idx]
+        if char == '%':
+            directive = fmt[idx + 1:idx + 2]
+            if directive == '%':
+                pattern.append('%')
+            elif directive in _DIRECTIVES:
+                name, regex = _DIRECTIVES[directive]
+                if name in fields:
+                    return None
+                fields.append(name)
+                pattern.append('({})'.format(regex))
+            else:
+                return None
+            idx += 2
+        else:
+            pattern.append(r'\s+' if char.isspace() else re.escape(char))
+            idx += 1
+    matcher = re.compile(''.join(pattern)).fullmatch
+    pos = {name: fields.index(name) + 1 if name in fields else None for name, _ in _DIRECTIVES.values()}
+
+    def parse(val: str) -> Union[None, datetime.datetime]:
+        match = matcher(val)
+        if match is None:
+            return None
+        group = match.group
+        return datetime.datetime(
+            int(group(pos['year'])) if pos['year'] else 1900,
+            int(group(pos['month'])) if pos['month'] else 1,
+            int(group(pos['day'])) if pos['day'] else 1,
+            int(group(pos['hour'])) if pos['hour'] else 0,
+            int(group(pos['minute'])) if pos['minute'] else 0,
+            int(group(pos['second'])) if pos['second'] else 0,
+            int(group(pos['microsecond']).ljust(6, '0')) if pos['microsecond'] else 0)
+
+    return parse
+
+
+@lru_cache(maxsize=FALLBACK_CACHE_SIZE)
+def _strptime(val: str, fmt: str) -> datetime.datetime:
+    return datetime.datetime.strptime(val, fmt)
+
+
+def _parse_datetime_slow(val: str, fmt: str) -> datetime.datetime:
+    try:
+        return _strptime(val, fmt)
+    except Exception:
+        # not cached, dateutil fills the missing parts from the current date
+        return parser.parse(val)
+
+
+def parse_datetime(val: str, fmt: str = '%Y-%m-%d %H:%M:%S') -> datetime.datetime:
+    """
+    Parse a string like `datetime.strptime(val, fmt)` and by `dateutil` if it does not match fmt
+    :param val:
+    :param fmt:
+    :return:
+    """
+    if fmt in ISO_FORMATS:
+        try:
+            return datetime.datetime.fromisoformat(val)
+        except ValueError:
+            pass
+    parse = compile_format(fmt)
+    if parse is not None:
+        try:
+            ret = parse(val)
+        except ValueError:
+            # out of range values, e.g. month 13
+            ret = None
+        if ret is not None:
+            return ret
+    return _parse_datetime_slow(val, fmt)
+
+
+@lru_cache(maxsize=FALLBACK_CACHE_SIZE)
+def _parse_isotime(val: str):
+    return _isoparser.parse_isotime(val)
+
+
+def _parse_time_slow(val: str):
+    try:
+        return _parse_isotime(val)
+    except Exception:
+        # not cached like `_parse_datetime_slow`
+        return parser.parse(val)
+
+
+def parse_time(val: str):
+    """
+    Parse a string like `dateutil.parser.isoparser().parse_isotime` and by `dateutil.parser.parse` at last
+    :param val:
+    :return:
+    """
+    try:
+        return datetime.time.fromisoformat(val)
+    except ValueError:
+        return _parse_time_slow(val)
+
+
+def _parse_many(parse: Callable, values: Iterable, *args) -> List:
+    # repeated strings of a batch are parsed once
+    seen = {}
+    ret = []
+    for val in values:
+        if val.__class__ is str:
+            parsed = seen.get(val)
+            if parsed is None:
+                parsed = seen[val] = parse(val, *args)
+            ret.append(parsed)
+        else:
+            ret.append(val)
+    return ret
+
+
+def parse_datetimes(values: Iterable, fmt: str = '%Y-%m-%d %H:%M:%S') -> List:
+    """
+    Parse the strings of values by `parse_datetime`, the other values are kept
+    :param values:
+    :param fmt:
+    :return:
+    """
+    return _parse_many(parse_datetime, values, fmt)
+
+
+def parse_times(values: Iterable) -> List:
+    """
+    Parse the strings of values by `parse_time`, the other values are kept
+    :param values:
+    :return:
+    """
+    return _parse_many(parse_time, values)
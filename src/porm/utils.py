@@ -1,4 +1,5 @@
 import decimal
+from collections.abc import Mapping
 from datetime import datetime, date, time, timedelta
 from functools import wraps
 from json import JSONEncoder
@@ -91,6 +92,9 @@ class PormJsonEncoder(JSONEncoder):
         elif isinstance(obj, timedelta):
             sec = int(obj.total_seconds())
             return '{H:02d}:{M:02d}:{S:02d}'.format(H=int(sec / 3600), M=int(sec / 24 % 60), S=sec % 60)
+        elif isinstance(obj, Mapping):
+            # compact rows
+            return dict(obj)
         else:
             return JSONEncoder.default(self, obj)
 
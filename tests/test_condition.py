@@ -10,4 +10,16 @@ class TestDatabase(DatabaseTestCase):
         con_obj = Condition().and_lt('abc', 123)
         self.assertEqual('(1 = 1 AND abc < 123)', str(con_obj))
         con_obj.and_lt('bca', 321)
-        self.assertEqual('((1 = 1 AND abc < 123) AND bca < 321)', str(con_obj))
\ No newline at end of file
+        self.assertEqual('((1 = 1 AND abc < 123) AND bca < 321)', str(con_obj))
+
+    def test_condition_compile(self):
+        con_obj = Condition().and_eq('abc', 1).and_in_these('bca', (1, 2))
+        con_obj = Condition.or_condition(con_obj, Condition.eq('cab', None))
+        compiled = con_obj.compile()
+        self.assertEqual(
+            '(((1=1 AND abc = %(cond_0)s) AND bca IN (%(cond_1)s, %(cond_2)s)) OR cab IS NULL)', compiled.sql)
+        self.assertEqual({'cond_0': 1, 'cond_1': 1, 'cond_2': 2}, compiled.param)
+        self.assertEqual('1<>1', Condition.in_these('abc', ()).compile().sql)
+        # columns without a table are qualified
+        compiled = Condition().and_eq('abc', 1).and_eq('t2.bca', 2).compile(tablename='db.t1')
+        self.assertEqual('((1=1 AND db.t1.abc = %(cond_0)s) AND t2.bca = %(cond_1)s)', compiled.sql)
@@ -1,12 +1,15 @@
 import datetime
 import json
+import pickle
 
 import pymysql
 
-from porm import IntegerType, VarcharType, TextType, DatetimeType, FloatType, BooleanType
-from porm.model import DBModel
-from porm.orms import SQL
-from porm.types.core import TimeType, DictType
+from porm import IntegerType, VarcharType, TextType, DatetimeType, FloatType, BooleanType, gather, serialize
+from porm.caches import EntityCache, SingleFlight
+from porm.errors import GatherError, ParamError, ValidationError
+from porm.model import DBModel, SearchResult
+from porm.orms import Condition, SQL
+from porm.types.core import TimeType, DictType, LazyDict, DateType, TimestampType
 from tests.test_common import DatabaseTestCase
 
 
@@ -51,6 +54,32 @@ class UserInfo(UserInfoBase):
     height = FloatType(required=True, default=180)
 
 
+class CachedUserInfo(UserInfo):
+    __TABLE__ = 'UserInfo'
+    __CACHE__ = EntityCache(maxsize=16)
+
+
+class CoalescedUserInfo(UserInfo):
+    __TABLE__ = 'UserInfo'
+    __SINGLEFLIGHT__ = SingleFlight()
+
+
+class DeferredUserInfo(UserInfo):
+    __TABLE__ = 'UserInfo'
+    descr = TextType(required=False, default=None, deferred=True)
+    properties = DictType(required=True, deferred=True)
+
+
+class CountedUserInfo(UserInfo):
+    __TABLE__ = 'UserInfo'
+    built = 0
+
+    @classmethod
+    def new(cls, **kwargs):
+        cls.built += 1
+        return super(CountedUserInfo, cls).new(**kwargs)
+
+
 class UserInfo2(UserInfoBase):
     height = FloatType(required=True, default=180)
 
@@ -71,6 +100,12 @@ class UserBodyInfo(BodyInfoBase):
     someone = BooleanType(required=True)
 
 
+class DatedInfo(TestModel):
+    id = IntegerType(pk=True, required=True)
+    day = DateType(required=False, default=None)
+    stamp = TimestampType(required=False, default=None)
+
+
 class TestDatabase(DatabaseTestCase):
     user_info = None
 
@@ -240,6 +275,456 @@ class TestDatabase(DatabaseTestCase):
         if db_type == 'tidb':
             self.assertEqual(cb_flag, 1)
 
+    def test_09_entity_cache(self):
+        ui = CachedUserInfo.get_one(email='dennias.chiu@gmail.com2')
+        with self.assertQueryCount(0):
+            cached = CachedUserInfo.get_one(userid=ui.userid)
+        self.assertEqual(cached.email, ui.email)
+        cached['properties']['cached'] = 1
+        self.assertNotIn('cached', CachedUserInfo.get_one(userid=ui.userid).properties)
+        cached.reset(height=190)
+        cached.update()
+        with self.assertQueryCount(1):
+            fresh = CachedUserInfo.get_one(userid=ui.userid)
+        self.assertEqual(fresh.height, 190)
+        with self.assertQueryCount(1):
+            CachedUserInfo.get_one(userid=ui.userid, for_update=True)
+        fresh.reset(height=188)
+        fresh.update()
+
+    def test_10_transaction_identity_map(self):
+        with UserInfo.start_transaction() as _t:
+            ui = UserInfo.get_one(email='dennias.chiu@gmail.com1', for_update=True, t=_t)
+            with self.assertQueryCount(0):
+                self.assertIs(UserInfo.get_one(email='dennias.chiu@gmail.com1', for_update=True, t=_t), ui)
+                self.assertIs(UserInfo.get_one(userid=ui.userid, for_update=True, t=_t), ui)
+            ui.reset(descr='identity')
+            ui.update(t=_t)
+            with self.assertQueryCount(0):
+                self.assertEqual(UserInfo.get_one(userid=ui.userid, t=_t).descr, 'identity')
+            # rows skipped by INSERT IGNORE and partial upserts are read again
+            dup = UserInfo.new(userid=ui.userid, username=ui.username, email=ui.email, descr='dup', properties={})
+            UserInfo.insert_many([dup], t=_t, ignore=True)
+            self.assertEqual(UserInfo.get_one(userid=ui.userid, t=_t).descr, 'identity')
+            dup.upsert(_t, 'username')
+            self.assertEqual(UserInfo.get_one(userid=ui.userid, t=_t).descr, 'identity')
+            # nor an update of no row or of an object without all fields
+            ghost = UserInfo.new(userid=-1, username='ghost', email='ghost', properties={})
+            self.assertEqual(ghost.update(t=_t), 0)
+            with self.assertQueryCount(1):
+                self.assertIsNone(UserInfo.get_one(userid=-1, t=_t))
+            part = UserInfo.new(userid=ui.userid, username=ui.username, email=ui.email, descr='identity',
+                                properties={})
+            part.update(t=_t)
+            with self.assertQueryCount(1):
+                self.assertEqual(UserInfo.get_one(userid=ui.userid, t=_t).descr, 'identity')
+        self.assertEqual(len(_t.identity_map), 0)
+
+    def test_11_singleflight(self):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        flight = CoalescedUserInfo.__SINGLEFLIGHT__
+        before = flight.stats
+        release = threading.Event()
+        real_do = flight.do
+
+        def held_do(key, fn, copy=None):
+            # the leader queries only once the release, so the other callers join its call meanwhile
+            def held():
+                release.wait(10)
+                return fn()
+
+            return real_do(key, held, copy=copy)
+
+        flight.do = held_do
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                futs = [pool.submit(CoalescedUserInfo.get_one, email='dennias.chiu@gmail.com1') for _ in range(8)]
+                deadline = time.time() + 10
+                while flight.stats['collapsed'] - before['collapsed'] < 7 and time.time() < deadline:
+                    time.sleep(0.01)
+                release.set()
+                uis = [fut.result() for fut in futs]
+        finally:
+            del flight.do
+        stats = flight.stats
+        self.assertEqual(stats['calls'] - before['calls'], 8)
+        self.assertEqual(stats['collapsed'] - before['collapsed'], 7)
+        self.assertEqual(stats['executions'] - before['executions'], 1)
+        self.assertEqual(len({ui.userid for ui in uis}), 1)
+        self.assertEqual(len({id(ui) for ui in uis}), 8)
+
+    def test_12_data_loader(self):
+        ua1 = UserInfo.get_one(email='dennias.chiu@gmail.com1')
+        ua2 = UserInfo.get_one(email='dennias.chiu@gmail.com2')
+        loader = UserInfo.loader('email')
+        with self.assertQueryCount(1):
+            with loader.batch(keys=[ua1.email, ua2.email, 'nobody@porm']):
+                self.assertEqual(UserInfo.get_one(email=ua1.email).userid, ua1.userid)
+                self.assertEqual(UserInfo.get_one(email=ua2.email).userid, ua2.userid)
+                self.assertIsNone(UserInfo.get_one(email='nobody@porm'))
+                self.assertIsNone(UserInfo.get_one(email='nobody@porm'))
+
+    def test_13_prefetch(self):
+        with self.assertQueryCount(2):
+            uis = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), prefetch=[(UserBodyInfo, 'userid')])
+        related = {ui.email: ui.get_related(UserBodyInfo) for ui in uis}
+        self.assertEqual(len(related['dennias.chiu@gmail.com1']), 1)
+        self.assertEqual(related['dennias.chiu@gmail.com2'], [])
+        for ui in uis:
+            for ubi in ui.get_related(UserBodyInfo):
+                self.assertEqual(ubi.userid, ui.userid)
+
+    def test_14_join_models(self):
+        join_table = UserInfo.join(UserBodyInfo, userid=UserBodyInfo.get_field('userid')).to_json()
+        rets = UserInfo.get_many_and_join(
+            join_table=join_table, join_models=[UserBodyInfo], email='dennias.chiu@gmail.com1')
+        ui, ubi = rets[0]
+        self.assertIsInstance(ui, UserInfo)
+        self.assertIsInstance(ubi, UserBodyInfo)
+        self.assertEqual(ui.userid, ubi.userid)
+        self.assertEqual(ui.username, 'dennias1')
+        self.assertEqual(ubi.weight, 188.0)
+        # the columns of the queried model follow its db and table overrides
+        columns = UserInfo._aliased_columns([UserInfo, UserBodyInfo], db='other_db', table='UserInfo_bak')
+        self.assertEqual(columns[0], 'other_db.UserInfo_bak.{0} AS t0__{0}'.format(UserInfo.__META__.fields[0]))
+        self.assertEqual(columns[-1], 'porm_database_test.UserBodyInfo.{0} AS t1__{0}'.format(
+            UserBodyInfo.__META__.fields[-1]))
+        rets = UserInfo.get_many_and_join(
+            db='porm_database_test', get_tablename='UserInfo', join_table=join_table, join_models=[UserBodyInfo],
+            email='dennias.chiu@gmail.com1')
+        self.assertEqual(rets[0][0]._data, ui._data)
+
+    def test_15_asyncio(self):
+        import asyncio
+
+        async def run():
+            uis = await asyncio.gather(*[UserInfo.aget_many(email='dennias.chiu@gmail.com1') for _ in range(16)])
+            self.assertEqual({len(ui) for ui in uis}, {1})
+            self.assertLessEqual(UserInfo._get_async_dbi().pool.stats['size'], 8)
+            async with UserInfo.astart_transaction() as _t:
+                ui = await UserInfo.aget_one(email='dennias.chiu@gmail.com1', for_update=True, t=_t)
+                ui.reset(descr='async')
+                await ui.aupdate(t=_t)
+            self.assertEqual((await UserInfo.aget_one(userid=ui.userid)).descr, 'async')
+            with self.assertRaises(ValueError):
+                async with UserInfo.astart_transaction() as _t:
+                    ui.reset(descr='rolled back')
+                    await ui.aupdate(t=_t)
+                    raise ValueError(ui.userid)
+            self.assertEqual((await UserInfo.aget_one(userid=ui.userid)).descr, 'async')
+            self.assertEqual((await UserInfo.asearch(email='dennias.chiu@gmail.com1'))['total'], 1)
+
+        asyncio.run(run())
+
+    def test_16_gather(self):
+        ui, cnt, ubis = gather(
+            UserInfo.q.get_one(email='dennias.chiu@gmail.com1'),
+            UserInfo.q.count(),
+            UserBodyInfo.q.get_many(weight=188))
+        self.assertEqual(ui.username, 'dennias1')
+        self.assertEqual(cnt, UserInfo.count())
+        self.assertEqual(len(ubis), UserBodyInfo.count(weight=188))
+        with self.assertRaises(GatherError) as ctx:
+            gather(UserInfo.q.count(), UserInfo.q.get_many(return_columns=['no_such_column']))
+        self.assertEqual(ctx.exception.errors[0][0], 1)
+        self.assertEqual(ctx.exception.results[0], cnt)
+
+    def test_17_queryset(self):
+        qs = UserInfo.query().filter(email=('dennias.chiu@gmail.com', 'LIKE')).order_by('-userid')
+        with self.assertQueryCount(1):
+            uis = list(qs)
+            self.assertEqual([ui.userid for ui in qs], [ui.userid for ui in uis])
+            self.assertEqual(qs.count(), len(uis))
+        self.assertEqual(uis, sorted(uis, key=lambda ui: -ui.userid))
+        self.assertEqual([ui.userid for ui in qs[1:3]], [ui.userid for ui in uis[1:3]])
+        self.assertEqual(qs.filter(userid=uis[0].userid).first().userid, uis[0].userid)
+        self.assertEqual(qs[1:].count(), len(uis) - 1)
+        self.assertTrue(qs.exists())
+        self.assertFalse(qs.filter(userid=-1).exists())
+        self.assertEqual(list(qs.only('userid', 'email')[:1].iterator())[0].keys(), {'userid', 'email'})
+        # streamed a chunk at a time, the QuerySet keeps no result
+        fresh = UserInfo.query().filter(email=('dennias.chiu@gmail.com', 'LIKE')).order_by('-userid')
+        self.assertEqual([ui._data for ui in fresh.iterator(chunk_size=1)], [ui._data for ui in uis])
+        self.assertIsNone(fresh._result_cache)
+
+    def test_18_condition(self):
+        condition = Condition.or_condition(
+            Condition.eq('email', 'dennias.chiu@gmail.com1'), Condition.eq('email', 'dennias.chiu@gmail.com2'))
+        uis = UserInfo.get_many(where=condition)
+        self.assertEqual({ui.email for ui in uis}, {'dennias.chiu@gmail.com1', 'dennias.chiu@gmail.com2'})
+        self.assertEqual(UserInfo.count(where=condition), 2)
+        self.assertEqual(UserInfo.count(where=condition, username='dennias1'), 1)
+        self.assertEqual(UserInfo.search(where=condition, size=1)['total'], 2)
+        self.assertEqual(UserInfo.query().filter(condition).count(), 2)
+        # the columns are qualified with the table of the model like the terms, userid is in both tables
+        join_table = UserInfo.join(UserBodyInfo, userid=UserBodyInfo.get_field('userid')).to_json()
+        rets = UserInfo.get_many_and_join(
+            join_table=join_table, parse_with_tablename=True, join_models=[UserBodyInfo],
+            where=Condition.in_these('userid', [ui.userid for ui in uis]))
+        self.assertTrue(rets)
+        self.assertTrue({ui.userid for ui, _ in rets} <= {ui.userid for ui in uis})
+
+    def test_19_values(self):
+        ua1 = UserInfo.get_one(email='dennias.chiu@gmail.com1')
+        self.assertEqual(
+            UserInfo.values('userid', 'email', email=ua1.email), [{'userid': ua1.userid, 'email': ua1.email}])
+        self.assertEqual(UserInfo.values_list('userid', 'email', email=ua1.email), [(ua1.userid, ua1.email)])
+        userids = UserInfo.values_list('userid', flat=True, order_by='userid')
+        self.assertEqual(userids, sorted(ui.userid for ui in UserInfo.get_many()))
+        self.assertEqual(list(UserInfo.iter_values_list('userid', flat=True, chunk_size=2, order_by='userid')), userids)
+        self.assertEqual([row['userid'] for row in UserInfo.iter_values('userid', order_by='userid')], userids)
+        self.assertEqual(UserInfo.query().order_by('userid')[:2].values_list('userid', flat=True), userids[:2])
+
+    def test_20_fetch_columns(self):
+        uis = UserInfo.get_many(order_by='userid')
+        columns = UserInfo.fetch_columns(['userid', 'height', 'createtime'], chunk_size=2, order_by='userid')
+        self.assertEqual(columns.size, len(uis))
+        self.assertEqual(list(columns['userid']), [ui.userid for ui in uis])
+        self.assertEqual(list(columns['height']), [ui.height for ui in uis])
+        self.assertEqual([bool(null) for null in columns.masks['createtime']], [ui.createtime is None for ui in uis])
+
+    def test_21_aggregate(self):
+        uis = UserInfo.get_many()
+        rows = UserInfo.aggregate(
+            group_by=['is_active'], sum=['height'], avg=['height'], max=['userid'], count=True, order_by='is_active')
+        self.assertEqual(sum(row['cnt'] for row in rows), len(uis))
+        self.assertEqual(sum(row['sum_height'] for row in rows), sum(ui.height for ui in uis))
+        self.assertIsInstance(rows[0]['avg_height'], float)
+        self.assertEqual(max(row['max_userid'] for row in rows), max(ui.userid for ui in uis))
+        rows = UserInfo.aggregate(
+            group_by=['is_active'], count=True, having=Condition.gt('cnt', len(uis)), email=('dennias', 'LIKE'))
+        self.assertEqual(rows, [])
+
+    def test_22_exists_scalar(self):
+        ua1 = UserInfo.get_one(email='dennias.chiu@gmail.com1')
+        with self.assertQueryCount(1):
+            self.assertTrue(UserInfo.exists(email=ua1.email))
+        self.assertFalse(UserInfo.exists(email='nobody@porm'))
+        self.assertEqual(UserInfo.scalar('username', email=ua1.email), ua1.username)
+        self.assertEqual(UserInfo.scalar('MAX(userid)'), max(ui.userid for ui in UserInfo.get_many()))
+        self.assertIsNone(UserInfo.scalar('userid', email='nobody@porm'))
+        with self.assertRaises(ParamError):
+            UserInfo.exists(page=2, size=1)
+        with self.assertRaises(ParamError):
+            UserInfo.scalar('userid', page=1, size=1)
+
+    def test_23_deferred(self):
+        uis = DeferredUserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'))
+        self.assertTrue(len(uis) > 1)
+        self.assertEqual(uis[0].deferred_fields, ['descr', 'properties'])
+        with self.assertQueryCount(1):
+            props = [ui.properties for ui in uis]
+        self.assertTrue(all(isinstance(prop, dict) for prop in props))
+        with self.assertQueryCount(0):
+            self.assertEqual([ui.properties for ui in uis], props)
+        descr = UserInfo.get_one(userid=uis[-1].userid).descr
+        with self.assertQueryCount(1):
+            self.assertEqual(uis[-1]['descr'], descr)
+        ui = UserInfo.get_one(email='dennias.chiu@gmail.com1', defer=['height'])
+        cp = ui.copy()
+        self.assertEqual(cp.deferred_fields, ['height'])
+        self.assertNotIn('height', ui)
+        self.assertEqual(ui.height, 180)
+        # loaded for the copy together with its original
+        with self.assertQueryCount(0):
+            self.assertEqual(cp.height, 180)
+        self.assertEqual(DeferredUserInfo.query().defer().first().deferred_fields, [])
+
+    def test_24_lazy_dict(self):
+        ua1 = UserInfo.get_one(email='dennias.chiu@gmail.com1')
+        lazy = ua1._data['properties']
+        self.assertIsInstance(lazy, LazyDict)
+        self.assertFalse(lazy.decoded)
+        self.assertEqual(ua1.get_valid_fields()['properties'], lazy.raw)
+        self.assertEqual(json.loads(str(ua1))['properties'], {"yooyo": "hahaha"})
+        self.assertFalse(lazy.decoded)
+        # decoded when handed out, the C encoders read the items of the dict directly
+        self.assertEqual(json.dumps(ua1.properties), '{"yooyo": "hahaha"}')
+        self.assertTrue(lazy.decoded)
+        self.assertEqual(ua1.properties['yooyo'], 'hahaha')
+        ua1.properties['yooyo'] = 'hohoho'
+        self.assertEqual(json.loads(ua1.get_valid_fields()['properties']), {"yooyo": "hohoho"})
+        # strings of callers are decoded eagerly, only the values read from the database are lazy
+        with self.assertRaises(json.JSONDecodeError):
+            UserInfo.new(username='lazy', email='lazy', properties='{not json')
+        ua2 = UserInfo.new(username='lazy', email='lazy', properties='{"a": 1}')
+        self.assertNotIsInstance(ua2.properties, LazyDict)
+
+    def test_25_compact(self):
+        uis = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid')
+        rows = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid', compact=True)
+        self.assertEqual(len(rows), len(uis))
+        for ui, row in zip(uis, rows):
+            self.assertIsInstance(row, UserInfo.compact_class())
+            self.assertEqual(row.userid, ui.userid)
+            self.assertEqual(row['email'], ui.email)
+            self.assertEqual(json.loads(str(row)), json.loads(str(ui)))
+            self.assertEqual(dict(row), dict(ui.to_compact()))
+        rows[0].username = 'compact'
+        self.assertEqual(rows[0].dirty_fields, ['username'])
+        self.assertIsInstance(rows[0].to_model(), UserInfo)
+        self.assertEqual(rows[0].to_model().username, 'compact')
+
+    def test_26_row_functions(self):
+        UserInfo._check_meta()
+        DeferredUserInfo._check_meta()
+        self.assertIsNot(UserInfo.__META__, DeferredUserInfo.__META__)
+        rows = UserInfo.__META__.rows
+        kwargs = {'userid': 1, 'username': 'dennias', 'height': 188, 'createtime': '2020-01-02 03:04:05',
+                  'properties': '{"a": 1}'}
+        data = rows.validate_row(kwargs)
+        for field_name, val in kwargs.items():
+            self.assertEqual(data[field_name], UserInfo.__META__.get_field_type(field_name).validate(val))
+        self.assertEqual(
+            rows.dump_row(data, {'userid': True, 'properties': True}), {'userid': 1, 'properties': '{"a": 1}'})
+        with self.assertRaises(ValidationError):
+            rows.validate_row({'username': 'a' * 300})
+
+    def test_27_datetime_parsing(self):
+        dt = DatetimeType()
+        self.assertEqual(dt.validate('2020-01-02 03:04:05'), datetime.datetime(2020, 1, 2, 3, 4, 5))
+        self.assertEqual(dt.validate('Jan 2 2020 3pm'), datetime.datetime(2020, 1, 2, 15))
+        self.assertEqual(DatetimeType(format='%d/%m/%Y').validate('02/01/2020'), datetime.datetime(2020, 1, 2))
+        self.assertEqual(
+            dt.validate_many(['2020-01-02 03:04:05', '2020-01-02 03:04:05', datetime.datetime(2020, 1, 1)]),
+            [datetime.datetime(2020, 1, 2, 3, 4, 5)] * 2 + [datetime.datetime(2020, 1, 1)])
+        self.assertEqual(TimeType().validate_many(['08:00:00', '8:30']), [datetime.time(8), datetime.time(8, 30)])
+        # dateutil fills the missing year from the current date, its results are not cached
+        from porm.types import dates
+        dates._strptime.cache_clear()
+        self.assertEqual(dt.validate('Mar 5').year, datetime.date.today().year)
+        self.assertEqual(dates._strptime.cache_info().currsize, 0)
+
+    def test_28_insert_columns(self):
+        emails = ['columns{}@porm.com'.format(idx) for idx in range(3)]
+        with UserInfo.start_transaction() as _t:
+            cnt = UserInfo.insert_columns({
+                'email': emails,
+                'username': ['columns'] * 3,
+                'height': [180, 181.5, 182],
+                'createtime': ['2020-01-02 03:04:05'] * 3,
+                'properties': [{"yooyo": "hahaha"}] * 3,
+            }, t=_t)
+            self.assertEqual(cnt, 3)
+            ui = UserInfo.get_one(email=emails[1], t=_t)
+            self.assertEqual(ui.height, 181.5)
+            self.assertEqual(ui.createtime, datetime.datetime(2020, 1, 2, 3, 4, 5))
+            self.assertEqual(ui.properties['yooyo'], 'hahaha')
+            with self.assertRaises(ValidationError):
+                UserInfo.insert_columns({'email': emails, 'username': ['a' * 300, 'b', 'c']}, t=_t)
+            UserInfo.delete_many(email=(emails, 'IN'), t=_t)
+
+    def test_29_copy_on_write(self):
+        ui = UserInfo.new(email='cow@porm.com', username='cow', height=180, properties={"tags": [1, 2]})
+        cp = ui.copy()
+        self.assertIs(cp._data, ui._data)
+        cp['email'] = 'copied@porm.com'
+        self.assertEqual(ui.email, 'cow@porm.com')
+        self.assertEqual(cp.email, 'copied@porm.com')
+        cp.properties['tags'].append(3)
+        self.assertEqual(ui.properties['tags'], [1, 2])
+        ui.properties['yooyo'] = 'hahaha'
+        self.assertNotIn('yooyo', cp.properties)
+        snapshot = ui._snapshot()
+        cached = UserInfo._from_snapshot(snapshot)
+        cached.properties['tags'].clear()
+        self.assertEqual(UserInfo._from_snapshot(snapshot).properties['tags'], [1, 2])
+
+    def test_30_serialize(self):
+        uis = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid')
+        expected = [json.loads(str(ui)) for ui in uis]
+        self.assertEqual(json.loads(serialize.dumps_many(uis, backend='json')), expected)
+        self.assertEqual(json.loads(serialize.dumps_many(uis)), expected)
+        self.assertEqual(json.loads(serialize.dumps_many([ui.to_compact() for ui in uis])), expected)
+        result = SearchResult(total=len(uis), index=0, size=10, result=uis)
+        pagination = json.loads(result.dumps(pagination=True))
+        self.assertEqual(pagination['data'], expected)
+        self.assertEqual(pagination['pagination']['total'], len(uis))
+        self.assertEqual(json.loads(result.dumps(backend='json'))['result'], expected)
+
+    def test_31_binary_batch(self):
+        uis = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid')
+        buf = UserInfo.dumps_batch(uis)
+        loaded = UserInfo.loads_batch(buf)
+        self.assertEqual([ui._data for ui in loaded], [ui._data for ui in uis])
+        self.assertEqual([str(ui) for ui in loaded], [str(ui) for ui in uis])
+        self.assertEqual(UserInfo.loads_batch(UserInfo.dumps_batch([ui.to_compact() for ui in uis]))[0]._data,
+                         uis[0]._data)
+        columns = UserInfo.loads_batch(buf, columnar=True)
+        self.assertEqual(columns.size, len(uis))
+        self.assertEqual(list(columns['userid']), [ui.userid for ui in uis])
+        self.assertEqual(pickle.loads(pickle.dumps(uis[0]))._data, uis[0]._data)
+        with self.assertRaises(ParamError):
+            UserBodyInfo.loads_batch(buf)
+        # a DateType may hold datetimes and a TimestampType datetimes of timestamps
+        dated = [DatedInfo.new(id=1, day='2020-01-01 10:00:00', stamp='1600000000.5'),
+                 DatedInfo.new(id=2, day=datetime.date(2020, 1, 2), stamp=datetime.time(8))]
+        loaded = DatedInfo.loads_batch(DatedInfo.dumps_batch(dated))
+        self.assertEqual([obj._data for obj in loaded], [obj._data for obj in dated])
+        self.assertEqual(loaded[0].day, datetime.datetime(2020, 1, 1, 10))
+        self.assertEqual(loaded[1].stamp, datetime.time(8))
+
+    def test_32_fork(self):
+        import os
+        if not hasattr(os, 'fork'):
+            self.skipTest('no fork')
+        from porm.databases import MyDBApi
+        dbi = MyDBApi(config=UserInfo.__CONFIG__)
+        parent_conn = dbi.conn
+        pool = UserInfo._get_async_dbi().pool
+        UserInfo.warm_up(2)
+        pid = os.fork()
+        if pid == 0:
+            ok = dbi.is_closed() and pool.stats['size'] == 0 and UserInfo.warm_up(2) == 2
+            ok = ok and len(UserInfo.get_many(email='dennias.chiu@gmail.com1')) == 1
+            ok = ok and dbi.query_one('SELECT 1 AS one')['one'] == 1 and dbi.conn is not parent_conn
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        # the session of the parent is not closed by the child
+        self.assertIs(dbi.conn, parent_conn)
+        self.assertEqual(dbi.query_one('SELECT 1 AS one')['one'], 1)
+        self.assertGreaterEqual(pool.stats['idle'], 2)
+
+    def test_33_threaded_transactions(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from porm.databases import MyDBApi
+        dbi = MyDBApi(config=UserInfo.__CONFIG__)
+        threads = 8
+        # every transaction waits inside for the others, so they only pass if they run at the same time
+        inside = threading.Barrier(threads, timeout=10)
+
+        def run(_):
+            with dbi.start_transaction():
+                one = dbi.query_one('SELECT 1 AS one')['one']
+                conn = dbi.conn
+                inside.wait()
+                self.assertIs(dbi.conn, conn)
+            dbi.close()
+            return one, id(conn), threading.get_ident()
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            rets = list(pool.map(run, range(threads)))
+        self.assertEqual({one for one, _, _ in rets}, {1})
+        # the connections were all open at the barrier, so their ids are distinct
+        self.assertEqual(len({conn for _, conn, _ in rets}), threads)
+        self.assertEqual(len({ident for _, _, ident in rets}), threads)
+        self.assertFalse(inside.broken)
+        self.assertFalse(dbi.in_transaction())
+
+    def test_34_overridden_new(self):
+        # the objects of a class overriding `new` are built by it, the others skip the validation
+        built = CountedUserInfo.built
+        counted = CountedUserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid')
+        uis = UserInfo.get_many(email=(['dennias.chiu@gmail.com'], 'LIKE'), order_by='userid')
+        self.assertEqual(CountedUserInfo.built - built, len(uis))
+        self.assertEqual([ui._data for ui in counted], [ui._data for ui in uis])
+        self.assertIsInstance(pickle.loads(pickle.dumps(counted[0])), CountedUserInfo)
+        self.assertEqual(CountedUserInfo.built - built, len(uis) + 1)
+
     def test_99_drop_table(self):
         with UserInfo.start_transaction() as _t:
             UserInfo.drop(t=_t)